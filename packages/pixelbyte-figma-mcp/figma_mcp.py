@@ -18,9 +18,10 @@ import re
 import base64
 import asyncio
 import tempfile
+import time
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any, Literal, Annotated, Tuple, Callable
+from typing import Optional, List, Dict, Any, Literal, Annotated, Tuple, Callable, Union
 from enum import Enum
 from dataclasses import dataclass
 
@@ -29,7 +30,10 @@ from pydantic import BaseModel, Field, field_validator, ConfigDict, BeforeValida
 from mcp.server.fastmcp import FastMCP
 
 # Generator modules
-from generators.react_generator import generate_react_code as _generate_react_code
+from generators.react_generator import (
+    generate_react_code as _generate_react_code,
+    recursive_node_to_jsx as _recursive_node_to_jsx,
+)
 from generators.vue_generator import generate_vue_code as _generate_vue_code
 from generators.css_generator import generate_css_code as _generate_css_code, generate_scss_code as _generate_scss_code
 from generators.kotlin_generator import generate_kotlin_code as _generate_kotlin_code
@@ -37,10 +41,23 @@ from generators.base import (
     sanitize_component_name as _sanitize_component_name,
     MAX_CHILDREN_LIMIT,
     MAX_NATIVE_CHILDREN_LIMIT,
+    StyleCache,
+    computed_style,
+    style_cache_scope,
+    walk_nodes,
+)
+from pipeline import service_metrics
+from pipeline.cache import StageCache
+from pipeline.document_index import CachedDocument, DocumentCache, DocumentIndex
+from pipeline.metrics import record_io, span as trace_span
+from pipeline.node_store import NodeStore
+from pipeline.result_pages import (
+    PageCursorError, ResultPages, decode_cursor, encode_cursor, result_handle, versioned_handle,
 )
 from pipeline.runner import PipelineConfig, PipelineDependencies, PipelineRunner
+from pipeline.stages.generate_react import ComponentPool
 from pipeline.models import PipelineMode, PipelineRunRequest, PipelineRunResult
-from pipeline.render_implementation import render_react_implementation_screenshot
+from pipeline.render_implementation import ImplementationRenderPool, render_react_implementation_screenshot
 
 
 # ============================================================================
@@ -100,6 +117,23 @@ PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER = 3
 PIPELINE_V2_DEFAULT_PASS_THRESHOLD = 95.0
 PIPELINE_V2_DEFAULT_WARN_THRESHOLD = 85.0
 PIPELINE_V2_DEFAULT_AUTO_RENDER = True
+PIPELINE_V2_DEFAULT_EVIDENCE_MODE = "async"
+PIPELINE_V2_DEFAULT_EVIDENCE_MAX_DIM = 0
+PIPELINE_V2_DEFAULT_EVIDENCE_PALETTE = False
+PIPELINE_V2_DEFAULT_CACHE_MAX_MB = 512
+PIPELINE_V2_DEFAULT_CACHE_TTL_HOURS = 336.0
+PIPELINE_V2_DEFAULT_CACHE_DIR = ".qa/cache"
+PIPELINE_V2_DEFAULT_BATCH_CONCURRENCY = 4
+PIPELINE_V2_DEFAULT_CODEGEN_WORKERS = 0
+PIPELINE_V2_DEFAULT_VISUAL_WORKERS = 0
+SERVICE_METRICS_DEFAULT_ENABLED = False
+SERVICE_METRICS_DEFAULT_PORT = 0
+SERVICE_METRICS_DEFAULT_HOST = "127.0.0.1"
+DOCUMENT_CACHE_DEFAULT_TTL_SECONDS = 0.0
+DOCUMENT_CACHE_DEFAULT_MAX_MB = 64.0
+RESULT_PAGES_DEFAULT_TTL_SECONDS = 600.0
+RESULT_PAGES_DEFAULT_MAX_ENTRIES = 16
+DEFAULT_PAGE_SIZE = 100
 
 # Tailwind CSS font weight mapping
 TAILWIND_WEIGHT_MAP = {
@@ -191,6 +225,50 @@ SERVER_VERSION = "3.3.1"
 
 mcp = FastMCP("figma_mcp")
 
+
+def _configure_service_metrics() -> Optional[str]:
+    """Enable the opt-in metrics registry (and /metrics endpoint) from the environment.
+
+    Returns an error message when the endpoint could not be started; collection
+    stays enabled so `figma_get_metrics` still works.
+    """
+    port = _env_int("FIGMA_METRICS_PORT", SERVICE_METRICS_DEFAULT_PORT)
+    if port > 0:
+        try:
+            service_metrics.serve(port, host=os.getenv("FIGMA_METRICS_HOST", SERVICE_METRICS_DEFAULT_HOST))
+        except OSError as e:
+            service_metrics.enable()
+            return f"metrics endpoint on port {port} could not be started: {e}"
+    elif _env_bool("FIGMA_METRICS_ENABLED", SERVICE_METRICS_DEFAULT_ENABLED):
+        service_metrics.enable()
+    return None
+
+
+# Set by ``main()`` when the metrics endpoint could not be started.
+_SERVICE_METRICS_ERROR: Optional[str] = None
+
+# Documents fetched by tools, optionally shared for a short time so that
+# consecutive tool calls on the same file or node reuse one response and its
+# DocumentIndex. Off by default (FIGMA_DOCUMENT_CACHE_TTL_SECONDS=0): a cached
+# tree does not see edits made in Figma until it expires. Without it, each tool
+# call still fetches its document once and builds the index at most once.
+# Bounded by serialized document size.
+_DOCUMENT_CACHE = DocumentCache(
+    ttl_seconds=_env_float("FIGMA_DOCUMENT_CACHE_TTL_SECONDS", DOCUMENT_CACHE_DEFAULT_TTL_SECONDS),
+    max_bytes=int(max(0.0, _env_float("FIGMA_DOCUMENT_CACHE_MAX_MB", DOCUMENT_CACHE_DEFAULT_MAX_MB)) * 1024 * 1024),
+)
+
+# Full list results (tokens, assets) behind page cursors, so that follow-up
+# pages are sliced from memory instead of recomputed.
+_RESULT_PAGES = ResultPages(
+    ttl_seconds=_env_float("FIGMA_RESULT_PAGES_TTL_SECONDS", RESULT_PAGES_DEFAULT_TTL_SECONDS),
+    max_entries=_env_int("FIGMA_RESULT_PAGES_MAX_ENTRIES", RESULT_PAGES_DEFAULT_MAX_ENTRIES),
+)
+
+# Code generation worker pools by worker count, kept across pipeline tool calls
+# so that process startup is paid once per server.
+_COMPONENT_POOLS: Dict[int, ComponentPool] = {}
+
 # ============================================================================
 # Enums and Types
 # ============================================================================
@@ -317,6 +395,16 @@ class FigmaDesignTokensInput(BaseModel):
         default=True,
         description="Include ready-to-use CSS variables, SCSS variables, and Tailwind config"
     )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="Page cursor from a previous response's nextCursor; repeat the original parameters with it"
+    )
+    page_size: int = Field(
+        default=DEFAULT_PAGE_SIZE,
+        description="Maximum items returned per section",
+        ge=1,
+        le=1000
+    )
 
 
 class FigmaCodeGenInput(BaseModel):
@@ -329,10 +417,19 @@ class FigmaCodeGenInput(BaseModel):
         default=CodeFramework.REACT_TAILWIND,
         description="Target framework"
     )
+    frameworks: Optional[List[CodeFramework]] = Field(
+        default=None,
+        min_length=1,
+        description="Generate several targets from one fetch of the node; overrides framework"
+    )
     component_name: Optional[str] = Field(
         default=None,
         description="Component name (auto-generated from node name if not provided)"
     )
+    dedupe_instances: bool = Field(
+        default=False,
+        description="Emit repeated component instances once as a subcomponent with text props (React and SwiftUI); off inlines every instance"
+    )
 
 
 class FigmaPipelineRunInput(BaseModel):
@@ -415,6 +512,103 @@ class FigmaPipelineRunResult(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
+class FigmaPipelineBatchInput(BaseModel):
+    """Input model for running the deterministic pipeline over several nodes of one file."""
+
+    model_config = ConfigDict(str_strip_whitespace=True, validate_assignment=True)
+
+    file_key: FigmaFileKey = Field(..., description="Figma file key")
+    node_ids: FigmaNodeIdList = Field(
+        ...,
+        description="Node IDs to run (e.g., ['1:2', '3:4']); fetched together in one request",
+        min_length=1,
+        max_length=50
+    )
+    framework: CodeFramework = Field(
+        default=CodeFramework.REACT_TAILWIND,
+        description="Framework for deterministic generation (react/react_tailwind in v1)"
+    )
+    mode: PipelineMode = Field(
+        default=PipelineMode.STRICT_PIXEL,
+        description="Pipeline mode: strict_pixel or strict_pixel_plus_responsive"
+    )
+    use_cache: bool = Field(
+        default=True,
+        description="Use stage-level cache for warm runs"
+    )
+    target_match: float = Field(
+        default=PIPELINE_V2_DEFAULT_TARGET_MATCH,
+        ge=0.0,
+        le=1.0,
+        description="Target visual match ratio from 0.0 to 1.0"
+    )
+    max_visual_iterations: int = Field(
+        default=PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER,
+        ge=1,
+        le=5,
+        description="Maximum visual validation iterations per node"
+    )
+    output_dir: Optional[str] = Field(
+        default=None,
+        description="Optional output directory for run and batch artifacts"
+    )
+    auto_render_implementation: bool = Field(
+        default=PIPELINE_V2_DEFAULT_AUTO_RENDER,
+        description="Auto-render generated implementation screenshots with a shared browser"
+    )
+    figma_screenshot_scale: float = Field(
+        default=2.0,
+        ge=0.01,
+        le=4.0,
+        description="Scale for Figma reference screenshot capture"
+    )
+    max_concurrency: int = Field(
+        default=PIPELINE_V2_DEFAULT_BATCH_CONCURRENCY,
+        ge=1,
+        le=8,
+        description="Maximum number of nodes processed concurrently (also bounds open browser pages)"
+    )
+
+    @field_validator('framework')
+    @classmethod
+    def _validate_framework_scope(cls, v: CodeFramework) -> CodeFramework:
+        if v not in {CodeFramework.REACT, CodeFramework.REACT_TAILWIND}:
+            raise ValueError("Deterministic pipeline v1 supports only react/react_tailwind")
+        return v
+
+
+class FigmaPipelineCacheInput(BaseModel):
+    """Input model for inspecting or pruning the deterministic pipeline stage cache."""
+
+    model_config = ConfigDict(str_strip_whitespace=True, validate_assignment=True)
+
+    action: Literal["stats", "prune"] = Field(
+        default="stats",
+        description="'stats' reports cache size and access range; 'prune' applies the eviction policy"
+    )
+    max_mb: Optional[float] = Field(
+        default=None,
+        ge=0,
+        description="Prune: keep at most this many MB; 0 disables the size limit (defaults to FIGMA_PIPELINE_CACHE_MAX_MB)"
+    )
+    max_age_hours: Optional[float] = Field(
+        default=None,
+        ge=0,
+        description="Prune: drop entries not accessed for this many hours; 0 disables the age limit (defaults to FIGMA_PIPELINE_CACHE_TTL_HOURS)"
+    )
+
+
+class FigmaMetricsInput(BaseModel):
+    """Input model for dumping service metrics."""
+
+    model_config = ConfigDict(str_strip_whitespace=True, validate_assignment=True)
+
+    name_prefix: str = Field(
+        default="pbfigma_",
+        description="Only include metric families whose name starts with this prefix"
+    )
+
+
 class FigmaStylesInput(BaseModel):
     """Input model for published styles retrieval."""
     model_config = ConfigDict(str_strip_whitespace=True, validate_assignment=True)
@@ -530,6 +724,16 @@ class FigmaListAssetsInput(BaseModel):
         default=True,
         description="Include nodes with export settings"
     )
+    cursor: Optional[str] = Field(
+        default=None,
+        description="Page cursor from a previous response's nextCursor; repeat the original parameters with it"
+    )
+    page_size: int = Field(
+        default=DEFAULT_PAGE_SIZE,
+        description="Maximum items returned per section",
+        ge=1,
+        le=1000
+    )
     response_format: ResponseFormat = Field(
         default=ResponseFormat.MARKDOWN,
         description="Output format"
@@ -634,18 +838,33 @@ async def _make_figma_request(
     token = _get_figma_token()
     last_exception = None
 
+    endpoint_label = service_metrics.endpoint_label(endpoint)
+
     for attempt in range(MAX_RETRIES):
+        started = time.perf_counter()
+        status_label: object = "error"
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.request(
-                    method=method,
-                    url=f"{FIGMA_API_BASE}/{endpoint}",
-                    headers={"X-Figma-Token": token},
-                    params=params,
-                    timeout=DEFAULT_TIMEOUT
-                )
-                response.raise_for_status()
-                return response.json()
+            try:
+                with trace_span("figma_request", "http", endpoint=endpoint, attempt=attempt + 1):
+                    async with httpx.AsyncClient() as client:
+                        response = await client.request(
+                            method=method,
+                            url=f"{FIGMA_API_BASE}/{endpoint}",
+                            headers={"X-Figma-Token": token},
+                            params=params,
+                            timeout=DEFAULT_TIMEOUT
+                        )
+                        status_label = response.status_code
+                        record_io(read=len(response.content))
+                        if response.status_code == 429:
+                            service_metrics.inc("pbfigma_figma_rate_limited_total", endpoint=endpoint_label)
+                        response.raise_for_status()
+                        return response.json()
+            finally:
+                # Every attempt is counted once: by HTTP status, or as "error"
+                # when no response arrived (connect/read timeouts, OS errors).
+                service_metrics.observe("pbfigma_figma_request_seconds", time.perf_counter() - started, endpoint=endpoint_label)
+                service_metrics.inc("pbfigma_figma_requests_total", endpoint=endpoint_label, status=status_label)
         except (httpx.ConnectError, httpx.ConnectTimeout, OSError) as e:
             last_exception = e
             if attempt < MAX_RETRIES - 1:
@@ -675,6 +894,81 @@ async def _make_figma_request(
     raise last_exception
 
 
+async def _fetch_document(
+    file_key: str,
+    node_id: Optional[str] = None,
+    geometry: bool = False
+) -> CachedDocument:
+    """Fetch a node's subtree (or the whole file document) through the document cache.
+
+    The node endpoint is used when ``node_id`` is given, since the files
+    endpoint may omit properties such as ``relativeTransform``. A cached
+    response fetched with vector geometry also serves requests without it.
+    The returned tree is shared with other tool calls and must not be
+    mutated; its root is ``{}`` when the node does not exist.
+    """
+    endpoint = f"files/{file_key}/nodes" if node_id else f"files/{file_key}"
+    for cached_geometry in ((True,) if geometry else (False, True)):
+        cached = _DOCUMENT_CACHE.get((endpoint, node_id or "", cached_geometry))
+        if cached is not None:
+            service_metrics.inc("pbfigma_document_cache_lookups_total", result="hit")
+            return cached
+    service_metrics.inc("pbfigma_document_cache_lookups_total", result="miss")
+
+    params: Dict[str, Any] = {"ids": node_id} if node_id else {}
+    if geometry:
+        params["geometry"] = "paths"
+    data = await _make_figma_request(endpoint, params=params or None)
+    if node_id:
+        # Unknown ids come back as ``"nodes": {id: null}``.
+        root = ((data.get('nodes') or {}).get(node_id) or {}).get('document') or {}
+    else:
+        root = data.get('document') or {}
+    meta = {key: data.get(key) for key in ('name', 'lastModified', 'version')}
+    if not root or not _DOCUMENT_CACHE.enabled:
+        return CachedDocument(root, meta)
+    size = len(await asyncio.to_thread(_COMPACT_JSON.encode, root))
+    return _DOCUMENT_CACHE.put((endpoint, node_id or "", geometry), root, meta, size)
+
+
+def _resolve_page_cursor(cursor: Optional[str], request: str) -> Optional[Tuple[str, str, int]]:
+    """Return ``(handle, section, offset)`` for a cursor issued to this request, or None without a cursor."""
+    if not cursor:
+        return None
+    handle, section, offset = decode_cursor(cursor)
+    if not handle.startswith(request):
+        raise PageCursorError("Cursor belongs to a different request. Repeat the original parameters with it.")
+    return handle, section, offset
+
+
+async def _paged_result(
+    request: str,
+    page_at: Optional[Tuple[str, str, int]],
+    file_key: str,
+    node_id: Optional[str],
+    geometry: bool,
+    build: Callable[[Dict[str, Any]], Dict[str, List[Any]]],
+) -> Tuple[str, Dict[str, List[Any]]]:
+    """``(handle, sections)`` of a paged result, rebuilt from a fresh fetch when not cached.
+
+    Handles include the fetched document version. A cursor whose result
+    expired is only honoured while the file is unchanged, since its offsets
+    would otherwise point into a different list.
+    """
+    if page_at is not None:
+        sections = _RESULT_PAGES.get(page_at[0])
+        if sections is not None:
+            return page_at[0], sections
+    document = await _fetch_document(file_key, node_id, geometry=geometry)
+    handle = versioned_handle(request, document.meta.get('version') or document.meta.get('lastModified'))
+    if page_at is not None and page_at[0] != handle:
+        raise PageCursorError("The file changed since this cursor was issued. Repeat the request without a cursor.")
+    sections = _RESULT_PAGES.get(handle)
+    if sections is None:
+        sections = _RESULT_PAGES.put(handle, build(document.root))
+    return handle, sections
+
+
 def _with_version(response: str) -> str:
     """Append server version footer to tool responses."""
     return f"{response}\n\n---\n_MCP Server v{SERVER_VERSION}_"
@@ -687,7 +981,19 @@ def _versioned_tool(*args, **kwargs):
 
         @functools.wraps(func)
         async def wrapper(*fn_args, **fn_kwargs):
-            result = await func(*fn_args, **fn_kwargs)
+            tool_name = kwargs.get("name", func.__name__)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                # One style cache per call, so generators and node checks
+                # parse each node's styles once.
+                with style_cache_scope(StyleCache()):
+                    result = await func(*fn_args, **fn_kwargs)
+                if not (isinstance(result, str) and result.startswith("Error")):
+                    outcome = "ok"
+            finally:
+                service_metrics.inc("pbfigma_tool_calls_total", tool=tool_name, outcome=outcome)
+                service_metrics.observe("pbfigma_tool_call_seconds", time.perf_counter() - started, tool=tool_name)
             if isinstance(result, str):
                 return _with_version(result)
             return result
@@ -720,6 +1026,118 @@ def _handle_api_error(e: Exception) -> str:
     return f"Error: {type(e).__name__}: {str(e)}"
 
 
+class _ResponseBuilder:
+    """Markdown response lines collected against a character budget.
+
+    Mirrors the ``append``/``extend`` list API the tools already use. The
+    running size is tracked as lines arrive; once the next line would cross
+    the budget every further line is dropped and counted, ``full`` turns
+    True so callers can stop producing, and ``render`` closes with a note on
+    what was left out.
+    """
+
+    # Room kept for the omission note and the version footer.
+    _RESERVE = 300
+
+    def __init__(self, lines: Optional[List[str]] = None, budget: int = CHARACTER_LIMIT) -> None:
+        self.budget = budget
+        self.size = 0
+        self.dropped = 0
+        self._lines: List[str] = []
+        if lines:
+            self.extend(lines)
+
+    @property
+    def full(self) -> bool:
+        return self.dropped > 0
+
+    def append(self, line: str) -> bool:
+        cost = len(line) + 1
+        if self.dropped or self.size + cost > self.budget - self._RESERVE:
+            self.dropped += 1
+            return False
+        self._lines.append(line)
+        self.size += cost
+        return True
+
+    def extend(self, lines: List[str]) -> bool:
+        for line in lines:
+            if not self.append(line):
+                return False
+        return True
+
+    def render(self, hint: str = "Use node_id to narrow scope.") -> str:
+        text = "\n".join(self._lines)
+        if self.dropped:
+            text += f"\n\n... ({self.dropped} more lines omitted to stay under {self.budget} characters. {hint})"
+        return text
+
+
+_COMPACT_JSON = json.JSONEncoder(separators=(',', ':'))
+
+
+def _encode_within(value: Any, limit: int) -> Optional[str]:
+    """Compact JSON for ``value``, or None as soon as it grows past ``limit`` characters."""
+    chunks: List[str] = []
+    size = 0
+    # iterencode yields lazily, so oversized values are abandoned early
+    # instead of being serialized in full first.
+    for chunk in _COMPACT_JSON.iterencode(value):
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+def _json_response(payload: Any, budget: int = CHARACTER_LIMIT, hint: str = "Use node_id to narrow scope.") -> str:
+    """Serialize a tool payload compactly within a character budget.
+
+    A dict that does not fit keeps the top-level fields that do, in order,
+    and names the others under ``_omitted``; any other payload is replaced
+    by a short notice.
+    """
+    text = _encode_within(payload, budget)
+    if text is not None:
+        return text
+    notice = f'Response exceeds {budget} characters. {hint}'
+    if not isinstance(payload, dict):
+        return _COMPACT_JSON.encode({'_truncated': True, '_message': notice})
+    omitted = [str(key) for key in payload]
+    remaining = budget - len(_COMPACT_JSON.encode({'_truncated': True, '_message': notice, '_omitted': omitted}))
+    fields: List[str] = []
+    for key, value in payload.items():
+        field = _encode_within({key: value}, remaining)
+        if field is None:
+            continue
+        fields.append(field[1:-1])
+        omitted.remove(str(key))
+        remaining -= len(field) - 1
+    tail = _COMPACT_JSON.encode({'_truncated': True, '_message': notice, '_omitted': omitted})[1:-1]
+    return '{' + ','.join(fields + [tail]) + '}'
+
+
+def _largest_fitting_page(render: Callable[[int], Optional[str]], page_size: int, minimum: int = 0) -> Optional[str]:
+    """Render with the largest page size up to ``page_size`` whose response fits.
+
+    ``render`` returns None for page sizes whose response would exceed the
+    budget. The requested size is tried first, then a binary search down to
+    ``minimum``; None means not even ``minimum`` items fit.
+    """
+    text = render(page_size)
+    if text is not None:
+        return text
+    low, high = minimum, page_size - 1
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = render(middle)
+        if candidate is None:
+            high = middle - 1
+        else:
+            text, low = candidate, middle + 1
+    return text
+
+
 def _rgba_to_hex(color: Dict[str, float]) -> str:
     """Convert Figma RGBA color to hex."""
     r = int(color.get('r', 0) * 255)
@@ -1047,7 +1465,28 @@ def _extract_children_summary(children: List[Dict[str, Any]], depth: int = 0, ma
     return summaries
 
 
-def _render_children_markdown(lines: List[str], children: List[Dict[str, Any]], indent: int = 0) -> None:
+def _subtree_composition(index: DocumentIndex) -> Dict[str, Any]:
+    """Count the root's descendants by type and instances by componentId from its index."""
+    by_type = index.type_counts()
+    instances = index.component_instance_counts()
+    total = len(index)
+    if index.root_id in index:
+        root = index.root
+        total -= 1
+        by_type[root.get('type', '')] -= 1
+        if root.get('type') == 'INSTANCE' and root.get('componentId'):
+            instances[root['componentId']] -= 1
+    composition: Dict[str, Any] = {
+        'total': total,
+        'byType': {node_type: count for node_type, count in by_type.items() if count},
+    }
+    instances = {component_id: count for component_id, count in instances.items() if count}
+    if instances:
+        composition['componentInstances'] = instances
+    return composition
+
+
+def _render_children_markdown(lines: _ResponseBuilder, children: List[Dict[str, Any]], indent: int = 0) -> None:
     """Render children summary list as markdown."""
     prefix = '  ' * indent
     for child in children:
@@ -1303,28 +1742,12 @@ async def _resolve_image_urls(file_key: str, image_refs: List[str]) -> Dict[str,
 
 def _collect_image_refs_from_tree(node: Dict[str, Any], refs: set[str]) -> None:
     """Collect imageRef values from a node tree."""
-    for fill in node.get('fills', []):
-        if fill.get('type') == 'IMAGE' and fill.get('visible', True):
-            image_ref = fill.get('imageRef')
-            if image_ref:
-                refs.add(image_ref)
-
-    for child in node.get('children', []):
-        _collect_image_refs_from_tree(child, refs)
-
-
-def _attach_image_urls_to_tree(node: Dict[str, Any], image_urls: Dict[str, str]) -> None:
-    """Attach resolved image URLs to IMAGE fills in a node tree."""
-    for fill in node.get('fills', []):
-        if fill.get('type') == 'IMAGE' and fill.get('visible', True):
-            image_ref = fill.get('imageRef')
-            if image_ref:
-                image_url = image_urls.get(image_ref)
-                if image_url:
-                    fill['imageUrl'] = image_url
-
-    for child in node.get('children', []):
-        _attach_image_urls_to_tree(child, image_urls)
+    for current, _, _, _ in walk_nodes(node):
+        for fill in current.get('fills', []):
+            if fill.get('type') == 'IMAGE' and fill.get('visible', True):
+                image_ref = fill.get('imageRef')
+                if image_ref:
+                    refs.add(image_ref)
 
 
 def _generate_svg_from_paths(vector_paths: Dict[str, Any], node: Dict[str, Any]) -> Optional[str]:
@@ -1504,20 +1927,35 @@ def _collect_all_assets(
     include_vectors: bool = False,
     include_exports: bool = True  # NEW: Add parameter
 ) -> None:
-    """Recursively collect all assets from a node tree with smart icon detection.
+    """Collect all assets from a node tree with smart icon detection.
 
     Finds image fills, icon frames, raw vectors, and nodes with export settings.
     When an icon frame is detected, it's added to the icons list and children
     are NOT traversed (avoiding duplicate vector entries).
 
     Args:
-        node: The node to process
+        node: The root node to process
         file_key: Figma file key
         assets: Dict to accumulate assets into (modified in place)
         include_icons: Whether to detect and collect icon frames
         include_vectors: Whether to collect raw vector nodes
         include_exports: Whether to collect nodes with export settings
     """
+    icon_frames: set[int] = set()
+    for current, _, _, _ in walk_nodes(node, descend=lambda visited, _depth: id(visited) not in icon_frames):
+        if _collect_node_assets(current, file_key, assets, include_icons, include_vectors, include_exports):
+            icon_frames.add(id(current))
+
+
+def _collect_node_assets(
+    node: Dict[str, Any],
+    file_key: str,
+    assets: Dict[str, List],
+    include_icons: bool,
+    include_vectors: bool,
+    include_exports: bool,
+) -> bool:
+    """Collect the assets of one node; returns True for icon frames, whose children are skipped."""
     node_id = node.get('id', '')
     node_name = node.get('name', 'Unnamed')
     node_type = node.get('type', '')
@@ -1559,8 +1997,8 @@ def _collect_all_assets(
             'width': abs_box.get('width', 0),
             'height': abs_box.get('height', 0)
         })
-        # Don't recurse into icon children - we treat the icon as a single asset
-        return
+        # Don't descend into icon children - we treat the icon as a single asset
+        return True
 
     # Check for vector paths (SVG exportable) - only if include_vectors is True
     if include_vectors:
@@ -1572,10 +2010,7 @@ def _collect_all_assets(
                 'nodeType': node_type,
                 'hasPath': bool(vector_paths.get('fillGeometry') or vector_paths.get('strokeGeometry'))
             })
-
-    # Recurse into children
-    for child in node.get('children', []):
-        _collect_all_assets(child, file_key, assets, include_icons, include_vectors, include_exports)
+    return False
 
 
 def _extract_vector_paths(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -1963,12 +2398,10 @@ def _generate_implementation_hints(node: Dict[str, Any], interactions: Optional[
         accessibility_hints.append("Add aria-label for screen readers")
 
     # Check text contrast
-    fills = node.get('fills', [])
-    for fill in fills:
-        if fill.get('type') == 'SOLID' and fill.get('visible', True):
-            color = fill.get('color', {})
+    for fill in computed_style(node).fills:
+        if fill.type == 'SOLID':
             # Check if it's light text on light background
-            r, g, b = color.get('r', 0), color.get('g', 0), color.get('b', 0)
+            r, g, b = fill.color.r, fill.color.g, fill.color.b
             luminance = 0.2126 * r + 0.7152 * g + 0.0722 * b
             if luminance > 0.7:
                 accessibility_hints.append("Light color - ensure sufficient contrast with background (WCAG 4.5:1)")
@@ -2070,15 +2503,9 @@ def _check_accessibility(node: Dict[str, Any], parent_fills: Optional[List] = No
 
     # Contrast ratio check for text nodes
     if node_type == 'TEXT':
-        fills = node.get('fills', [])
-
-        for fill in fills:
-            if fill.get('type') == 'SOLID' and fill.get('visible', True):
-                color = fill.get('color', {})
-                r = int(color.get('r', 0) * 255)
-                g = int(color.get('g', 0) * 255)
-                b = int(color.get('b', 0) * 255)
-                text_rgb = (r, g, b)
+        for fill in computed_style(node).fills:
+            if fill.type == 'SOLID':
+                r, g, b = text_rgb = fill.color.rgb_ints
 
                 # Calculate contrast against white and black backgrounds
                 white_contrast = _contrast_ratio(text_rgb, (255, 255, 255))
@@ -2790,7 +3217,7 @@ def _generate_style_variables(
                 name = _sanitize_token_name(sp.get('name', 'spacing'))
                 padding = sp.get('padding', {})
                 gap = sp.get('gap', 0)
-                key = f"{padding.get('top', 0)}-{padding.get('right', 0)}-{gap}"
+                key = (padding.get('top', 0), padding.get('right', 0), padding.get('bottom', 0), padding.get('left', 0), gap)
                 if key not in seen_spacing:
                     seen_spacing.add(key)
                     if is_css:
@@ -2810,7 +3237,7 @@ def _generate_style_variables(
                 y = offset.get('y', 0)
                 blur = effect.get('radius', 0)
                 spread = effect.get('spread', 0)
-                key = f"{hex_val}-{x}-{y}-{blur}"
+                key = (effect.get('type'), hex_val, x, y, blur, spread)
                 if key not in seen_shadows:
                     seen_shadows.add(key)
                     name = _sanitize_token_name(effect.get('name', 'shadow'))
@@ -2900,220 +3327,257 @@ def _generate_tailwind_config(colors: List[Dict], typography: List[Dict], spacin
     return "\n".join(lines)
 
 
-def _extract_colors_from_node(node: Dict[str, Any], colors: List[Dict[str, Any]]) -> None:
-    """Recursively extract colors from node tree with full gradient and image support."""
-    node_name = node.get('name', 'Unknown')
+def _canonical_token_key(value: Any) -> str:
+    """Canonical encoding of a token value: equal values give equal keys regardless of key order."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
 
-    # Fill colors (with gradient and image support)
-    fills = node.get('fills', [])
-    for fill in fills:
-        fill_data = _extract_fill_data(fill, node_name)
-        if fill_data:
-            colors.append(fill_data)
-
-    # Stroke colors (using comprehensive stroke extraction)
-    stroke_data = _extract_stroke_data(node)
-    if stroke_data and stroke_data['colors']:
-        for stroke_color in stroke_data['colors']:
-            colors.append({
-                'name': node_name,
-                'category': 'stroke',
-                'fillType': stroke_color.get('type', 'SOLID'),
-                'color': stroke_color.get('color'),
-                'gradient': stroke_color.get('gradient'),
-                'opacity': stroke_color.get('opacity', 1),
-                'blendMode': stroke_color.get('blendMode', 'NORMAL'),
-                'strokeWeight': stroke_data['weight'],
-                'strokeAlign': stroke_data['align']
-            })
 
-    # Shadow colors
-    effects_data = _extract_effects_data(node)
-    if effects_data['shadows']:
-        for shadow in effects_data['shadows']:
-            colors.append({
-                'name': node_name,
-                'category': 'shadow',
-                'fillType': 'SOLID',
-                'color': shadow['color'],
-                'shadowType': shadow['type'],
-                'offset': shadow['offset'],
-                'radius': shadow['radius'],
-                'spread': shadow['spread']
-            })
+def _color_token_key(color: Dict[str, Any]) -> str:
+    """Dedup key for a color token: hex, then gradient/image identity."""
+    if color.get('hex'):
+        return color['hex']
+    if color.get('color'):
+        return color['color']
+    if color.get('gradient'):
+        return _canonical_token_key(color['gradient'])
+    if color.get('image'):
+        return color['image'].get('imageRef') or _canonical_token_key(color['image'])
+    return _canonical_token_key(color)
 
-    # Recurse into children
-    for child in node.get('children', []):
-        _extract_colors_from_node(child, colors)
 
+# Per-node fields of a typography token; they describe the first usage, not the style.
+_TYPOGRAPHY_SAMPLE_FIELDS = frozenset({'name', 'characters', 'hyperlink'})
+_TOKEN_NODE_REFS_LIMIT = 10
 
-def _extract_typography_from_node(node: Dict[str, Any], typography: List[Dict[str, Any]]) -> None:
-    """Recursively extract typography from node tree with advanced text properties."""
-    if node.get('type') == 'TEXT':
-        style = node.get('style', {})
 
-        # Extract text fills for color
-        fills = node.get('fills', [])
-        text_color = None
-        text_gradient = None
-        for fill in fills:
-            if fill.get('visible', True):
-                if fill.get('type') == 'SOLID':
-                    text_color = _rgba_to_hex(fill.get('color', {}))
-                elif fill.get('type', '').startswith('GRADIENT_'):
-                    text_gradient = {
-                        'type': fill.get('type').replace('GRADIENT_', ''),
-                        'stops': _extract_gradient_stops(fill.get('gradientStops', []))
-                    }
-                break
-
-        typography.append({
-            'name': node.get('name', 'Unknown'),
-            'characters': node.get('characters', ''),
-
-            # Font properties
-            'fontFamily': style.get('fontFamily', 'Unknown'),
-            'fontWeight': style.get('fontWeight', 400),
-            'fontSize': style.get('fontSize', 16),
-            'fontStyle': style.get('italic', False) and 'italic' or 'normal',
-
-            # Spacing
-            'lineHeight': style.get('lineHeightPx'),
-            'lineHeightUnit': style.get('lineHeightUnit', 'PIXELS'),
-            'lineHeightPercent': style.get('lineHeightPercent'),
-            'letterSpacing': style.get('letterSpacing', 0),
-            'paragraphSpacing': style.get('paragraphSpacing', 0),
-            'paragraphIndent': style.get('paragraphIndent', 0),
-
-            # Alignment
-            'textAlign': style.get('textAlignHorizontal', 'LEFT'),
-            'textAlignVertical': style.get('textAlignVertical', 'TOP'),
+class _TokenRegistry:
+    """Tokens of one category keyed by value, with usage counts and node back-references.
 
-            # Decoration
-            'textCase': style.get('textCase', 'ORIGINAL'),
-            'textDecoration': style.get('textDecoration', 'NONE'),
-
-            # Auto-resize
-            'textAutoResize': node.get('textAutoResize', 'NONE'),
-
-            # Truncation
-            'textTruncation': node.get('textTruncation', 'DISABLED'),
-            'maxLines': node.get('maxLines'),
-
-            # Color
-            'color': text_color,
-            'gradient': text_gradient,
-
-            # OpenType features
-            'openTypeFeatures': style.get('openTypeFeatures', {}),
-
-            # Hyperlink
-            'hyperlink': node.get('hyperlink')
-        })
-
-    for child in node.get('children', []):
-        _extract_typography_from_node(child, typography)
-
-
-def _extract_spacing_from_node(node: Dict[str, Any], spacing: List[Dict[str, Any]]) -> None:
-    """Recursively extract spacing/padding from node tree with advanced layout properties."""
-    node_name = node.get('name', 'Unknown')
-
-    # Auto-layout properties (comprehensive)
-    auto_layout = _extract_auto_layout(node)
-    if auto_layout:
-        spacing.append({
-            'name': node_name,
-            'type': 'auto-layout',
-            **auto_layout
-        })
-
-    # Absolute bounds
-    bbox = node.get('absoluteBoundingBox', {})
-    if bbox:
-        bounds_data = {
-            'name': node_name,
-            'type': 'bounds',
-            'width': bbox.get('width', 0),
-            'height': bbox.get('height', 0),
-            'x': bbox.get('x', 0),
-            'y': bbox.get('y', 0)
-        }
+    The first node using a value supplies the token's name and sample fields;
+    later nodes only raise ``usageCount`` and extend ``nodeIds`` (capped at
+    ``_TOKEN_NODE_REFS_LIMIT``). A node using a value twice counts once.
+    """
 
-        # Add size constraints if present
-        size_constraints = _extract_size_constraints(node)
-        if size_constraints:
-            bounds_data['sizeConstraints'] = size_constraints
-
-        # Add layout positioning for children in auto-layout
-        if 'layoutAlign' in node:
-            bounds_data['layoutAlign'] = node['layoutAlign']
-        if 'layoutGrow' in node:
-            bounds_data['layoutGrow'] = node['layoutGrow']
-        if 'layoutPositioning' in node:
-            bounds_data['layoutPositioning'] = node['layoutPositioning']
-
-        spacing.append(bounds_data)
-
-    # Layout constraints for responsive behavior
-    constraints = _extract_constraints(node)
-    if constraints:
-        spacing.append({
-            'name': node_name,
-            'type': 'constraints',
-            **constraints
-        })
+    def __init__(self) -> None:
+        # key -> [token, usage count, node ids, last node id]
+        self._entries: Dict[Any, List[Any]] = {}
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._entries
+
+    def use(self, key: Any, node_id: str) -> bool:
+        """Record another use of an existing token; False when the key is new."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry[3] != node_id:
+            entry[1] += 1
+            entry[3] = node_id
+            if len(entry[2]) < _TOKEN_NODE_REFS_LIMIT:
+                entry[2].append(node_id)
+        return True
 
-    for child in node.get('children', []):
-        _extract_spacing_from_node(child, spacing)
+    def add(self, key: Any, token: Dict[str, Any], node_id: str) -> None:
+        if not self.use(key, node_id):
+            self._entries[key] = [token, 1, [node_id], node_id]
 
+    def tokens(self) -> List[Dict[str, Any]]:
+        """Tokens ranked by usage; ties keep document order."""
+        ranked = sorted(self._entries.values(), key=lambda entry: -entry[1])
+        return [{**token, 'usageCount': count, 'nodeIds': node_ids} for token, count, node_ids, _ in ranked]
 
-def _extract_shadows_from_node(node: Dict[str, Any], shadows: List[Dict[str, Any]]) -> None:
-    """Recursively extract all effects (shadows and blurs) from node tree."""
-    effects_data = _extract_effects_data(node)
-    node_name = node.get('name', 'Unknown')
 
-    # Add shadows
-    if effects_data['shadows']:
-        for shadow in effects_data['shadows']:
-            shadows.append({
-                'name': node_name,
-                'type': shadow['type'],
-                'color': shadow['color'],
-                'offset': shadow['offset'],
-                'radius': shadow['radius'],
-                'spread': shadow['spread'],
-                'blendMode': shadow['blendMode'],
-                'showShadowBehindNode': shadow['showShadowBehindNode']
-            })
+def _typography_token(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Typography token for a TEXT node with advanced text properties."""
+    style = node.get('style', {})
 
-    # Add blurs
-    if effects_data['blurs']:
-        for blur in effects_data['blurs']:
-            shadows.append({
-                'name': node_name,
-                'type': blur['type'],
-                'radius': blur['radius']
-            })
+    # Extract text fills for color
+    text_color = None
+    text_gradient = None
+    for fill in node.get('fills', []):
+        if fill.get('visible', True):
+            if fill.get('type') == 'SOLID':
+                text_color = _rgba_to_hex(fill.get('color', {}))
+            elif fill.get('type', '').startswith('GRADIENT_'):
+                text_gradient = {
+                    'type': fill.get('type').replace('GRADIENT_', ''),
+                    'stops': _extract_gradient_stops(fill.get('gradientStops', []))
+                }
+            break
 
-    for child in node.get('children', []):
-        _extract_shadows_from_node(child, shadows)
+    return {
+        'name': node.get('name', 'Unknown'),
+        'characters': node.get('characters', ''),
+
+        # Font properties
+        'fontFamily': style.get('fontFamily', 'Unknown'),
+        'fontWeight': style.get('fontWeight', 400),
+        'fontSize': style.get('fontSize', 16),
+        'fontStyle': style.get('italic', False) and 'italic' or 'normal',
+
+        # Spacing
+        'lineHeight': style.get('lineHeightPx'),
+        'lineHeightUnit': style.get('lineHeightUnit', 'PIXELS'),
+        'lineHeightPercent': style.get('lineHeightPercent'),
+        'letterSpacing': style.get('letterSpacing', 0),
+        'paragraphSpacing': style.get('paragraphSpacing', 0),
+        'paragraphIndent': style.get('paragraphIndent', 0),
+
+        # Alignment
+        'textAlign': style.get('textAlignHorizontal', 'LEFT'),
+        'textAlignVertical': style.get('textAlignVertical', 'TOP'),
+
+        # Decoration
+        'textCase': style.get('textCase', 'ORIGINAL'),
+        'textDecoration': style.get('textDecoration', 'NONE'),
+
+        # Auto-resize
+        'textAutoResize': node.get('textAutoResize', 'NONE'),
+
+        # Truncation
+        'textTruncation': node.get('textTruncation', 'DISABLED'),
+        'maxLines': node.get('maxLines'),
+
+        # Color
+        'color': text_color,
+        'gradient': text_gradient,
+
+        # OpenType features
+        'openTypeFeatures': style.get('openTypeFeatures', {}),
+
+        # Hyperlink
+        'hyperlink': node.get('hyperlink')
+    }
 
 
-def _get_node_with_children(file_key: str, node_id: Optional[str], data: Dict[str, Any]) -> Dict[str, Any]:
-    """Get node with all children from file data."""
-    if node_id:
-        # Find node in document tree
-        def find_node(node: Dict[str, Any], target_id: str) -> Optional[Dict[str, Any]]:
-            if node.get('id') == target_id:
-                return node
-            for child in node.get('children', []):
-                result = find_node(child, target_id)
-                if result:
-                    return result
-            return None
-        return find_node(data.get('document', {}), node_id) or {}
-    return data.get('document', {})
+def _extract_design_tokens(
+    root: Dict[str, Any],
+    include_colors: bool = True,
+    include_typography: bool = True,
+    include_spacing: bool = True,
+    include_effects: bool = True,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Extract all token categories in one pre-order ``walk_nodes`` pass.
+
+    Each node's stroke and effect data is computed once and shared by the
+    color and effect facets. Every category is deduplicated by value in a
+    ``_TokenRegistry`` and ranked by usage, so each token carries
+    ``usageCount`` and ``nodeIds``; solid colors already seen are counted
+    before their rich color data is built. Stroke and shadow colors are keyed
+    apart from fills, so a shared hex keeps one token per usage kind.
+    """
+    colors = _TokenRegistry()
+    typography = _TokenRegistry()
+    spacing = _TokenRegistry()
+    shadows = _TokenRegistry()
+    blurs = _TokenRegistry()
+
+    for node, _, _, _ in walk_nodes(root):
+        node_name = node.get('name', 'Unknown')
+        node_id = node.get('id', '')
+
+        effects_data = None
+        if (include_colors or include_effects) and node.get('effects'):
+            effects_data = _extract_effects_data(node)
+
+        if include_colors:
+            # Fill colors (with gradient and image support)
+            for fill in node.get('fills', []):
+                if fill.get('type', 'SOLID') == 'SOLID' and fill.get('visible', True):
+                    if colors.use(_rgba_to_hex(fill.get('color', {})), node_id):
+                        continue
+                fill_data = _extract_fill_data(fill, node_name)
+                if fill_data:
+                    colors.add(_color_token_key(fill_data), fill_data, node_id)
+
+            # Stroke colors
+            strokes = node.get('strokes')
+            if strokes and any(
+                stroke.get('visible', True)
+                and (
+                    stroke.get('type', 'SOLID') != 'SOLID'
+                    or not colors.use(('stroke', _rgba_to_hex(stroke.get('color', {}))), node_id)
+                )
+                for stroke in strokes
+            ):
+                stroke_data = _extract_stroke_data(node)
+                for stroke_color in (stroke_data or {}).get('colors') or []:
+                    token = {
+                        'name': node_name,
+                        'category': 'stroke',
+                        'fillType': stroke_color.get('type', 'SOLID'),
+                        'color': stroke_color.get('color'),
+                        'gradient': stroke_color.get('gradient'),
+                        'opacity': stroke_color.get('opacity', 1),
+                        'blendMode': stroke_color.get('blendMode', 'NORMAL'),
+                        'strokeWeight': stroke_data['weight'],
+                        'strokeAlign': stroke_data['align']
+                    }
+                    colors.add(('stroke', _color_token_key(token)), token, node_id)
+
+            # Shadow colors
+            for shadow in (effects_data or {}).get('shadows') or []:
+                colors.add(('shadow', shadow['color']), {
+                    'name': node_name,
+                    'category': 'shadow',
+                    'fillType': 'SOLID',
+                    'color': shadow['color'],
+                    'shadowType': shadow['type'],
+                    'offset': shadow['offset'],
+                    'radius': shadow['radius'],
+                    'spread': shadow['spread']
+                }, node_id)
+
+        if include_typography and node.get('type') == 'TEXT':
+            token = _typography_token(node)
+            key = _canonical_token_key(
+                {field: value for field, value in token.items() if field not in _TYPOGRAPHY_SAMPLE_FIELDS}
+            )
+            typography.add(key, token, node_id)
+
+        if include_spacing:
+            auto_layout = _extract_auto_layout(node)
+            if auto_layout:
+                spacing.add(_canonical_token_key(auto_layout), {
+                    'name': node_name,
+                    'type': 'auto-layout',
+                    **auto_layout
+                }, node_id)
+
+        if include_effects and effects_data:
+            for shadow in effects_data['shadows'] or []:
+                key = (
+                    shadow['type'], shadow['color'], shadow['offset']['x'], shadow['offset']['y'],
+                    shadow['radius'], shadow['spread'], shadow['blendMode'],
+                )
+                shadows.add(key, {
+                    'name': node_name,
+                    'type': shadow['type'],
+                    'color': shadow['color'],
+                    'offset': shadow['offset'],
+                    'radius': shadow['radius'],
+                    'spread': shadow['spread'],
+                    'blendMode': shadow['blendMode'],
+                    'showShadowBehindNode': shadow['showShadowBehindNode']
+                }, node_id)
+            for blur in effects_data['blurs'] or []:
+                blurs.add((blur['type'], blur['radius']), {
+                    'name': node_name,
+                    'type': blur['type'],
+                    'radius': blur['radius']
+                }, node_id)
+
+    tokens: Dict[str, List[Dict[str, Any]]] = {}
+    if include_colors:
+        tokens['colors'] = colors.tokens()
+    if include_typography:
+        tokens['typography'] = typography.tokens()
+    if include_spacing:
+        tokens['spacing'] = spacing.tokens()
+    if include_effects:
+        tokens['shadows'] = shadows.tokens()
+        tokens['blurs'] = blurs.tokens()
+    return tokens
 
 
 def _node_has_downloadable_assets(node: Dict[str, Any]) -> bool:
@@ -3150,7 +3614,37 @@ def _node_to_simplified_tree(
     min_children_count: int = 0,
     mark_downloadable_assets: bool = True
 ) -> Optional[Dict[str, Any]]:
-    """Convert Figma node to simplified tree structure with smart filtering."""
+    """Convert Figma node to simplified tree structure with smart filtering.
+
+    Filtered-out containers are pruned together with their subtrees.
+    """
+    root = _simplify_tree_node(node, include_empty_frames, min_children_count, mark_downloadable_assets)
+    if root is None:
+        return None
+
+    simplified_by_node = {id(node): root}
+    for current, parent, _, _ in walk_nodes(
+        node,
+        max_depth=depth - current_depth,
+        descend=lambda visited, _depth: id(visited) in simplified_by_node,
+    ):
+        if parent is None:
+            continue
+        simplified = _simplify_tree_node(current, include_empty_frames, min_children_count, mark_downloadable_assets)
+        if simplified is None:
+            continue
+        simplified_by_node[id(current)] = simplified
+        simplified_by_node[id(parent)].setdefault('children', []).append(simplified)
+    return root
+
+
+def _simplify_tree_node(
+    node: Dict[str, Any],
+    include_empty_frames: bool,
+    min_children_count: int,
+    mark_downloadable_assets: bool
+) -> Optional[Dict[str, Any]]:
+    """Summarize one node for ``_node_to_simplified_tree``; None when it is filtered out."""
     node_type = node.get('type', '')
     children = node.get('children', [])
 
@@ -3185,24 +3679,6 @@ def _node_to_simplified_tree(
     if mark_downloadable_assets and _node_has_downloadable_assets(node):
         simplified['hasAsset'] = True
 
-    # Add children if within depth limit
-    if current_depth < depth and children:
-        filtered_children = []
-        for child in children:
-            child_tree = _node_to_simplified_tree(
-                child,
-                depth,
-                current_depth + 1,
-                include_empty_frames,
-                min_children_count,
-                mark_downloadable_assets
-            )
-            if child_tree is not None:
-                filtered_children.append(child_tree)
-
-        if filtered_children:
-            simplified['children'] = filtered_children
-
     return simplified
 
 
@@ -3246,11 +3722,11 @@ async def figma_get_file_structure(params: FigmaFileInput) -> str:
         - Skip noise: include_empty_frames=False, min_children_count=1
     """
     try:
-        data = await _make_figma_request(f"files/{params.file_key}")
+        fetched = await _fetch_document(params.file_key)
 
-        document = data.get('document', {})
-        name = data.get('name', 'Unknown')
-        last_modified = data.get('lastModified', 'Unknown')
+        document = fetched.root
+        name = fetched.meta.get('name') or 'Unknown'
+        last_modified = fetched.meta.get('lastModified') or 'Unknown'
 
         # Build simplified tree with filtering options
         tree = _node_to_simplified_tree(
@@ -3268,21 +3744,19 @@ async def figma_get_file_structure(params: FigmaFileInput) -> str:
                 'lastModified': last_modified,
                 'document': tree
             }
-            return json.dumps(response, indent=2)
+            return _json_response(response, hint="Lower depth or use figma_get_node_details on a subtree.")
 
         # Markdown format
-        lines = [
+        lines = _ResponseBuilder([
             f"# Figma File: {name}",
             f"**Last Modified:** {last_modified}",
             f"**File Key:** `{params.file_key}`",
             "",
             "## Document Structure",
             ""
-        ]
+        ])
 
-        def format_tree(node: Dict, indent: int = 0) -> None:
-            if node is None:
-                return
+        def format_node(node: Dict, indent: int) -> None:
             prefix = "  " * indent
             icon = "📄" if node.get('type') == 'DOCUMENT' else \
                    "📑" if node.get('type') == 'CANVAS' else \
@@ -3299,12 +3773,13 @@ async def figma_get_file_structure(params: FigmaFileInput) -> str:
 
             lines.append(f"{prefix}{icon} **{node.get('name')}** `{node.get('id')}`{size_str}{asset_marker}")
 
-            for child in node.get('children', []):
-                format_tree(child, indent + 1)
+        if tree is not None:
+            for node, _, indent, _ in walk_nodes(tree):
+                format_node(node, indent)
+                if lines.full:
+                    break
 
-        format_tree(tree)
-
-        return "\n".join(lines)
+        return lines.render(hint="Lower depth or use figma_get_node_details on a subtree.")
 
     except Exception as e:
         return _handle_api_error(e)
@@ -3347,14 +3822,8 @@ async def figma_get_node_details(params: FigmaNodeInput) -> str:
         str: Comprehensive node details in requested format
     """
     try:
-        data = await _make_figma_request(
-            f"files/{params.file_key}/nodes",
-            params={"ids": params.node_id}
-        )
-
-        nodes = data.get('nodes', {})
-        node_data = nodes.get(params.node_id, {})
-        node = node_data.get('document', {})
+        document = await _fetch_document(params.file_key, params.node_id)
+        node = document.root
 
         if not node:
             return f"Error: Node '{params.node_id}' not found in file."
@@ -3540,17 +4009,18 @@ async def figma_get_node_details(params: FigmaNodeInput) -> str:
         if children:
             node_details['childrenCount'] = len(children)
             node_details['children'] = _extract_children_summary(children, depth=0, max_depth=2)
+            node_details['descendants'] = _subtree_composition(document.index)
 
         if params.response_format == ResponseFormat.JSON:
-            return json.dumps(node_details, indent=2)
+            return _json_response(node_details, hint="Request a child node_id to narrow scope.")
 
         # Markdown format
-        lines = [
+        lines = _ResponseBuilder([
             f"# Node: {node_details['name']}",
             f"**ID:** `{node_details['id']}`",
             f"**Type:** {node_details['type']}",
             ""
-        ]
+        ])
 
         # Visibility/Lock status
         if not node_details.get('visible', True):
@@ -3880,6 +4350,16 @@ async def figma_get_node_details(params: FigmaNodeInput) -> str:
                         lines.append(f"  - WCAG: {issue['wcag']}")
             lines.append("")
 
+        # Subtree composition
+        if 'descendants' in node_details:
+            desc = node_details['descendants']
+            lines.append(f"## Descendants ({desc['total']} nodes)")
+            lines.append(f"- **By Type:** {', '.join(f'{t} {n}' for t, n in desc['byType'].items())}")
+            if desc.get('componentInstances'):
+                usage = ', '.join(f'`{cid}` ×{n}' for cid, n in desc['componentInstances'].items())
+                lines.append(f"- **Component Instances:** {usage}")
+            lines.append("")
+
         # Children
         if 'children' in node_details:
             lines.append(f"## Children ({node_details.get('childrenCount', 0)} nodes)")
@@ -3888,7 +4368,7 @@ async def figma_get_node_details(params: FigmaNodeInput) -> str:
         elif 'childrenCount' in node_details:
             lines.append(f"**Children:** {node_details['childrenCount']} child node(s)")
 
-        return "\n".join(lines)
+        return lines.render(hint="Request a child node_id to narrow scope.")
 
     except Exception as e:
         return _handle_api_error(e)
@@ -4013,137 +4493,98 @@ async def figma_get_design_tokens(params: FigmaDesignTokensInput) -> str:
             - file_key (str): Figma file key
             - node_id (Optional[str]): Specific node to analyze
             - include_colors, include_typography, include_spacing, include_effects: Toggle token types
+            - cursor (Optional[str]): Fetch the next page of one category
+            - page_size (int): Tokens per category and page
 
     Returns:
-        str: JSON formatted design tokens
+        str: JSON formatted design tokens; categories longer than page_size
+        list their remaining pages under ``pagination``
     """
     try:
-        if params.node_id:
-            data = await _make_figma_request(
-                f"files/{params.file_key}/nodes",
-                params={"ids": params.node_id, "geometry": "paths"}
+        request = result_handle(
+            "figma_get_design_tokens", params.file_key, params.node_id, params.include_colors,
+            params.include_typography, params.include_spacing, params.include_effects, params.include_generated_code,
+        )
+        page_at = _resolve_page_cursor(params.cursor, request)
+
+        def build_sections(node: Dict[str, Any]) -> Dict[str, List[Any]]:
+            tokens = _extract_design_tokens(
+                node,
+                include_colors=params.include_colors,
+                include_typography=params.include_typography,
+                include_spacing=params.include_spacing,
+                include_effects=params.include_effects,
             )
-            nodes = data.get('nodes', {})
-            node = nodes.get(params.node_id, {}).get('document', {})
-        else:
-            data = await _make_figma_request(f"files/{params.file_key}")
-            node = data.get('document', {})
-
-        tokens = {}
-
-        # Extract colors
-        if params.include_colors:
-            colors: List[Dict[str, Any]] = []
-            _extract_colors_from_node(node, colors)
-            # Deduplicate by color value
-            unique_colors = {}
-            for c in colors:
-                # Generate dedup key based on color type
-                if c.get('hex'):
-                    key = c['hex']
-                elif c.get('color'):
-                    key = c['color']
-                elif c.get('gradient'):
-                    key = str(c['gradient'])
-                elif c.get('image'):
-                    key = c['image'].get('imageRef', str(c['image']))
-                else:
-                    key = str(c)
-                if key not in unique_colors:
-                    unique_colors[key] = c
-            tokens['colors'] = list(unique_colors.values())
-
-        # Extract typography
-        if params.include_typography:
-            typography: List[Dict[str, Any]] = []
-            _extract_typography_from_node(node, typography)
-            tokens['typography'] = typography
-
-        # Extract spacing
-        if params.include_spacing:
-            spacing: List[Dict[str, Any]] = []
-            _extract_spacing_from_node(node, spacing)
-            # Filter to only auto-layout items
-            tokens['spacing'] = [s for s in spacing if s.get('type') == 'auto-layout']
-
-        # Extract effects (shadows, blurs)
-        if params.include_effects:
-            shadows: List[Dict[str, Any]] = []
-            _extract_shadows_from_node(node, shadows)
-            # Separate shadows and blurs
-            shadow_tokens = [s for s in shadows if 'SHADOW' in s.get('type', '')]
-            blur_tokens = [s for s in shadows if 'BLUR' in s.get('type', '')]
-
-            # Deduplicate shadows by value
-            unique_shadows = {}
-            for s in shadow_tokens:
-                key = f"{s.get('color', '')}-{s.get('offsetX', 0)}-{s.get('offsetY', 0)}-{s.get('blur', 0)}"
-                if key not in unique_shadows:
-                    unique_shadows[key] = s
-            tokens['shadows'] = list(unique_shadows.values())
-
-            # Deduplicate blurs by value
-            unique_blurs = {}
-            for b in blur_tokens:
-                key = f"{b.get('type', '')}-{b.get('radius', 0)}"
-                if key not in unique_blurs:
-                    unique_blurs[key] = b
-            tokens['blurs'] = list(unique_blurs.values())
-
-        # Format as design token standard
-        formatted_tokens = {
-            '$schema': 'https://design-tokens.github.io/community-group/format/',
-            'figmaFile': params.file_key,
-            'tokens': tokens
-        }
+            sections = dict(tokens)
+
+            # Generate ready-to-use code if requested
+            if params.include_generated_code:
+                colors_list = tokens.get('colors', [])
+                typography_list = tokens.get('typography', [])
+                spacing_list = tokens.get('spacing', [])
+                shadows_list = tokens.get('shadows', [])
+
+                sections['generated'] = [
+                    {'name': 'css_variables', 'code': _generate_css_variables(colors_list, typography_list, spacing_list, shadows_list)},
+                    {'name': 'scss_variables', 'code': _generate_scss_variables(colors_list, typography_list, spacing_list, shadows_list)},
+                    {'name': 'tailwind_config', 'code': _generate_tailwind_config(colors_list, typography_list, spacing_list)},
+                ]
+            return sections
+
+        handle, sections = await _paged_result(
+            request, page_at, params.file_key, params.node_id, bool(params.node_id), build_sections,
+        )
 
-        # Generate ready-to-use code if requested
-        if params.include_generated_code:
-            colors_list = tokens.get('colors', [])
-            typography_list = tokens.get('typography', [])
-            spacing_list = tokens.get('spacing', [])
-            shadows_list = tokens.get('shadows', [])
-
-            formatted_tokens['generated'] = {
-                'css_variables': _generate_css_variables(colors_list, typography_list, spacing_list, shadows_list),
-                'scss_variables': _generate_scss_variables(colors_list, typography_list, spacing_list, shadows_list),
-                'tailwind_config': _generate_tailwind_config(colors_list, typography_list, spacing_list)
+        if page_at is not None:
+            _, section, offset = page_at
+
+            def render_page(limit: int) -> Optional[str]:
+                page = ResultPages.page(handle, sections, section, offset, limit)
+                return _encode_within({'figmaFile': params.file_key, **page}, CHARACTER_LIMIT)
+
+            # Generated snippets can each be large, so they page one at a time.
+            limit = 1 if section == 'generated' else params.page_size
+            result = _largest_fitting_page(render_page, limit, minimum=1)
+            if result is not None:
+                return result
+            page = ResultPages.page(handle, sections, section, offset, 1)
+            return _json_response({'figmaFile': params.file_key, **page}, hint="Lower page_size.")
+
+        generated: Optional[Dict[str, Any]] = None
+        if 'generated' in sections:
+            generated = {item['name']: item['code'] for item in sections['generated']}
+
+        def render_first_pages(limit: int) -> Optional[str]:
+            # Format as design token standard; each category carries its first page
+            formatted_tokens: Dict[str, Any] = {
+                '$schema': 'https://design-tokens.github.io/community-group/format/',
+                'figmaFile': params.file_key,
+                'tokens': {}
             }
-
-        result = json.dumps(formatted_tokens, indent=2)
-
-        # Check character limit
-        if len(result) > CHARACTER_LIMIT:
-            # Step 1: Remove generated code (CSS/SCSS/Tailwind) - usually the biggest chunk
-            if 'generated' in formatted_tokens:
-                del formatted_tokens['generated']
-                result = json.dumps(formatted_tokens, indent=2)
-
-            # Step 2: If still too large, limit each token category
-            if len(result) > CHARACTER_LIMIT:
-                max_per_category = 100
-                if isinstance(formatted_tokens.get('tokens'), dict):
-                    for key in formatted_tokens['tokens']:
-                        if isinstance(formatted_tokens['tokens'][key], list) and len(formatted_tokens['tokens'][key]) > max_per_category:
-                            total = len(formatted_tokens['tokens'][key])
-                            formatted_tokens['tokens'][key] = formatted_tokens['tokens'][key][:max_per_category]
-                            formatted_tokens['tokens'][key].append({
-                                '_truncated': True,
-                                '_message': f'{total - max_per_category} more items. Use node_id to narrow scope.'
-                            })
-                result = json.dumps(formatted_tokens, indent=2)
-
-            # Step 3: If STILL too large, hard truncate with message
-            if len(result) > CHARACTER_LIMIT:
-                formatted_tokens['_warning'] = f'Result truncated from {len(result)} chars. Use node_id parameter to narrow scope.'
-                # Keep only first 20 of each
-                if isinstance(formatted_tokens.get('tokens'), dict):
-                    for key in formatted_tokens['tokens']:
-                        if isinstance(formatted_tokens['tokens'][key], list):
-                            formatted_tokens['tokens'][key] = formatted_tokens['tokens'][key][:20]
-                result = json.dumps(formatted_tokens, indent=2)
-
-        return result
+            pagination: Dict[str, Any] = {}
+            for key in sections:
+                if key == 'generated':
+                    continue
+                page = ResultPages.page(handle, sections, key, 0, limit)
+                formatted_tokens['tokens'][key] = page['items']
+                if page['nextCursor']:
+                    pagination[key] = {'total': page['total'], 'nextCursor': page['nextCursor']}
+            if generated is not None:
+                formatted_tokens['generated'] = generated
+            if pagination:
+                formatted_tokens['pagination'] = pagination
+            return _encode_within(formatted_tokens, CHARACTER_LIMIT)
+
+        result = render_first_pages(params.page_size)
+        if result is None and generated is not None:
+            generated = {
+                '_message': 'Generated code omitted to fit the response; fetch it with the cursor.',
+                'nextCursor': encode_cursor(handle, 'generated', 0),
+            }
+        if result is None:
+            # Categories shrink to a shorter first page; their cursors pick up the rest.
+            result = _largest_fitting_page(render_first_pages, params.page_size)
+        return result if result is not None else _json_response({'figmaFile': params.file_key}, hint="Lower page_size.")
 
     except Exception as e:
         return _handle_api_error(e)
@@ -4291,15 +4732,15 @@ async def figma_get_styles(params: FigmaStylesInput) -> str:
                 'effect_styles': effect_styles if params.include_effect_styles else [],
                 'grid_styles': grid_styles if params.include_grid_styles else []
             }
-            return json.dumps(result, indent=2)
+            return _json_response(result, hint="Turn off include_* flags to narrow scope.")
 
         # Markdown format
-        lines = [
+        lines = _ResponseBuilder([
             "# Published Styles",
             f"**File:** `{params.file_key}`",
             f"**Total Styles:** {len(styles)}",
             ""
-        ]
+        ])
 
         if fill_styles:
             lines.append("## 🎨 Fill/Color Styles")
@@ -4381,17 +4822,70 @@ async def figma_get_styles(params: FigmaStylesInput) -> str:
                 lines.append(f"- **Key:** `{style['key']}`")
                 lines.append("")
 
-        result = "\n".join(lines)
-
-        if len(result) > CHARACTER_LIMIT:
-            return result[:CHARACTER_LIMIT] + "\n\n... (truncated)"
-
-        return result
+        return lines.render(hint="Turn off include_* flags to narrow scope.")
 
     except Exception as e:
         return _handle_api_error(e)
 
 
+_CODE_FENCE_LANGUAGES = {
+    "react": "tsx", "react_tailwind": "tsx", "vue": "vue", "vue_tailwind": "vue",
+    "swiftui": "swift", "kotlin": "kotlin", "css": "css", "scss": "scss",
+}
+
+
+def _generate_framework_code(
+    node: Dict[str, Any],
+    framework: CodeFramework,
+    component_name: str,
+    dedupe_instances: bool = False,
+) -> str:
+    """Code for one target framework from an already fetched node tree."""
+    if framework in [CodeFramework.REACT, CodeFramework.REACT_TAILWIND]:
+        use_tailwind = framework == CodeFramework.REACT_TAILWIND
+        return _generate_react_code(node, component_name, use_tailwind, dedupe_instances=dedupe_instances)
+    if framework in [CodeFramework.VUE, CodeFramework.VUE_TAILWIND]:
+        use_tailwind = framework == CodeFramework.VUE_TAILWIND
+        return _generate_vue_code(node, component_name, use_tailwind)
+    if framework == CodeFramework.TAILWIND_ONLY:
+        bbox = node.get('absoluteBoundingBox', {})
+        fills = node.get('fills', [])
+        bg = ''
+        if fills and fills[0].get('type') == 'SOLID':
+            bg = f"bg-[{_rgba_to_hex(fills[0].get('color', {}))}]"
+        return f"w-[{int(bbox.get('width', 0))}px] h-[{int(bbox.get('height', 0))}px] {bg}"
+    if framework == CodeFramework.CSS:
+        return _generate_css_code(node, component_name)
+    if framework == CodeFramework.SCSS:
+        return _generate_scss_code(node, component_name)
+    if framework == CodeFramework.SWIFTUI:
+        from generators.swiftui_generator import generate_swiftui_code
+        return generate_swiftui_code(node, component_name, dedupe_instances=dedupe_instances)
+    if framework == CodeFramework.KOTLIN:
+        return _generate_kotlin_code(node, component_name)
+
+    # HTML/CSS
+    bbox = node.get('absoluteBoundingBox', {})
+    fills = node.get('fills', [])
+    bg = ''
+    if fills and fills[0].get('type') == 'SOLID':
+        bg = f"background-color: {_rgba_to_hex(fills[0].get('color', {}))};"
+
+    return f'''<!-- {component_name} -->
+<div class="{component_name.lower()}">
+  <!-- Content -->
+</div>
+
+<style>
+.{component_name.lower()} {{
+  width: {int(bbox.get('width', 0))}px;
+  height: {int(bbox.get('height', 0))}px;
+  {bg}
+}}
+</style>
+'''
+
+
 @_versioned_tool(
     name="figma_generate_code",
     annotations={
@@ -4424,93 +4918,69 @@ async def figma_generate_code(params: FigmaCodeGenInput) -> str:
             - file_key (str): Figma file key
             - node_id (str): Node ID to convert
             - framework: Target framework
+            - frameworks (Optional[List]): Several targets from one fetch; overrides framework
             - component_name (Optional[str]): Custom component name
+            - dedupe_instances (bool): Emit repeated instances once as a subcomponent (React, SwiftUI)
 
     Returns:
-        str: Generated code in the requested framework
+        str: Generated code in the requested framework, one section per
+        framework when several are requested
     """
     try:
         # Use nodes endpoint to get full node tree with all properties
         # (files endpoint may omit relativeTransform needed for flip detection)
-        if params.node_id:
-            data = await _make_figma_request(
-                f"files/{params.file_key}/nodes",
-                params={"ids": params.node_id, "geometry": "paths"}
-            )
-            nodes = data.get('nodes', {})
-            node = nodes.get(params.node_id, {}).get('document', {})
-        else:
-            data = await _make_figma_request(f"files/{params.file_key}")
-            node = data.get('document', {})
+        document = await _fetch_document(params.file_key, params.node_id, geometry=bool(params.node_id))
+        node = document.root
 
         if not node:
             return f"Error: Node '{params.node_id}' not found."
 
-        # Resolve imageRef fills into downloadable URLs when available.
+        # Resolve imageRef fills into downloadable URLs when available; the
+        # cached document is shared, so URLs are set on a private copy.
         image_refs: set[str] = set()
         _collect_image_refs_from_tree(node, image_refs)
         if image_refs:
             image_urls = await _resolve_image_urls(params.file_key, list(image_refs))
             if image_urls:
-                _attach_image_urls_to_tree(node, image_urls)
+                node = NodeStore(node).materialize(image_urls=image_urls)
 
         # Generate component name
         component_name = params.component_name or _sanitize_component_name(node.get('name', 'Component'))
 
-        # Generate code based on framework
-        if params.framework in [CodeFramework.REACT, CodeFramework.REACT_TAILWIND]:
-            use_tailwind = params.framework == CodeFramework.REACT_TAILWIND
-            code = _generate_react_code(node, component_name, use_tailwind)
-        elif params.framework in [CodeFramework.VUE, CodeFramework.VUE_TAILWIND]:
-            use_tailwind = params.framework == CodeFramework.VUE_TAILWIND
-            code = _generate_vue_code(node, component_name, use_tailwind)
-        elif params.framework == CodeFramework.TAILWIND_ONLY:
-            bbox = node.get('absoluteBoundingBox', {})
-            fills = node.get('fills', [])
-            bg = ''
-            if fills and fills[0].get('type') == 'SOLID':
-                bg = f"bg-[{_rgba_to_hex(fills[0].get('color', {}))}]"
-            code = f"w-[{int(bbox.get('width', 0))}px] h-[{int(bbox.get('height', 0))}px] {bg}"
-        elif params.framework == CodeFramework.CSS:
-            code = _generate_css_code(node, component_name)
-        elif params.framework == CodeFramework.SCSS:
-            code = _generate_scss_code(node, component_name)
-        elif params.framework == CodeFramework.SWIFTUI:
-            from generators.swiftui_generator import generate_swiftui_code
-            code = generate_swiftui_code(node, component_name)
-        elif params.framework == CodeFramework.KOTLIN:
-            code = _generate_kotlin_code(node, component_name)
-        else:
-            # HTML/CSS
-            bbox = node.get('absoluteBoundingBox', {})
-            fills = node.get('fills', [])
-            bg = ''
-            if fills and fills[0].get('type') == 'SOLID':
-                bg = f"background-color: {_rgba_to_hex(fills[0].get('color', {}))};"
-
-            code = f'''<!-- {component_name} -->
-<div class="{component_name.lower()}">
-  <!-- Content -->
-</div>
+        frameworks = list(dict.fromkeys(params.frameworks or [params.framework]))
+        if len(frameworks) == 1:
+            code = _generate_framework_code(node, frameworks[0], component_name, params.dedupe_instances)
+            return "\n".join([
+                f"# Generated Code: {component_name}",
+                f"**Framework:** {frameworks[0].value}",
+                f"**Source Node:** `{params.node_id}`",
+                "",
+                "```" + _CODE_FENCE_LANGUAGES.get(frameworks[0].value, "html"),
+                code,
+                "```"
+            ])
 
-<style>
-.{component_name.lower()} {{
-  width: {int(bbox.get('width', 0))}px;
-  height: {int(bbox.get('height', 0))}px;
-  {bg}
-}}
-</style>
-'''
+        # Every target reads the same materialized tree; worker threads start
+        # from a copy of this context, so they share the request's style cache.
+        codes = await asyncio.gather(*(
+            asyncio.to_thread(_generate_framework_code, node, framework, component_name, params.dedupe_instances)
+            for framework in frameworks
+        ))
 
         lines = [
             f"# Generated Code: {component_name}",
-            f"**Framework:** {params.framework.value}",
+            f"**Frameworks:** {', '.join(framework.value for framework in frameworks)}",
             f"**Source Node:** `{params.node_id}`",
-            "",
-            "```" + {"react": "tsx", "react_tailwind": "tsx", "vue": "vue", "vue_tailwind": "vue", "swiftui": "swift", "kotlin": "kotlin", "css": "css", "scss": "scss"}.get(params.framework.value, "html"),
-            code,
-            "```"
         ]
+        for framework, code in zip(frameworks, codes):
+            lines.extend([
+                "",
+                f"## {framework.value}",
+                "",
+                "```" + _CODE_FENCE_LANGUAGES.get(framework.value, "html"),
+                code,
+                "```"
+            ])
 
         return "\n".join(lines)
 
@@ -4522,188 +4992,207 @@ async def figma_generate_code(params: FigmaCodeGenInput) -> str:
 # Deterministic Pipeline Tool
 # ============================================================================
 
+@dataclass
+class _PipelineSetup:
+    """Environment-resolved settings and dependencies shared by the pipeline tools."""
+
+    config: PipelineConfig
+    deps: PipelineDependencies
+    mode: PipelineMode
+    target_match: float
+    max_visual_iterations: int
+    auto_render_implementation: bool
+    visual_mode: str
+    pipeline_enabled: bool
+    pipeline_scope: str
+    component_pool: ComponentPool
+
+
+def _prepare_pipeline(
+    params: Union[FigmaPipelineRunInput, FigmaPipelineBatchInput],
+    render_pool: Optional[ImplementationRenderPool] = None,
+) -> Union[str, _PipelineSetup]:
+    """Resolve pipeline flags from the environment and wire Figma-backed dependencies.
+
+    Returns an error message when the requested framework is outside the configured scope.
+    """
+    pipeline_enabled = _env_bool("FIGMA_PIPELINE_V2_ENABLED", PIPELINE_V2_DEFAULT_ENABLED)
+    pipeline_scope = os.getenv("FIGMA_PIPELINE_V2_SCOPE", PIPELINE_V2_DEFAULT_SCOPE).strip().lower()
+    visual_mode = os.getenv("FIGMA_PIPELINE_VISUAL_MODE", PIPELINE_V2_DEFAULT_VISUAL_MODE)
+    cache_enabled = _env_bool("FIGMA_PIPELINE_CACHE_ENABLED", PIPELINE_V2_DEFAULT_CACHE_ENABLED)
+    strict_pixel_default = _env_bool("FIGMA_PIPELINE_STRICT_PIXEL_DEFAULT", PIPELINE_V2_DEFAULT_STRICT_PIXEL)
+    auto_render_default = _env_bool("FIGMA_PIPELINE_AUTO_RENDER_ENABLED", PIPELINE_V2_DEFAULT_AUTO_RENDER)
+    env_target_match = _env_float("FIGMA_PIPELINE_TARGET_MATCH", PIPELINE_V2_DEFAULT_TARGET_MATCH)
+    env_max_visual_iter = _env_int("FIGMA_PIPELINE_MAX_VISUAL_ITER", PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER)
+    pass_threshold = _env_float("FIGMA_PIPELINE_PASS_THRESHOLD", PIPELINE_V2_DEFAULT_PASS_THRESHOLD)
+    warn_threshold = _env_float("FIGMA_PIPELINE_WARN_THRESHOLD", PIPELINE_V2_DEFAULT_WARN_THRESHOLD)
+    evidence_mode = os.getenv("FIGMA_PIPELINE_EVIDENCE_MODE", PIPELINE_V2_DEFAULT_EVIDENCE_MODE).strip().lower()
+    evidence_max_dim = max(0, _env_int("FIGMA_PIPELINE_EVIDENCE_MAX_DIM", PIPELINE_V2_DEFAULT_EVIDENCE_MAX_DIM))
+    evidence_palette = _env_bool("FIGMA_PIPELINE_EVIDENCE_PALETTE", PIPELINE_V2_DEFAULT_EVIDENCE_PALETTE)
+    cache_max_mb = _env_float("FIGMA_PIPELINE_CACHE_MAX_MB", PIPELINE_V2_DEFAULT_CACHE_MAX_MB)
+    cache_ttl_hours = _env_float("FIGMA_PIPELINE_CACHE_TTL_HOURS", PIPELINE_V2_DEFAULT_CACHE_TTL_HOURS)
+    codegen_workers = max(0, _env_int("FIGMA_PIPELINE_CODEGEN_WORKERS", PIPELINE_V2_DEFAULT_CODEGEN_WORKERS))
+    visual_workers = max(0, _env_int("FIGMA_PIPELINE_VISUAL_WORKERS", PIPELINE_V2_DEFAULT_VISUAL_WORKERS))
+    pass_threshold = max(0.0, min(pass_threshold, 100.0))
+    warn_threshold = max(0.0, min(warn_threshold, pass_threshold))
+
+    target_match = params.target_match
+    if params.target_match == PIPELINE_V2_DEFAULT_TARGET_MATCH:
+        target_match = env_target_match
+
+    max_visual_iterations = params.max_visual_iterations
+    if params.max_visual_iterations == PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER:
+        max_visual_iterations = max(1, min(env_max_visual_iter, 5))
+
+    auto_render_implementation = params.auto_render_implementation
+    if params.auto_render_implementation == PIPELINE_V2_DEFAULT_AUTO_RENDER:
+        auto_render_implementation = auto_render_default
+
+    mode = params.mode
+    if params.mode == PipelineMode.STRICT_PIXEL and not strict_pixel_default:
+        mode = PipelineMode.STRICT_PIXEL_PLUS_RESPONSIVE
+
+    if pipeline_scope not in {"react", "all"}:
+        pipeline_scope = PIPELINE_V2_DEFAULT_SCOPE
+
+    if pipeline_scope == "react" and params.framework not in {CodeFramework.REACT, CodeFramework.REACT_TAILWIND}:
+        return "Error: Current deterministic pipeline scope supports only React frameworks."
+
+    if target_match > 0:
+        pass_threshold = max(pass_threshold, target_match * 100.0)
+        warn_threshold = min(warn_threshold, pass_threshold)
+
+    async def _fetch_snapshot(file_key: str, node_id: str) -> Dict[str, Any]:
+        return await _make_figma_request(
+            f"files/{file_key}/nodes",
+            params={"ids": node_id, "geometry": "paths"}
+        )
+
+    async def _probe_file_version(file_key: str) -> Optional[str]:
+        # depth=1 returns only file metadata and page stubs, not the node tree.
+        data = await _make_figma_request(f"files/{file_key}", params={"depth": 1})
+        return data.get("lastModified")
+
+    async def _extract_tokens_for_pipeline(
+        _file_key: str,
+        _node_id: str,
+        root_node: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return _extract_design_tokens(root_node)
+
+    async def _get_figma_screenshot_path(file_key: str, node_id: str, scale: float) -> Optional[str]:
+        response = await figma_get_screenshot(
+            FigmaScreenshotInput(
+                file_key=file_key,
+                node_ids=[node_id],
+                format=ImageFormat.PNG,
+                scale=scale
+            )
+        )
+        content = _strip_version_footer(response)
+        match = re.search(r"`(/[^`]+\.(?:png|jpg|jpeg|svg|pdf))`", content)
+        if match:
+            return match.group(1)
+        return None
+
+    async def _render_implementation_screenshot(
+        generated_code: str,
+        component_name: str,
+        asset_manifest: List[Dict[str, Any]],
+        viewport_width: int,
+        viewport_height: int,
+        output_path: str,
+        use_tailwind: bool,
+    ) -> Dict[str, Any]:
+        return await render_react_implementation_screenshot(
+            generated_code=generated_code,
+            component_name=component_name,
+            asset_manifest=asset_manifest,
+            viewport_width=viewport_width,
+            viewport_height=viewport_height,
+            output_path=output_path,
+            use_tailwind=use_tailwind,
+            pool=render_pool,
+        )
+
+
+    config = PipelineConfig(
+        pipeline_version=SERVER_VERSION,
+        cache_root=Path(PIPELINE_V2_DEFAULT_CACHE_DIR),
+        output_root=Path(params.output_dir or ".qa/runs"),
+        cache_enabled=cache_enabled,
+        cache_max_bytes=int(cache_max_mb * 1024 * 1024) if cache_max_mb > 0 else None,
+        cache_ttl_seconds=cache_ttl_hours * 3600.0 if cache_ttl_hours > 0 else None,
+        pass_threshold=pass_threshold,
+        warn_threshold=warn_threshold,
+        visual_mode=visual_mode,
+        visual_evidence_mode=evidence_mode,
+        visual_evidence_max_dimension=evidence_max_dim,
+        visual_evidence_palette=evidence_palette,
+        codegen_workers=codegen_workers or None,
+        visual_workers=visual_workers or None,
+    )
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_fetch_snapshot,
+        extract_tokens=_extract_tokens_for_pipeline,
+        resolve_image_urls=_resolve_image_urls,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize_component_name,
+        get_figma_screenshot=_get_figma_screenshot_path,
+        render_implementation_screenshot=_render_implementation_screenshot,
+        probe_file_version=_probe_file_version,
+        render_subtree_jsx=_recursive_node_to_jsx,
+    )
+
+    return _PipelineSetup(
+        config=config,
+        deps=deps,
+        mode=mode,
+        target_match=target_match,
+        max_visual_iterations=max_visual_iterations,
+        auto_render_implementation=auto_render_implementation,
+        visual_mode=visual_mode,
+        pipeline_enabled=pipeline_enabled,
+        pipeline_scope=pipeline_scope,
+        component_pool=_COMPONENT_POOLS.setdefault(codegen_workers, ComponentPool(codegen_workers or None)),
+    )
+
+
 @_versioned_tool(
     name="figma_run_pipeline",
     annotations={
         "title": "Run Deterministic Figma Pipeline",
-        "readOnlyHint": True,
+        "readOnlyHint": False,
         "destructiveHint": False,
-        "idempotentHint": True,
+        "idempotentHint": False,
         "openWorldHint": True
     }
 )
 async def figma_run_pipeline(params: FigmaPipelineRunInput) -> str:
     """Run deterministic, cache-enabled pipeline for React/Tailwind output."""
     try:
-        pipeline_enabled = _env_bool("FIGMA_PIPELINE_V2_ENABLED", PIPELINE_V2_DEFAULT_ENABLED)
-        pipeline_scope = os.getenv("FIGMA_PIPELINE_V2_SCOPE", PIPELINE_V2_DEFAULT_SCOPE).strip().lower()
-        visual_mode = os.getenv("FIGMA_PIPELINE_VISUAL_MODE", PIPELINE_V2_DEFAULT_VISUAL_MODE)
-        cache_enabled = _env_bool("FIGMA_PIPELINE_CACHE_ENABLED", PIPELINE_V2_DEFAULT_CACHE_ENABLED)
-        strict_pixel_default = _env_bool("FIGMA_PIPELINE_STRICT_PIXEL_DEFAULT", PIPELINE_V2_DEFAULT_STRICT_PIXEL)
-        auto_render_default = _env_bool("FIGMA_PIPELINE_AUTO_RENDER_ENABLED", PIPELINE_V2_DEFAULT_AUTO_RENDER)
-        env_target_match = _env_float("FIGMA_PIPELINE_TARGET_MATCH", PIPELINE_V2_DEFAULT_TARGET_MATCH)
-        env_max_visual_iter = _env_int("FIGMA_PIPELINE_MAX_VISUAL_ITER", PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER)
-        pass_threshold = _env_float("FIGMA_PIPELINE_PASS_THRESHOLD", PIPELINE_V2_DEFAULT_PASS_THRESHOLD)
-        warn_threshold = _env_float("FIGMA_PIPELINE_WARN_THRESHOLD", PIPELINE_V2_DEFAULT_WARN_THRESHOLD)
-        pass_threshold = max(0.0, min(pass_threshold, 100.0))
-        warn_threshold = max(0.0, min(warn_threshold, pass_threshold))
-
-        target_match = params.target_match
-        if params.target_match == PIPELINE_V2_DEFAULT_TARGET_MATCH:
-            target_match = env_target_match
-
-        max_visual_iterations = params.max_visual_iterations
-        if params.max_visual_iterations == PIPELINE_V2_DEFAULT_MAX_VISUAL_ITER:
-            max_visual_iterations = max(1, min(env_max_visual_iter, 5))
-
-        auto_render_implementation = params.auto_render_implementation
-        if params.auto_render_implementation == PIPELINE_V2_DEFAULT_AUTO_RENDER:
-            auto_render_implementation = auto_render_default
-
-        mode = params.mode
-        if params.mode == PipelineMode.STRICT_PIXEL and not strict_pixel_default:
-            mode = PipelineMode.STRICT_PIXEL_PLUS_RESPONSIVE
-
-        if pipeline_scope not in {"react", "all"}:
-            pipeline_scope = PIPELINE_V2_DEFAULT_SCOPE
-
-        if pipeline_scope == "react" and params.framework not in {CodeFramework.REACT, CodeFramework.REACT_TAILWIND}:
-            return "Error: Current deterministic pipeline scope supports only React frameworks."
-
-        if target_match > 0:
-            pass_threshold = max(pass_threshold, target_match * 100.0)
-            warn_threshold = min(warn_threshold, pass_threshold)
-
-        async def _fetch_snapshot(file_key: str, node_id: str) -> Dict[str, Any]:
-            return await _make_figma_request(
-                f"files/{file_key}/nodes",
-                params={"ids": node_id, "geometry": "paths"}
-            )
-
-        async def _extract_tokens_for_pipeline(
-            _file_key: str,
-            _node_id: str,
-            root_node: Dict[str, Any]
-        ) -> Dict[str, Any]:
-            colors: List[Dict[str, Any]] = []
-            typography: List[Dict[str, Any]] = []
-            spacing: List[Dict[str, Any]] = []
-            effects: List[Dict[str, Any]] = []
-
-            _extract_colors_from_node(root_node, colors)
-            _extract_typography_from_node(root_node, typography)
-            _extract_spacing_from_node(root_node, spacing)
-            _extract_shadows_from_node(root_node, effects)
-
-            unique_colors: Dict[str, Dict[str, Any]] = {}
-            for c in colors:
-                if c.get('hex'):
-                    key = c['hex']
-                elif c.get('color'):
-                    key = c['color']
-                elif c.get('gradient'):
-                    key = str(c['gradient'])
-                elif c.get('image'):
-                    key = c['image'].get('imageRef', str(c['image']))
-                else:
-                    key = str(c)
-                if key not in unique_colors:
-                    unique_colors[key] = c
-
-            shadow_tokens = [s for s in effects if 'SHADOW' in s.get('type', '')]
-            blur_tokens = [s for s in effects if 'BLUR' in s.get('type', '')]
-
-            unique_shadows: Dict[str, Dict[str, Any]] = {}
-            for s in shadow_tokens:
-                key = f"{s.get('color', '')}-{s.get('offsetX', 0)}-{s.get('offsetY', 0)}-{s.get('blur', 0)}"
-                if key not in unique_shadows:
-                    unique_shadows[key] = s
-
-            unique_blurs: Dict[str, Dict[str, Any]] = {}
-            for b in blur_tokens:
-                key = f"{b.get('type', '')}-{b.get('radius', 0)}"
-                if key not in unique_blurs:
-                    unique_blurs[key] = b
-
-            return {
-                "colors": list(unique_colors.values()),
-                "typography": typography,
-                "spacing": [s for s in spacing if s.get('type') == 'auto-layout'],
-                "shadows": list(unique_shadows.values()),
-                "blurs": list(unique_blurs.values()),
-            }
-
-        async def _get_figma_screenshot_path(file_key: str, node_id: str, scale: float) -> Optional[str]:
-            response = await figma_get_screenshot(
-                FigmaScreenshotInput(
-                    file_key=file_key,
-                    node_ids=[node_id],
-                    format=ImageFormat.PNG,
-                    scale=scale
-                )
-            )
-            content = _strip_version_footer(response)
-            match = re.search(r"`(/[^`]+\.(?:png|jpg|jpeg|svg|pdf))`", content)
-            if match:
-                return match.group(1)
-            return None
-
-        async def _render_implementation_screenshot(
-            generated_code: str,
-            component_name: str,
-            asset_manifest: List[Dict[str, Any]],
-            viewport_width: int,
-            viewport_height: int,
-            output_path: str,
-            use_tailwind: bool,
-        ) -> Dict[str, Any]:
-            return await render_react_implementation_screenshot(
-                generated_code=generated_code,
-                component_name=component_name,
-                asset_manifest=asset_manifest,
-                viewport_width=viewport_width,
-                viewport_height=viewport_height,
-                output_path=output_path,
-                use_tailwind=use_tailwind,
-            )
+        setup = _prepare_pipeline(params)
+        if isinstance(setup, str):
+            return setup
 
         request = PipelineRunRequest(
             file_key=params.file_key,
             node_id=params.node_id,
             framework=params.framework.value,
-            mode=mode,
-            target_match=target_match,
+            mode=setup.mode,
+            target_match=setup.target_match,
             use_cache=params.use_cache,
-            max_visual_iterations=max_visual_iterations,
+            max_visual_iterations=setup.max_visual_iterations,
             output_dir=params.output_dir,
             run_label=params.run_label,
-            visual_mode=visual_mode,
+            visual_mode=setup.visual_mode,
             figma_screenshot_scale=params.figma_screenshot_scale,
             implementation_screenshot_path=params.implementation_screenshot_path,
-            auto_render_implementation=auto_render_implementation,
+            auto_render_implementation=setup.auto_render_implementation,
         )
 
-        config = PipelineConfig(
-            pipeline_version=SERVER_VERSION,
-            cache_root=Path(".qa/cache"),
-            output_root=Path(params.output_dir or ".qa/runs"),
-            cache_enabled=cache_enabled,
-            pass_threshold=pass_threshold,
-            warn_threshold=warn_threshold,
-            visual_mode=visual_mode,
-        )
-
-        deps = PipelineDependencies(
-            fetch_snapshot=_fetch_snapshot,
-            extract_tokens=_extract_tokens_for_pipeline,
-            resolve_image_urls=_resolve_image_urls,
-            generate_react_code=_generate_react_code,
-            sanitize_component_name=_sanitize_component_name,
-            get_figma_screenshot=_get_figma_screenshot_path,
-            render_implementation_screenshot=_render_implementation_screenshot,
-        )
-
-        runner = PipelineRunner(deps=deps, config=config)
+        runner = PipelineRunner(deps=setup.deps, config=setup.config, component_pool=setup.component_pool)
         result: PipelineRunResult = await runner.run(request)
 
         public_result = FigmaPipelineRunResult(
@@ -4719,9 +5208,9 @@ async def figma_run_pipeline(params: FigmaPipelineRunInput) -> str:
             cache_misses=result.cache_misses,
             metadata={
                 **result.metadata,
-                "shadow_mode": not pipeline_enabled,
-                "v2_enabled": pipeline_enabled,
-                "v2_scope": pipeline_scope,
+                "shadow_mode": not setup.pipeline_enabled,
+                "v2_enabled": setup.pipeline_enabled,
+                "v2_scope": setup.pipeline_scope,
             },
         )
 
@@ -4730,8 +5219,8 @@ async def figma_run_pipeline(params: FigmaPipelineRunInput) -> str:
             f"**Run ID:** `{public_result.run_id}`",
             f"**Status:** {public_result.status}",
             f"**Framework:** {params.framework.value}",
-            f"**Mode:** {mode.value}",
-            f"**Shadow Mode:** {'Yes' if not pipeline_enabled else 'No'}",
+            f"**Mode:** {setup.mode.value}",
+            f"**Shadow Mode:** {'Yes' if not setup.pipeline_enabled else 'No'}",
             "",
             "## Stage Timings",
         ]
@@ -4760,6 +5249,209 @@ async def figma_run_pipeline(params: FigmaPipelineRunInput) -> str:
         return _handle_api_error(e)
 
 
+@_versioned_tool(
+    name="figma_run_pipeline_batch",
+    annotations={
+        "title": "Run Deterministic Figma Pipeline for Many Nodes",
+        "readOnlyHint": False,
+        "destructiveHint": False,
+        "idempotentHint": False,
+        "openWorldHint": True
+    }
+)
+async def figma_run_pipeline_batch(params: FigmaPipelineBatchInput) -> str:
+    """
+    Run the deterministic pipeline for several nodes of one file in a single call.
+
+    Snapshots are fetched in one request, image refs are resolved once, and
+    implementation screenshots share one headless browser. Nodes run
+    concurrently up to `max_concurrency`; per-node artifacts are written as in
+    `figma_run_pipeline` plus an aggregate `batch-summary.json`.
+
+    Args:
+        params: FigmaPipelineBatchInput containing:
+            - file_key (str): Figma file key
+            - node_ids (List[str]): Nodes to run
+            - framework, mode, use_cache, target_match, max_visual_iterations
+            - output_dir (Optional[str]): Artifact directory
+            - max_concurrency (int): Concurrent node limit
+
+    Returns:
+        str: Markdown summary with per-node status and the aggregate JSON result
+    """
+    try:
+        async with ImplementationRenderPool(max_pages=params.max_concurrency) as render_pool:
+            setup = _prepare_pipeline(params, render_pool=render_pool)
+            if isinstance(setup, str):
+                return setup
+
+            requests = [
+                PipelineRunRequest(
+                    file_key=params.file_key,
+                    node_id=node_id,
+                    framework=params.framework.value,
+                    mode=setup.mode,
+                    target_match=setup.target_match,
+                    use_cache=params.use_cache,
+                    max_visual_iterations=setup.max_visual_iterations,
+                    output_dir=params.output_dir,
+                    visual_mode=setup.visual_mode,
+                    figma_screenshot_scale=params.figma_screenshot_scale,
+                    auto_render_implementation=setup.auto_render_implementation,
+                )
+                for node_id in dict.fromkeys(params.node_ids)
+            ]
+
+            runner = PipelineRunner(deps=setup.deps, config=setup.config, component_pool=setup.component_pool)
+            batch = await runner.run_many(
+                requests,
+                max_concurrency=params.max_concurrency,
+                output_dir=params.output_dir,
+            )
+
+        lines = [
+            "# Deterministic Pipeline Batch",
+            f"**Batch ID:** `{batch.batch_id}`",
+            f"**Status:** {batch.status.value}",
+            f"**Nodes:** {len(requests)}",
+            f"**Framework:** {params.framework.value}",
+            f"**Mode:** {setup.mode.value}",
+            f"**Wall Time:** {batch.wall_seconds:.3f}s",
+            "",
+            "## Runs",
+            "| Node | Status | Visual Score | Run ID |",
+            "|------|--------|--------------|--------|",
+        ]
+        succeeded = [request for request in requests if f"{request.file_key}:{request.node_id}" not in batch.failures]
+        for request, run in zip(succeeded, batch.runs):
+            score = run.quality_metrics.get("visual_score")
+            score_text = f"{score:.2f}" if isinstance(score, (int, float)) else "-"
+            lines.append(f"| `{request.node_id}` | {run.status.value} | {score_text} | `{run.run_id}` |")
+
+        if batch.failures:
+            lines.extend(["", "## Failures"])
+            for node_key, error in batch.failures.items():
+                lines.append(f"- `{node_key}`: {error}")
+
+        lines.extend(["", "## Shared Calls"])
+        for name, count in batch.shared_calls.items():
+            lines.append(f"- `{name}`: {count}")
+
+        lines.extend([
+            "",
+            "## JSON Result",
+            "```json",
+            json.dumps(
+                {
+                    "batch_id": batch.batch_id,
+                    "status": batch.status.value,
+                    "status_counts": batch.status_counts,
+                    "wall_seconds": batch.wall_seconds,
+                    "shared_calls": batch.shared_calls,
+                    "artifacts": batch.artifacts,
+                    "runs": [
+                        {"run_id": run.run_id, "status": run.status.value, "artifacts": run.artifacts}
+                        for run in batch.runs
+                    ],
+                    "failures": batch.failures,
+                },
+                indent=2,
+            ),
+            "```",
+        ])
+        return "\n".join(lines)
+    except Exception as e:
+        return _handle_api_error(e)
+
+
+@_versioned_tool(
+    name="figma_pipeline_cache",
+    annotations={
+        "title": "Inspect or Prune Pipeline Cache",
+        "readOnlyHint": False,
+        "destructiveHint": True,
+        "idempotentHint": True,
+        "openWorldHint": False
+    }
+)
+async def figma_pipeline_cache(params: FigmaPipelineCacheInput) -> str:
+    """
+    Report or prune the deterministic pipeline stage cache in `.qa/cache`.
+
+    Args:
+        params: FigmaPipelineCacheInput containing:
+            - action: 'stats' or 'prune'
+            - max_mb (Optional[float]): Size budget for prune
+            - max_age_hours (Optional[float]): Idle TTL for prune
+
+    Returns:
+        str: JSON formatted cache statistics or prune summary
+    """
+    try:
+        cache = StageCache(Path(PIPELINE_V2_DEFAULT_CACHE_DIR), memory_bytes=0)
+        if params.action == "stats":
+            return json.dumps({"status": "success", "action": "stats", **cache.disk_stats()}, indent=2)
+
+        max_mb = params.max_mb
+        if max_mb is None:
+            max_mb = _env_float("FIGMA_PIPELINE_CACHE_MAX_MB", PIPELINE_V2_DEFAULT_CACHE_MAX_MB)
+        max_age_hours = params.max_age_hours
+        if max_age_hours is None:
+            max_age_hours = _env_float("FIGMA_PIPELINE_CACHE_TTL_HOURS", PIPELINE_V2_DEFAULT_CACHE_TTL_HOURS)
+
+        # 0 disables a limit, as it does for the pipeline's own cache settings.
+        summary = cache.prune(
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None,
+            max_age_seconds=max_age_hours * 3600.0 if max_age_hours > 0 else None,
+        )
+        return json.dumps({"status": "success", "action": "prune", **summary, **cache.disk_stats()}, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "message": str(e)
+        }, indent=2)
+
+
+@_versioned_tool(
+    name="figma_get_metrics",
+    annotations={
+        "title": "Dump Service Metrics",
+        "readOnlyHint": True,
+        "destructiveHint": False,
+        "idempotentHint": False,
+        "openWorldHint": False
+    }
+)
+async def figma_get_metrics(params: FigmaMetricsInput) -> str:
+    """
+    Dump server metrics in the Prometheus text exposition format.
+
+    Covers tool call rates and durations, Figma API latency and 429 counts,
+    stage cache lookups, render pool utilization, pipeline stage durations and
+    gate outcomes. Collection is opt-in via FIGMA_METRICS_ENABLED or
+    FIGMA_METRICS_PORT (which also serves the same text at /metrics).
+
+    Args:
+        params: FigmaMetricsInput containing:
+            - name_prefix (str): Metric family name prefix filter
+
+    Returns:
+        str: Prometheus text format metrics
+    """
+    registry = service_metrics.registry()
+    if registry is None:
+        return "Error: Service metrics are disabled. Set FIGMA_METRICS_ENABLED=true or FIGMA_METRICS_PORT to collect them."
+
+    lines = []
+    if _SERVICE_METRICS_ERROR:
+        lines.append(f"# {_SERVICE_METRICS_ERROR}")
+    for line in registry.render().splitlines():
+        name = line.split(" ", 3)[2] if line.startswith("#") else re.split(r"[{ ]", line, 1)[0]
+        if name.startswith(params.name_prefix):
+            lines.append(line)
+    return "\n".join(lines)
+
+
 # ============================================================================
 # Code Connect Tools
 # ============================================================================
@@ -4993,6 +5685,48 @@ async def figma_remove_code_connect_map(params: FigmaCodeConnectRemoveInput) ->
 # Asset Management Tools
 # ============================================================================
 
+_ASSET_SECTION_TITLES = {
+    'images': '🖼️ Image Fills',
+    'icons': '🎯 Icons (Smart Detected)',
+    'vectors': '🎨 Raw Vectors',
+    'exports': '📦 Export Configured',
+}
+
+
+def _format_asset_section(
+    section: str,
+    items: List[Dict[str, Any]],
+    remaining: int = 0,
+    next_cursor: Optional[str] = None
+) -> List[str]:
+    """Render one page of an asset catalog section as markdown lines."""
+    lines: List[str] = []
+    if section == 'images':
+        for img in items:
+            lines.append(f"- **{img['nodeName']}** (`{img['nodeId']}`)")
+            lines.append(f"  - imageRef: `{img['imageRef']}`")
+            lines.append(f"  - scaleMode: {img['scaleMode']}")
+    elif section == 'icons':
+        lines.append("| Name | Node ID | Type | Size |")
+        lines.append("|------|---------|------|------|")
+        for icon in items:
+            size = f"{int(icon['width'])}x{int(icon['height'])}"
+            lines.append(f"| {icon['nodeName']} | `{icon['nodeId']}` | {icon['nodeType']} | {size} |")
+    elif section == 'vectors':
+        for vec in items:
+            lines.append(f"- **{vec['nodeName']}** (`{vec['nodeId']}`) - {vec['nodeType']}")
+    elif section == 'exports':
+        for exp in items:
+            formats = [s.get('format', 'PNG') for s in exp['settings']]
+            lines.append(f"- **{exp['nodeName']}** (`{exp['nodeId']}`) - {', '.join(formats)}")
+    if next_cursor:
+        if section == 'icons':
+            lines.append("")
+        lines.append(f"- ... and {remaining} more (cursor: `{next_cursor}`)")
+    lines.append("")
+    return lines
+
+
 @_versioned_tool(
     name="figma_list_assets",
     annotations={
@@ -5025,141 +5759,137 @@ async def figma_list_assets(params: FigmaListAssetsInput) -> str:
             - include_icons (bool): Smart detect icon frames (recommended)
             - include_vectors (bool): Include raw vector paths (usually not needed)
             - include_exports (bool): Include nodes with export settings
+            - cursor (Optional[str]): Fetch the next page of one asset section
+            - page_size (int): Assets per section and page
 
     Returns:
         str: Cataloged assets in requested format
     """
     try:
-        # Get node data
-        if params.node_id:
-            data = await _make_figma_request(
-                f"files/{params.file_key}/nodes",
-                params={"ids": params.node_id, "geometry": "paths"}
-            )
-            nodes = data.get('nodes', {})
-            root_node = nodes.get(params.node_id, {}).get('document', {})
-        else:
-            data = await _make_figma_request(
-                f"files/{params.file_key}",
-                params={"geometry": "paths"}
-            )
-            root_node = data.get('document', {})
-
-        if not root_node:
-            return "Error: Could not retrieve node data."
-
-        # Collect all assets with smart icon detection
-        assets: Dict[str, List] = {
-            'images': [],
-            'icons': [],
-            'vectors': [],
-            'exports': []
-        }
-        _collect_all_assets(
-            root_node,
-            params.file_key,
-            assets,
-            include_icons=params.include_icons,
-            include_vectors=params.include_vectors,
-            include_exports=params.include_exports
+        request = result_handle(
+            "figma_list_assets", params.file_key, params.node_id, params.include_images,
+            params.include_icons, params.include_vectors, params.include_exports,
         )
+        page_at = _resolve_page_cursor(params.cursor, request)
+
+        def build_assets(root_node: Dict[str, Any]) -> Dict[str, List[Any]]:
+            if not root_node:
+                raise ValueError("Could not retrieve node data.")
+
+            # Collect all assets with smart icon detection
+            assets: Dict[str, List[Any]] = {
+                'images': [],
+                'icons': [],
+                'vectors': [],
+                'exports': []
+            }
+            _collect_all_assets(
+                root_node,
+                params.file_key,
+                assets,
+                include_icons=params.include_icons,
+                include_vectors=params.include_vectors,
+                include_exports=params.include_exports
+            )
 
-        # Filter based on params
-        if not params.include_images:
-            assets['images'] = []
-        if not params.include_icons:
-            assets['icons'] = []
-        if not params.include_vectors:
-            assets['vectors'] = []
-        if not params.include_exports:
-            assets['exports'] = []
-
-        # Return in requested format
-        if params.response_format == ResponseFormat.JSON:
-            return json.dumps({
-                "file_key": params.file_key,
-                "node_id": params.node_id,
-                "assets": assets,
-                "summary": {
-                    "total_images": len(assets['images']),
-                    "total_icons": len(assets['icons']),
-                    "total_vectors": len(assets['vectors']),
-                    "total_exports": len(assets['exports'])
+            # Filter based on params
+            if not params.include_images:
+                assets['images'] = []
+            if not params.include_icons:
+                assets['icons'] = []
+            if not params.include_vectors:
+                assets['vectors'] = []
+            if not params.include_exports:
+                assets['exports'] = []
+            return assets
+
+        handle, assets = await _paged_result(request, page_at, params.file_key, params.node_id, True, build_assets)
+
+        if page_at is not None:
+            _, section, offset = page_at
+
+            def render_page(limit: int) -> Optional[str]:
+                page = ResultPages.page(handle, assets, section, offset, limit)
+                if params.response_format == ResponseFormat.JSON:
+                    return _encode_within({"file_key": params.file_key, "node_id": params.node_id, **page}, CHARACTER_LIMIT)
+                shown_to = offset + len(page['items'])
+                lines = _ResponseBuilder([
+                    f"# Asset Catalog: {_ASSET_SECTION_TITLES[section]}",
+                    f"**File:** `{params.file_key}`",
+                    f"**Showing:** {min(offset + 1, shown_to)}-{shown_to} of {page['total']}",
+                    "",
+                ], budget=CHARACTER_LIMIT)
+                lines.extend(_format_asset_section(section, page['items'], page['total'] - shown_to, page['nextCursor']))
+                return None if lines.full else lines.render()
+
+            result = _largest_fitting_page(render_page, params.page_size, minimum=1)
+            if result is not None:
+                return result
+            page = ResultPages.page(handle, assets, section, offset, 1)
+            return _json_response({"file_key": params.file_key, "node_id": params.node_id, **page}, hint="Lower page_size.")
+
+        def render_first_pages(limit: int) -> Optional[str]:
+            pages = {section: ResultPages.page(handle, assets, section, 0, limit) for section in assets}
+
+            # Return in requested format
+            if params.response_format == ResponseFormat.JSON:
+                response: Dict[str, Any] = {
+                    "file_key": params.file_key,
+                    "node_id": params.node_id,
+                    "assets": {section: page['items'] for section, page in pages.items()},
+                    "summary": {
+                        "total_images": len(assets['images']),
+                        "total_icons": len(assets['icons']),
+                        "total_vectors": len(assets['vectors']),
+                        "total_exports": len(assets['exports'])
+                    }
                 }
-            }, indent=2)
-
-        # Markdown format
-        lines = [
-            "# Asset Catalog",
-            f"**File:** `{params.file_key}`",
-        ]
-        if params.node_id:
-            lines.append(f"**Node:** `{params.node_id}`")
-        lines.append("")
-
-        # Summary
-        total = len(assets['images']) + len(assets['icons']) + len(assets['vectors']) + len(assets['exports'])
-        lines.extend([
-            "## Summary",
-            f"- **Total Assets:** {total}",
-            f"- **Images:** {len(assets['images'])}",
-            f"- **Icons:** {len(assets['icons'])}",
-            f"- **Raw Vectors:** {len(assets['vectors'])}",
-            f"- **Export Configured:** {len(assets['exports'])}",
-            ""
-        ])
-
-        # Images
-        if assets['images']:
-            lines.extend(["## 🖼️ Image Fills", ""])
-            for img in assets['images'][:20]:  # Limit to 20
-                lines.append(f"- **{img['nodeName']}** (`{img['nodeId']}`)")
-                lines.append(f"  - imageRef: `{img['imageRef']}`")
-                lines.append(f"  - scaleMode: {img['scaleMode']}")
-            if len(assets['images']) > 20:
-                lines.append(f"- ... and {len(assets['images']) - 20} more")
-            lines.append("")
-
-        # Icons (smart detected)
-        if assets['icons']:
-            lines.extend(["## 🎯 Icons (Smart Detected)", ""])
-            lines.append("| Name | Node ID | Type | Size |")
-            lines.append("|------|---------|------|------|")
-            for icon in assets['icons'][:30]:  # Limit to 30
-                size = f"{int(icon['width'])}x{int(icon['height'])}"
-                lines.append(f"| {icon['nodeName']} | `{icon['nodeId']}` | {icon['nodeType']} | {size} |")
-            if len(assets['icons']) > 30:
-                lines.append(f"\n... and {len(assets['icons']) - 30} more icons")
+                pagination = {
+                    section: {"total": page['total'], "nextCursor": page['nextCursor']}
+                    for section, page in pages.items() if page['nextCursor']
+                }
+                if pagination:
+                    response["pagination"] = pagination
+                return _encode_within(response, CHARACTER_LIMIT)
+
+            # Markdown format
+            lines = _ResponseBuilder([
+                "# Asset Catalog",
+                f"**File:** `{params.file_key}`",
+            ], budget=CHARACTER_LIMIT)
+            if params.node_id:
+                lines.append(f"**Node:** `{params.node_id}`")
             lines.append("")
 
-        # Raw Vectors (only if explicitly requested)
-        if assets['vectors']:
-            lines.extend(["## 🎨 Raw Vectors", ""])
-            for vec in assets['vectors'][:20]:
-                lines.append(f"- **{vec['nodeName']}** (`{vec['nodeId']}`) - {vec['nodeType']}")
-            if len(assets['vectors']) > 20:
-                lines.append(f"- ... and {len(assets['vectors']) - 20} more")
-            lines.append("")
+            # Summary
+            total = len(assets['images']) + len(assets['icons']) + len(assets['vectors']) + len(assets['exports'])
+            lines.extend([
+                "## Summary",
+                f"- **Total Assets:** {total}",
+                f"- **Images:** {len(assets['images'])}",
+                f"- **Icons:** {len(assets['icons'])}",
+                f"- **Raw Vectors:** {len(assets['vectors'])}",
+                f"- **Export Configured:** {len(assets['exports'])}",
+                ""
+            ])
 
-        # Exports
-        if assets['exports']:
-            lines.extend(["## 📦 Export Configured", ""])
-            for exp in assets['exports'][:20]:
-                settings = exp['settings']
-                formats = [s.get('format', 'PNG') for s in settings]
-                lines.append(f"- **{exp['nodeName']}** (`{exp['nodeId']}`) - {', '.join(formats)}")
-            if len(assets['exports']) > 20:
-                lines.append(f"- ... and {len(assets['exports']) - 20} more")
-            lines.append("")
+            for section, page in pages.items():
+                if page['items'] or page['nextCursor']:
+                    lines.extend([f"## {_ASSET_SECTION_TITLES[section]}", ""])
+                    lines.extend(_format_asset_section(section, page['items'], page['total'] - len(page['items']), page['nextCursor']))
 
-        # Usage hint
-        lines.extend([
-            "---",
-            "**Tip:** Use `figma_get_images` to get actual URLs for image fills,",
-            "or `figma_export_assets` to batch export selected assets."
-        ])
+            # Usage hint
+            lines.extend([
+                "---",
+                "**Tip:** Use `figma_get_images` to get actual URLs for image fills,",
+                "or `figma_export_assets` to batch export selected assets."
+            ])
+            return None if lines.full else lines.render()
 
-        return "\n".join(lines)
+        # Sections shrink to a shorter first page when all of them would not fit
+        # the budget together; their cursors pick up the rest.
+        result = _largest_fitting_page(render_first_pages, params.page_size)
+        return result if result is not None else _json_response({"file_key": params.file_key}, hint="Lower page_size.")
 
     except Exception as e:
         return _handle_api_error(e)
@@ -5203,12 +5933,7 @@ async def figma_get_images(params: FigmaGetImagesInput) -> str:
 
         # If node_id specified, filter to only images used in that node
         if params.node_id:
-            node_data = await _make_figma_request(
-                f"files/{params.file_key}/nodes",
-                params={"ids": params.node_id}
-            )
-            nodes = node_data.get('nodes', {})
-            root_node = nodes.get(params.node_id, {}).get('document', {})
+            root_node = (await _fetch_document(params.file_key, params.node_id)).root
 
             if root_node:
                 # Collect image refs from node
@@ -5443,5 +6168,12 @@ async def figma_export_assets(params: FigmaExportAssetsInput) -> str:
 # Entry Point
 # ============================================================================
 
-if __name__ == "__main__":
+def main() -> None:
+    """Start the metrics endpoint (when configured) and serve MCP over stdio."""
+    global _SERVICE_METRICS_ERROR
+    _SERVICE_METRICS_ERROR = _configure_service_metrics()
     mcp.run()
+
+
+if __name__ == "__main__":
+    main()
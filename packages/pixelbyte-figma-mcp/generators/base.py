@@ -7,8 +7,13 @@ layout info, typography info - framework-agnostic intermediate representations.
 """
 
 from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, field
-from typing import Dict, Any, List, Optional, Tuple
+from functools import cached_property
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Tuple
+import hashlib
+import json
 import math
 import re
 import os
@@ -381,6 +386,33 @@ class StyleBundle:
     clips_content: bool = False
 
 
+@dataclass
+class ChildPlacement:
+    """Where a child sits inside its container's bounding box."""
+    x: float  # left edge relative to the container's left edge
+    y: float  # top edge relative to the container's top edge
+    center_dx: float  # child center minus container center
+    center_dy: float
+
+
+@dataclass
+class ContainerLayout:
+    """Framework-neutral layout decision for a container node.
+
+    ``kind`` is 'stack' (children flow along ``axis``), 'grid' (a wrapping
+    horizontal stack) or 'absolute' (children are placed by offsets, see
+    ``place_child``). Stacks come from auto-layout, or are inferred from
+    child bounding boxes when the container has none (``inferred``).
+    Backends choose how to print each kind.
+    """
+    kind: str  # stack, grid, absolute
+    axis: Optional[str] = None  # VERTICAL, HORIZONTAL
+    gap: float = 0
+    inferred: bool = False
+    visible_children: List[Dict[str, Any]] = field(default_factory=list)
+    content_width: float = 0  # summed width of visible children, without gaps
+
+
 # ---------------------------------------------------------------------------
 # Color Conversion Helpers
 # ---------------------------------------------------------------------------
@@ -632,6 +664,505 @@ def parse_style_bundle(node: Dict[str, Any]) -> StyleBundle:
     )
 
 
+# ---------------------------------------------------------------------------
+# Container Layout
+# ---------------------------------------------------------------------------
+
+def infer_stack_axis(children: List[Dict[str, Any]]) -> Tuple[Optional[str], int]:
+    """Infer a stack axis and average gap from child bounding boxes.
+
+    Children stacked top to bottom without overlap (1px tolerance) give
+    VERTICAL, else side by side gives HORIZONTAL, else ``(None, 0)``.
+    """
+    visible = [c for c in children if c.get('visible', True) and c.get('absoluteBoundingBox')]
+    if len(visible) <= 1:
+        return None, 0
+
+    for axis, pos, size in (('VERTICAL', 'y', 'height'), ('HORIZONTAL', 'x', 'width')):
+        boxes = sorted((c['absoluteBoundingBox'] for c in visible), key=lambda b: b.get(pos, 0))
+        gaps = []
+        for cur, nxt in zip(boxes, boxes[1:]):
+            cur_end = cur.get(pos, 0) + cur.get(size, 0)
+            nxt_start = nxt.get(pos, 0)
+            if cur_end > nxt_start + 1:
+                break
+            gaps.append(max(0, nxt_start - cur_end))
+        else:
+            return axis, round(sum(gaps) / len(gaps))
+    return None, 0
+
+
+def place_child(child: Dict[str, Any], container: Dict[str, Any]) -> Optional[ChildPlacement]:
+    """Placement of a child within a container, or None when the child has no bounding box."""
+    child_bbox = child.get('absoluteBoundingBox')
+    if not isinstance(child_bbox, dict) or not child_bbox:
+        return None
+    bbox = container.get('absoluteBoundingBox') or {}
+    x0, y0 = bbox.get('x', 0), bbox.get('y', 0)
+    x, y = child_bbox.get('x', 0), child_bbox.get('y', 0)
+    return ChildPlacement(
+        x=float(x) - float(x0),
+        y=float(y) - float(y0),
+        center_dx=(x + child_bbox.get('width', 0) / 2) - (x0 + bbox.get('width', 0) / 2),
+        center_dy=(y + child_bbox.get('height', 0) / 2) - (y0 + bbox.get('height', 0) / 2),
+    )
+
+
+def parse_container_layout(node: Dict[str, Any]) -> ContainerLayout:
+    """Decide how a container lays out its children."""
+    children = node.get('children', [])
+    mode = node.get('layoutMode')
+    gap = node.get('itemSpacing', 0)
+    axis = mode if mode in ('VERTICAL', 'HORIZONTAL') else None
+    visible_children = []
+    content_width = 0
+    for child in children:
+        if child.get('visible', True):
+            visible_children.append(child)
+            child_bbox = child.get('absoluteBoundingBox')
+            if child_bbox:
+                content_width += child_bbox.get('width', 0)
+
+    inferred = False
+    if axis is None and len(visible_children) > 1:
+        axis, inferred_gap = infer_stack_axis(visible_children)
+        if axis:
+            gap, inferred = inferred_gap, True
+
+    if axis == 'HORIZONTAL' and node.get('layoutWrap', 'NO_WRAP') == 'WRAP':
+        kind = 'grid'
+    else:
+        kind = 'stack' if axis else 'absolute'
+    return ContainerLayout(
+        kind=kind, axis=axis, gap=gap, inferred=inferred,
+        visible_children=visible_children, content_width=content_width,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Computed Style Cache
+# ---------------------------------------------------------------------------
+# Generators and node checks read the same fills, strokes, corners and
+# effects of a node. ``computed_style`` hands out one ComputedStyle per node
+# for the active ``style_cache_scope``, so each value is parsed once no
+# matter how many of them ask.
+
+class ComputedStyle:
+    """Parsed style values of one node, each computed on first access.
+
+    Values are shared by every reader of the node and must be treated as
+    read-only, as must the node itself.
+    """
+
+    def __init__(self, node: Dict[str, Any]) -> None:
+        self.node = node
+
+    @cached_property
+    def fills(self) -> List[FillLayer]:
+        return parse_fills(self.node)
+
+    @cached_property
+    def stroke(self) -> Optional[StrokeInfo]:
+        return parse_stroke(self.node)
+
+    @cached_property
+    def corners(self) -> Optional[CornerRadii]:
+        return parse_corners(self.node)
+
+    @cached_property
+    def effects(self) -> Tuple[List[ShadowEffect], List[BlurEffect]]:
+        return parse_effects(self.node)
+
+    @cached_property
+    def layout(self) -> Optional[LayoutInfo]:
+        return parse_layout(self.node)
+
+    @cached_property
+    def container_layout(self) -> ContainerLayout:
+        return parse_container_layout(self.node)
+
+    @cached_property
+    def text(self) -> TextStyle:
+        return parse_text_style(self.node)
+
+    @cached_property
+    def bundle(self) -> StyleBundle:
+        return parse_style_bundle(self.node)
+
+    @cached_property
+    def background_css(self) -> tuple:
+        return _get_background_css(self.node)
+
+    @cached_property
+    def stroke_data(self) -> Optional[Dict[str, Any]]:
+        return _extract_stroke_data(self.node)
+
+    @cached_property
+    def effects_data(self) -> Dict[str, Any]:
+        return _extract_effects_data(self.node)
+
+    @cached_property
+    def corner_radius_css(self) -> str:
+        return _corner_radii_to_css(self.node)
+
+
+class StyleCache:
+    """ComputedStyle per node dict, for the duration of one request.
+
+    Keyed by node identity rather than a hash of the node's contents:
+    hashing the style properties costs more than parsing them, and within
+    a request the tree is not mutated.
+    """
+
+    def __init__(self) -> None:
+        self._styles: Dict[int, ComputedStyle] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def style(self, node: Dict[str, Any]) -> ComputedStyle:
+        style = self._styles.get(id(node))
+        # The entry holds its node, so a matching id() is never a recycled one.
+        if style is not None and style.node is node:
+            self.hits += 1
+            return style
+        self.misses += 1
+        style = self._styles[id(node)] = ComputedStyle(node)
+        return style
+
+
+_active_style_cache: ContextVar[Optional[StyleCache]] = ContextVar("generators_style_cache", default=None)
+
+
+@contextmanager
+def style_cache_scope(cache: Optional[StyleCache] = None) -> Iterator[StyleCache]:
+    """Share computed styles between everything that runs inside the block.
+
+    Nested scopes keep using the outer cache unless one is passed in.
+    """
+    if cache is None:
+        cache = _active_style_cache.get() or StyleCache()
+    token = _active_style_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _active_style_cache.reset(token)
+
+
+def computed_style(node: Dict[str, Any]) -> ComputedStyle:
+    """The node's ComputedStyle, shared through the active style cache if there is one."""
+    cache = _active_style_cache.get()
+    if cache is None:
+        return ComputedStyle(node)
+    return cache.style(node)
+
+
+# ---------------------------------------------------------------------------
+# Tree Traversal
+# ---------------------------------------------------------------------------
+# Figma trees can nest instances far deeper than Python's recursion limit, so
+# walkers use an explicit stack instead of recursing per node.
+
+def walk_nodes(
+    root: Dict[str, Any],
+    max_depth: Optional[int] = None,
+    skip_invisible: bool = False,
+    max_children: Optional[int] = None,
+    descend: Optional[Callable[[Dict[str, Any], int], bool]] = None,
+) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]], int, int]]:
+    """Walk a node tree in pre-order, yielding ``(node, parent, depth, child_index)``.
+
+    ``skip_invisible`` prunes nodes with ``visible: false`` together with their
+    subtrees, ``max_depth`` stops below that depth (the root is depth 0) and
+    ``max_children`` only visits that many leading children per node.
+    ``descend(node, depth)`` is asked after a node has been yielded and
+    skips its subtree when it returns False, so callers may decide from what
+    they did with the node.
+    """
+    if skip_invisible and root.get('visible', True) is False:
+        return
+    stack: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], int, int]] = [(root, None, 0, 0)]
+    while stack:
+        visit = stack.pop()
+        yield visit
+        node, _, depth, _ = visit
+        children = node.get('children')
+        if not children or (max_depth is not None and depth >= max_depth):
+            continue
+        if descend is not None and not descend(node, depth):
+            continue
+        last = len(children) if max_children is None else min(len(children), max_children)
+        for index in range(last - 1, -1, -1):
+            child = children[index]
+            if skip_invisible and child.get('visible', True) is False:
+                continue
+            stack.append((child, node, depth + 1, index))
+
+
+def run_nested(task: Generator[Any, Any, Any]) -> Any:
+    """Evaluate a recursive computation written as generator tasks on an explicit stack.
+
+    A task yields another task instead of calling it and is sent that task's
+    return value, so bottom-up builders keep their recursive shape without
+    consuming Python stack frames per tree level. Exceptions propagate into
+    the yielding task as they would through a call.
+    """
+    stack = [task]
+    result: Any = None
+    error: Optional[BaseException] = None
+    while stack:
+        try:
+            if error is not None:
+                pending, error = error, None
+                child = stack[-1].throw(pending)
+            else:
+                child = stack[-1].send(result)
+        except StopIteration as done:
+            stack.pop()
+            result = done.value
+            continue
+        except BaseException as exc:
+            stack.pop()
+            if not stack:
+                raise
+            error = exc
+            continue
+        stack.append(child)
+        result = None
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Instance Components
+# ---------------------------------------------------------------------------
+# Screens repeat the same component instance many times (list rows, chips,
+# cards). ``InstanceComponents`` finds instances whose subtrees render the
+# same apart from their text, so a generator can emit the content once as a
+# subcomponent and render each instance as a usage that passes its text.
+
+# Fields that say where a node is or who it is, not what it renders.
+_SUBTREE_VOLATILE_KEYS = frozenset({'id', 'children', 'absoluteBoundingBox', 'absoluteRenderBounds', 'absoluteTransform'})
+# Fields of an instance root that only place it in, or describe it to, its parent.
+_INSTANCE_PLACEMENT_KEYS = frozenset({'name', 'componentProperties', 'overrides', 'layoutPositioning',
+                                      'layoutAlign', 'layoutGrow', 'constraints'})
+_PROP_NAME_RESERVED = frozenset({
+    'as', 'body', 'break', 'case', 'catch', 'children', 'class', 'classname', 'const', 'continue',
+    'default', 'delete', 'do', 'else', 'enum', 'export', 'extends', 'false', 'for', 'func', 'function',
+    'if', 'import', 'in', 'init', 'is', 'key', 'let', 'new', 'nil', 'null', 'private', 'protocol', 'public',
+    'ref', 'return', 'self', 'static', 'struct', 'style', 'super', 'switch', 'this', 'throw', 'true',
+    'try', 'typeof', 'var', 'void', 'where', 'while',
+})
+_PLACEHOLDER_RE = re.compile(r'(")?\ue000(\d+)\ue001(?(1)")')
+
+
+def _has_text_override(node: Dict[str, Any]) -> bool:
+    """TEXT whose characters may differ between instances; styled spans index into the text, so they may not."""
+    return node.get('type') == 'TEXT' and 'characters' in node and not node.get('characterStyleOverrides')
+
+
+def _prop_name(name: str, taken: set) -> str:
+    words = re.findall(r'[A-Za-z0-9]+', name)
+    prop = ''.join([words[0].lower()] + [w.capitalize() for w in words[1:]]) if words else ''
+    if not prop or prop[0].isdigit():
+        prop = 'text' + prop
+    if prop.lower() in _PROP_NAME_RESERVED:
+        prop += 'Text'
+    candidate, suffix = prop, 2
+    while candidate in taken:
+        candidate, suffix = f'{prop}{suffix}', suffix + 1
+    taken.add(candidate)
+    return candidate
+
+
+@dataclass
+class InstanceComponent:
+    """Structurally identical instances, emitted once as a subcomponent."""
+    name: str
+    instances: List[Dict[str, Any]]
+    depth: int  # tree depth of the first instance
+    height: int  # levels in the instance subtree
+    slots: List[int] = field(default_factory=list)  # text nodes whose characters differ
+    slot_props: List[str] = field(default_factory=list)
+    props: List[str] = field(default_factory=list)  # slot props the rendered body reads
+
+
+class InstanceComponents:
+    """Repeated instances of a tree, grouped by a Merkle hash of their content.
+
+    An instance's content hash covers its own fields except placement ones,
+    its size, and for every descendant all fields except ids and absolute
+    bounds plus its position relative to its parent and whether it is
+    mirrored. Characters of plain TEXT nodes are left out and become props.
+    ``eligible`` narrows the instances a generator can render as usages.
+    Nodes must not be mutated.
+    """
+
+    def __init__(
+        self,
+        root: Dict[str, Any],
+        reserved_names: Tuple[str, ...] = (),
+        eligible: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> None:
+        self._by_node: Dict[int, InstanceComponent] = {}
+        self._texts: Dict[int, List[Dict[str, Any]]] = {}
+        self._templates: Dict[int, Dict[str, Any]] = {}
+        self._keep: List[Dict[str, Any]] = []
+
+        visits = list(walk_nodes(root))
+        subtree: Dict[int, str] = {}
+        heights: Dict[int, int] = {}
+        groups: Dict[str, List[Tuple[Dict[str, Any], int]]] = {}
+        for node, parent, depth, _ in reversed(visits):
+            own = {key: value for key, value in node.items() if key not in _SUBTREE_VOLATILE_KEYS}
+            if _has_text_override(node):
+                own['characters'] = None
+            bbox = node.get('absoluteBoundingBox') or {}
+            parent_bbox = (parent.get('absoluteBoundingBox') or {}) if parent is not None else bbox
+            size = [bbox.get('width', 0), bbox.get('height', 0)]
+            offset = [bbox.get('x', 0) - parent_bbox.get('x', 0), bbox.get('y', 0) - parent_bbox.get('y', 0)]
+            mirrored = _is_mirrored(node)
+            children = node.get('children', [])
+            child_hashes = [subtree[id(child)] for child in children]
+            heights[id(node)] = 1 + max((heights[id(child)] for child in children), default=0)
+            subtree[id(node)] = _content_hash([own, size, offset, mirrored, child_hashes])
+
+            if (node.get('type') == 'INSTANCE' and children and parent is not None
+                    and node.get('visible', True) and (eligible is None or eligible(node))):
+                placed = {key: value for key, value in own.items() if key not in _INSTANCE_PLACEMENT_KEYS}
+                groups.setdefault(_content_hash([placed, size, mirrored, child_hashes]), []).append((node, depth))
+
+        taken = set(reserved_names)
+        order = {id(node): index for index, (node, _, _, _) in enumerate(visits)}
+        repeated = [sorted(members, key=lambda m: order[id(m[0])]) for members in groups.values() if len(members) > 1]
+        repeated.sort(key=lambda members: order[id(members[0][0])])
+        components = []
+        for members in repeated:
+            first, depth = members[0]
+            name = sanitize_component_name(first.get('name', '')) or 'Instance'
+            candidate, suffix = name, 2
+            while candidate in taken:
+                candidate, suffix = f'{name}{suffix}', suffix + 1
+            taken.add(candidate)
+            component = InstanceComponent(
+                name=candidate, instances=[node for node, _ in members], depth=depth, height=heights[id(first)],
+            )
+            for node in component.instances:
+                self._by_node[id(node)] = component
+            self._find_slots(component)
+            components.append(component)
+        # Nested instances are lower than the instances containing them.
+        self.components = sorted(components, key=lambda component: component.height)
+
+    def __bool__(self) -> bool:
+        return bool(self.components)
+
+    def __iter__(self) -> Iterator[InstanceComponent]:
+        return iter(self.components)
+
+    def component(self, node: Dict[str, Any]) -> Optional[InstanceComponent]:
+        return self._by_node.get(id(node))
+
+    def _text_nodes(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        texts = self._texts.get(id(node))
+        if texts is None:
+            texts = self._texts[id(node)] = [n for n, _, _, _ in walk_nodes(node) if _has_text_override(n)]
+        return texts
+
+    def _find_slots(self, component: InstanceComponent) -> None:
+        columns = zip(*(self._text_nodes(node) for node in component.instances))
+        taken: set = set()
+        for index, texts in enumerate(columns):
+            if len({text['characters'] for text in texts}) > 1:
+                component.slots.append(index)
+                component.slot_props.append(_prop_name(texts[0].get('name', ''), taken))
+
+    def template(self, component: InstanceComponent) -> Dict[str, Any]:
+        """Copy of the first instance whose differing texts read as placeholders.
+
+        Nested instances in the copy still resolve to their components.
+        """
+        template = self._templates.get(id(component))
+        if template is not None:
+            return template
+        first = component.instances[0]
+        slot_of = {id(self._text_nodes(first)[index]): slot for slot, index in enumerate(component.slots)}
+        copies: Dict[int, Dict[str, Any]] = {}
+        for node, parent, _, _ in walk_nodes(first):
+            copy = dict(node)
+            if id(node) in slot_of:
+                copy['characters'] = f'\ue000{slot_of[id(node)]}\ue001'
+            if 'children' in node:
+                copy['children'] = []
+            if parent is not None:
+                copies[id(parent)]['children'].append(copy)
+            copies[id(node)] = copy
+            nested = self._by_node.get(id(node))
+            if nested is not None and node is not first:
+                self._by_node[id(copy)] = nested
+            self._keep.append(copy)
+        template = self._templates[id(component)] = copies[id(first)]
+        return template
+
+    def bind(self, component: InstanceComponent, code: str, quoted: str, bare: str) -> str:
+        """Replace placeholders in a rendered body with its props and record which are used.
+
+        ``quoted`` formats a placeholder that makes up a whole string literal,
+        ``bare`` one inside other text; both receive the prop name.
+        """
+        used = set()
+
+        def replace(match: re.Match) -> str:
+            prop = component.slot_props[int(match.group(2))]
+            used.add(prop)
+            return (quoted if match.group(1) else bare).format(prop)
+
+        code = _PLACEHOLDER_RE.sub(replace, code)
+        component.props = [prop for prop in component.slot_props if prop in used]
+        return code
+
+    def arguments(self, component: InstanceComponent, node: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """``(prop, text)`` pairs a usage of the component passes for this instance."""
+        texts = self._text_nodes(node)
+        values = {prop: texts[index]['characters'] for prop, index in zip(component.slot_props, component.slots)}
+        return [(prop, values[prop]) for prop in component.props]
+
+
+def _is_mirrored(node: Dict[str, Any]) -> bool:
+    """Whether the absolute transform flips the node horizontally."""
+    try:
+        return float(node['absoluteTransform'][0][0]) < 0
+    except (KeyError, IndexError, TypeError, ValueError):
+        return False
+
+
+def _content_hash(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+
+
+_active_instance_components: ContextVar[Optional[InstanceComponents]] = ContextVar(
+    "generators_instance_components", default=None
+)
+
+
+@contextmanager
+def instance_components_scope(components: Optional[InstanceComponents]) -> Iterator[Optional[InstanceComponents]]:
+    """Render repeated instances inside the block as usages of ``components``."""
+    token = _active_instance_components.set(components)
+    try:
+        yield components
+    finally:
+        _active_instance_components.reset(token)
+
+
+def instance_component(node: Dict[str, Any]) -> Optional[InstanceComponent]:
+    """The subcomponent a node renders as a usage of, if instance dedup is active."""
+    components = _active_instance_components.get()
+    return components.component(node) if components is not None else None
+
+
+def instance_arguments(component: InstanceComponent, node: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return _active_instance_components.get().arguments(component, node)
+
+
 # ---------------------------------------------------------------------------
 # CSS-oriented helpers (shared by React, Vue, CSS generators)
 # ---------------------------------------------------------------------------
@@ -12,10 +12,7 @@ from typing import Dict, Any, List, Literal
 # Import shared constants and CSS helpers from base module
 from generators.base import (
     MAX_CHILDREN_LIMIT,
-    _get_background_css,
-    _extract_stroke_data,
-    _extract_effects_data,
-    _corner_radii_to_css,
+    computed_style,
     _transform_to_css,
     _blend_mode_to_css,
     _text_case_to_css,
@@ -96,7 +93,7 @@ def generate_style_variables(
                 name = _sanitize_token_name(sp.get('name', 'spacing'))
                 padding = sp.get('padding', {})
                 gap = sp.get('gap', 0)
-                key = f"{padding.get('top', 0)}-{padding.get('right', 0)}-{gap}"
+                key = (padding.get('top', 0), padding.get('right', 0), padding.get('bottom', 0), padding.get('left', 0), gap)
                 if key not in seen_spacing:
                     seen_spacing.add(key)
                     if is_css:
@@ -116,7 +113,7 @@ def generate_style_variables(
                 y = offset.get('y', 0)
                 blur = effect.get('radius', 0)
                 spread = effect.get('spread', 0)
-                key = f"{hex_val}-{x}-{y}-{blur}"
+                key = (effect.get('type'), hex_val, x, y, blur, spread)
                 if key not in seen_shadows:
                     seen_shadows.add(key)
                     name = _sanitize_token_name(effect.get('name', 'shadow'))
@@ -231,7 +228,8 @@ def generate_css_code(node: Dict[str, Any], component_name: str) -> str:
     height = bbox.get('height', 'auto')
 
     # Background (with gradient, image, and layered support)
-    bg_value, bg_type = _get_background_css(node)
+    computed = computed_style(node)
+    bg_value, bg_type = computed.background_css
     bg_css = ''
     if bg_value and bg_type:
         if bg_type == 'color':
@@ -241,7 +239,7 @@ def generate_css_code(node: Dict[str, Any], component_name: str) -> str:
             bg_css = f"background: {bg_value};"
 
     # Strokes (comprehensive)
-    stroke_data = _extract_stroke_data(node)
+    stroke_data = computed.stroke_data
     stroke_css = ''
     if stroke_data and stroke_data['colors']:
         first_stroke = stroke_data['colors'][0]
@@ -264,7 +262,7 @@ def generate_css_code(node: Dict[str, Any], component_name: str) -> str:
                 stroke_css = f"border: {stroke_weight}px {border_style} {stroke_color};"
 
     # Border radius (with individual corners)
-    corner_radius_css = _corner_radii_to_css(node)
+    corner_radius_css = computed.corner_radius_css
     radius_css = f"border-radius: {corner_radius_css};" if corner_radius_css else ''
 
     # Transform (rotation, scale)
@@ -324,7 +322,7 @@ def generate_css_code(node: Dict[str, Any], component_name: str) -> str:
         flex_child_css = '\n  '.join(flex_child_lines)
 
     # Effects (shadows and blurs)
-    effects_data = _extract_effects_data(node)
+    effects_data = computed.effects_data
     shadow_css = ''
     blur_css = ''
 
@@ -466,10 +464,11 @@ def generate_scss_code(node: Dict[str, Any], component_name: str) -> str:
     height = bbox.get('height', 'auto')
 
     # Background (with gradient support)
-    bg_value, bg_type = _get_background_css(node)
+    computed = computed_style(node)
+    bg_value, bg_type = computed.background_css
 
     # Individual corner radii
-    border_radius_css = _corner_radii_to_css(node)
+    border_radius_css = computed.corner_radius_css
 
     # Transform (rotation, scale)
     transform_css = _transform_to_css(node)
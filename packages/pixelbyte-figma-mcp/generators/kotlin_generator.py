@@ -13,6 +13,7 @@ from typing import Dict, Any, List
 from generators.base import (
     KOTLIN_WEIGHT_MAP,
     MAX_NATIVE_CHILDREN_LIMIT,
+    computed_style,
 )
 
 
@@ -83,18 +84,19 @@ def generate_kotlin_code(node: Dict[str, Any], component_name: str) -> str:
             break
 
     # Individual corner radii
-    corner_radii = node.get('rectangleCornerRadii', [])
+    corner_radii = computed_style(node).corners
     corner_radius = node.get('cornerRadius', 0)
     corner_code = ''
 
-    if corner_radii and len(corner_radii) == 4:
-        tl, tr, br, bl = corner_radii
-        if tl == tr == br == bl:
+    if corner_radii:
+        if corner_radii.is_uniform:
+            tl = corner_radii.uniform_value
             corner_code = f'.clip(RoundedCornerShape({tl}.dp))' if tl > 0 else ''
         else:
-            corner_code = f'.clip(RoundedCornerShape(topStart = {tl}.dp, topEnd = {tr}.dp, bottomEnd = {br}.dp, bottomStart = {bl}.dp))'
-    elif corner_radius:
-        corner_code = f'.clip(RoundedCornerShape({corner_radius}.dp))'
+            corner_code = (
+                f'.clip(RoundedCornerShape(topStart = {corner_radii.top_left}.dp, topEnd = {corner_radii.top_right}.dp, '
+                f'bottomEnd = {corner_radii.bottom_right}.dp, bottomStart = {corner_radii.bottom_left}.dp))'
+            )
 
     # Rotation
     rotation = node.get('rotation', 0)
@@ -119,34 +121,25 @@ def generate_kotlin_code(node: Dict[str, Any], component_name: str) -> str:
     blend_import = 'import androidx.compose.ui.graphics.BlendMode' if blend_mode in blend_map else ''
 
     # Effects (shadows and blurs)
-    effects = node.get('effects', [])
+    shadows, blurs = computed_style(node).effects
     shadow_code = ''
     blur_code = ''
     shadow_import = ''
     blur_import = ''
 
-    for effect in effects:
-        if not effect.get('visible', True):
-            continue
-        effect_type = effect.get('type', '')
-
-        if effect_type == 'DROP_SHADOW' and not shadow_code:
-            color = effect.get('color', {})
-            offset_x = effect.get('offset', {}).get('x', 0)
-            offset_y = effect.get('offset', {}).get('y', 0)
-            blur = effect.get('radius', 0)
-            r = int(color.get('r', 0) * 255)
-            g = int(color.get('g', 0) * 255)
-            b = int(color.get('b', 0) * 255)
-            a = color.get('a', 0.25)
-            shadow_import = 'import androidx.compose.ui.draw.shadow'
-            shadow_code = f'.shadow(elevation = {blur}.dp, shape = RoundedCornerShape({corner_radius}.dp))'
-        elif effect_type == 'LAYER_BLUR' and not blur_code:
-            blur_import = 'import androidx.compose.ui.draw.blur'
-            blur_code = f'.blur(radius = {effect.get("radius", 0)}.dp)'
-
-    layout_mode = node.get('layoutMode')
-    gap = node.get('itemSpacing', 0)
+    drop_shadow = next((shadow for shadow in shadows if shadow.type == 'DROP_SHADOW'), None)
+    if drop_shadow:
+        shadow_import = 'import androidx.compose.ui.draw.shadow'
+        shadow_code = f'.shadow(elevation = {drop_shadow.radius}.dp, shape = RoundedCornerShape({corner_radius}.dp))'
+    layer_blur = next((blur for blur in blurs if blur.type == 'LAYER_BLUR'), None)
+    if layer_blur:
+        blur_import = 'import androidx.compose.ui.draw.blur'
+        blur_code = f'.blur(radius = {layer_blur.radius}.dp)'
+
+    # Compose keeps freeform frames as a Box; only auto-layout axes become Column/Row
+    layout = computed_style(node).container_layout
+    layout_mode = None if layout.inferred else layout.axis
+    gap = layout.gap
     padding_top = node.get('paddingTop', 0)
     padding_right = node.get('paddingRight', 0)
     padding_bottom = node.get('paddingBottom', 0)
@@ -7,23 +7,28 @@ blur, opacity, blend modes, rotation, padding, auto-layout, text styling,
 hyperlinks, line clamping, and paragraph spacing.
 """
 
+import json
 import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Generator, Optional
 
 # Import shared constants and CSS helpers from base module
 from generators.base import (
     TAILWIND_WEIGHT_MAP,
     TAILWIND_ALIGN_MAP,
     MAX_CHILDREN_LIMIT,
-    _get_background_css,
-    _extract_stroke_data,
-    _extract_effects_data,
-    _corner_radii_to_css,
+    computed_style,
+    place_child,
+    InstanceComponent,
+    InstanceComponents,
+    instance_arguments,
+    instance_component,
+    instance_components_scope,
     _transform_to_css,
     _blend_mode_to_css,
     _rgba_to_hex,
     _text_case_to_css,
     _text_decoration_to_css,
+    run_nested,
 )
 
 
@@ -51,17 +56,13 @@ def _is_freeform_layout(layout_mode: Optional[str]) -> bool:
 
 
 def _absolute_offsets(node: Dict[str, Any], parent_node: Optional[Dict[str, Any]]) -> tuple[Optional[str], Optional[str]]:
-    if not parent_node:
+    if not parent_node or not isinstance(parent_node.get("absoluteBoundingBox"), dict):
         return None, None
 
-    node_bbox = node.get("absoluteBoundingBox")
-    parent_bbox = parent_node.get("absoluteBoundingBox")
-    if not isinstance(node_bbox, dict) or not isinstance(parent_bbox, dict):
+    placement = place_child(node, parent_node)
+    if placement is None:
         return None, None
-
-    left = _format_px(float(node_bbox.get("x", 0)) - float(parent_bbox.get("x", 0)))
-    top = _format_px(float(node_bbox.get("y", 0)) - float(parent_bbox.get("y", 0)))
-    return left, top
+    return _format_px(placement.x), _format_px(placement.y)
 
 
 def _relative_transform_matrix(node: Dict[str, Any]) -> Optional[str]:
@@ -139,21 +140,39 @@ def generate_react_code(
     component_name: str,
     use_tailwind: bool = True,
     hard_fidelity_profile: bool = False,
+    jsx_memo: Optional[Any] = None,
+    dedupe_instances: bool = False,
 ) -> str:
-    """Generate detailed React component code from Figma node with all nested children."""
-    # Generate the inner JSX content recursively
-    inner_jsx = recursive_node_to_jsx(
-        node,
-        indent=6,
-        use_tailwind=use_tailwind,
-        parent_node=None,
-        hard_fidelity_profile=hard_fidelity_profile,
-    )
+    """Generate detailed React component code from Figma node with all nested children.
+
+    ``jsx_memo`` optionally memoizes subtree JSX; see ``recursive_node_to_jsx``.
+    With ``dedupe_instances``, repeated component instances are emitted once
+    as subcomponents and rendered as usages; ``jsx_memo`` is not used then.
+    """
+    components = InstanceComponents(node, reserved_names=(component_name,)) if dedupe_instances else None
+    subcomponents = ''
+    with instance_components_scope(components):
+        if components:
+            subcomponents = ''.join(
+                _instance_component_code(component, components, use_tailwind, hard_fidelity_profile)
+                for component in components
+            )
+            jsx_memo = None
+
+        # Generate the inner JSX content recursively
+        inner_jsx = recursive_node_to_jsx(
+            node,
+            indent=6,
+            use_tailwind=use_tailwind,
+            parent_node=None,
+            hard_fidelity_profile=hard_fidelity_profile,
+            jsx_memo=jsx_memo,
+        )
     inner_jsx = _attach_component_classname(inner_jsx)
 
     if use_tailwind:
         code = f'''import React from 'react';
-
+{subcomponents}
 interface {component_name}Props {{
   className?: string;
 }}
@@ -170,7 +189,7 @@ export default {component_name};
 '''
     else:
         code = f'''import React from 'react';
-
+{subcomponents}
 interface {component_name}Props {{
   className?: string;
 }}
@@ -188,6 +207,56 @@ export default {component_name};
     return code
 
 
+def _jsx_string(value: str) -> str:
+    """JSX attribute value for a literal string."""
+    if any(char in value for char in '"\\\n{}'):
+        return '{' + json.dumps(value) + '}'
+    return f'"{value}"'
+
+
+def _instance_usage(component: InstanceComponent, node: Dict[str, Any]) -> str:
+    props = ''.join(f' {prop}={_jsx_string(value)}' for prop, value in instance_arguments(component, node))
+    return f'<{component.name}{props} />'
+
+
+def _instance_component_code(
+    component: InstanceComponent,
+    components: InstanceComponents,
+    use_tailwind: bool,
+    hard_fidelity_profile: bool,
+) -> str:
+    """Subcomponent rendering an instance's children as a fragment.
+
+    Each usage keeps its own root element, so the fragment's children lay
+    out exactly as the instance's children would.
+    """
+    template = components.template(component)
+    children = []
+    for child in template.get('children', [])[:MAX_CHILDREN_LIMIT]:
+        child_jsx = recursive_node_to_jsx(
+            child, indent=4, use_tailwind=use_tailwind, parent_node=template,
+            hard_fidelity_profile=hard_fidelity_profile,
+        )
+        if child_jsx:
+            children.append(child_jsx)
+    body = components.bind(component, '\n'.join(children), quoted='{{{}}}', bare='{{{}}}')
+
+    if not component.props:
+        signature = f'const {component.name}: React.FC = () => ('
+        interface = ''
+    else:
+        fields = ''.join(f'  {prop}: string;\n' for prop in component.props)
+        interface = f'interface {component.name}Props {{\n{fields}}}\n\n'
+        signature = f'const {component.name}: React.FC<{component.name}Props> = ({{ {", ".join(component.props)} }}) => ('
+    return f'''
+{interface}{signature}
+  <>
+{body}
+  </>
+);
+'''
+
+
 def _vector_to_inline_svg(node: Dict[str, Any], prefix: str, use_tailwind: bool) -> Optional[str]:
     """Generate inline SVG JSX for VECTOR/BOOLEAN_OPERATION nodes when geometry exists."""
     fill_geometry = node.get('fillGeometry', [])
@@ -246,8 +315,54 @@ def recursive_node_to_jsx(
     use_tailwind: bool = True,
     parent_node: Optional[Dict[str, Any]] = None,
     hard_fidelity_profile: bool = False,
+    jsx_memo: Optional[Any] = None,
 ) -> str:
-    """Recursively generate detailed JSX code for nested children with all styles."""
+    """Generate detailed JSX code for a node and its nested children with all styles.
+
+    Children are rendered through ``run_nested``, so tree depth is not bound
+    by Python's recursion limit.
+
+    ``jsx_memo`` is an optional mapping with a
+    ``key(node, parent_node, indent, use_tailwind, hard_fidelity_profile)``
+    method returning the memo key for subtrees whose JSX may be reused (or
+    None). Subtree JSX depends only on the subtree, the parent's own
+    properties, indentation and output flags, so callers key on those.
+    """
+    return run_nested(_jsx_task(node, indent, use_tailwind, parent_node, hard_fidelity_profile, jsx_memo))
+
+
+def _jsx_task(
+    node: Dict[str, Any],
+    indent: int,
+    use_tailwind: bool,
+    parent_node: Optional[Dict[str, Any]],
+    hard_fidelity_profile: bool,
+    jsx_memo: Optional[Any],
+) -> Generator[Any, str, str]:
+    """``run_nested`` task rendering one subtree, consulting ``jsx_memo`` first."""
+    memo_key = None
+    if jsx_memo is not None:
+        memo_key = jsx_memo.key(node, parent_node, indent, use_tailwind, hard_fidelity_profile)
+        if memo_key:
+            cached = jsx_memo.get(memo_key)
+            if cached is not None:
+                return cached
+
+    jsx = yield from _node_to_jsx(node, indent, use_tailwind, parent_node, hard_fidelity_profile, jsx_memo)
+    if memo_key:
+        jsx_memo[memo_key] = jsx
+    return jsx
+
+
+def _node_to_jsx(
+    node: Dict[str, Any],
+    indent: int,
+    use_tailwind: bool,
+    parent_node: Optional[Dict[str, Any]],
+    hard_fidelity_profile: bool,
+    jsx_memo: Optional[Any],
+) -> Generator[Any, str, str]:
+    """Render one node as JSX, yielding a ``_jsx_task`` per child for ``run_nested``."""
     if node.get("visible", True) is False:
         return ""
 
@@ -263,10 +378,11 @@ def recursive_node_to_jsx(
 
     # Fills (with gradient support)
     fills = node.get('fills', [])
-    bg_value, bg_type = _get_background_css(node)
+    computed = computed_style(node)
+    bg_value, bg_type = computed.background_css
 
     # Strokes (comprehensive)
-    stroke_data = _extract_stroke_data(node)
+    stroke_data = computed.stroke_data
     stroke_color = ''
     stroke_weight = stroke_data['weight'] if stroke_data else 0
     stroke_align = stroke_data['align'] if stroke_data else 'INSIDE'
@@ -278,7 +394,7 @@ def recursive_node_to_jsx(
             stroke_color = first_stroke.get('color', '')
 
     # Effects (shadows and blurs)
-    effects_data = _extract_effects_data(node)
+    effects_data = computed.effects_data
     shadow_css = ''
     layer_blur_css = ''
     backdrop_blur_css = ''
@@ -300,7 +416,7 @@ def recursive_node_to_jsx(
                 backdrop_blur_css = f"blur({int(blur.get('radius', 0))}px)"
 
     # Corner radius (with individual corners support)
-    corner_radius_css = _corner_radii_to_css(node)
+    corner_radius_css = computed.corner_radius_css
 
     # Transform (rotation, scale)
     transform_css = _transform_to_css(node)
@@ -745,17 +861,15 @@ def recursive_node_to_jsx(
             lines.append(f'{prefix}<div style={{{{ {style_str} }}}}>')
 
         # Recursively add children
-        children = node.get('children', [])
-        for child in children[:MAX_CHILDREN_LIMIT]:  # Safety limit
-            child_jsx = recursive_node_to_jsx(
-                child,
-                indent + 2,
-                use_tailwind,
-                parent_node=node,
-                hard_fidelity_profile=hard_fidelity_profile,
-            )
-            if child_jsx:
-                lines.append(child_jsx)
+        component = instance_component(node)
+        if component is not None:
+            lines.append(f'{prefix}  {_instance_usage(component, node)}')
+        else:
+            children = node.get('children', [])
+            for child in children[:MAX_CHILDREN_LIMIT]:  # Safety limit
+                child_jsx = yield _jsx_task(child, indent + 2, use_tailwind, node, hard_fidelity_profile, jsx_memo)
+                if child_jsx:
+                    lines.append(child_jsx)
 
         lines.append(f'{prefix}</div>')
 
@@ -7,15 +7,16 @@ blur, opacity, blend modes, rotation, padding, auto-layout, text styling.
 """
 
 import re
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Import helpers from base module
 from generators.base import (
     hex_to_rgb,
-    parse_fills, parse_stroke, parse_corners, parse_effects, parse_layout,
-    parse_text_style, parse_style_bundle,
+    computed_style,
     ColorValue, GradientDef, GradientStop, FillLayer, StrokeInfo, CornerRadii,
     ShadowEffect, BlurEffect, LayoutInfo, TextStyle, StyleBundle,
+    ChildPlacement, ContainerLayout, place_child,
+    InstanceComponent, InstanceComponents, instance_arguments, instance_component, instance_components_scope,
     SWIFTUI_WEIGHT_MAP, MAX_NATIVE_CHILDREN_LIMIT, MAX_DEPTH,
     sanitize_component_name, map_icon_name,
 )
@@ -58,7 +59,7 @@ def _swiftui_fill_modifier(node: Dict[str, Any]) -> tuple[str, str]:
     """Generate SwiftUI background modifier supporting multi-fill and all gradient types.
     Returns (modifier_code, gradient_definitions).
     """
-    fill_layers = parse_fills(node)
+    fill_layers = computed_style(node).fills
     if not fill_layers:
         return '', ''
 
@@ -186,11 +187,11 @@ def _gradient_direction_swiftui(handles: list) -> tuple[str, str]:
 
 def _swiftui_stroke_modifier(node: Dict[str, Any]) -> str:
     """Generate stroke modifier supporting solid, gradient, and dashed strokes."""
-    stroke = parse_stroke(node)
+    stroke = computed_style(node).stroke
     if not stroke or stroke.weight == 0:
         return ''
 
-    corners = parse_corners(node)
+    corners = computed_style(node).corners
     cr = corners.uniform_value if corners and corners.is_uniform else 0
 
     first_color = stroke.colors[0] if stroke.colors else None
@@ -239,7 +240,7 @@ def _swiftui_stroke_modifier(node: Dict[str, Any]) -> str:
 
 def _swiftui_corner_modifier(node: Dict[str, Any]) -> str:
     """Generate SwiftUI corner radius modifier."""
-    radii = parse_corners(node)
+    radii = computed_style(node).corners
     if not radii:
         return ''
 
@@ -261,7 +262,7 @@ def _swiftui_corner_modifier(node: Dict[str, Any]) -> str:
 
 def _swiftui_effects_modifier(node: Dict[str, Any]) -> list[str]:
     """Generate shadow and blur effect modifiers including background blur."""
-    shadows, blurs = parse_effects(node)
+    shadows, blurs = computed_style(node).effects
     modifiers = []
 
     for shadow in shadows:
@@ -432,7 +433,7 @@ def _swiftui_text_node(node: Dict[str, Any], indent: int, parent_node: Dict[str,
     lines = []
 
     text = node.get('characters', node.get('name', ''))
-    ts = parse_text_style(node)
+    ts = computed_style(node).text
 
     # Hyperlink
     hyperlink = node.get('hyperlink')
@@ -574,7 +575,7 @@ def _swiftui_shape_node(node: Dict[str, Any], indent: int) -> str:
         shape_name = 'Divider'
     else:
         # Rectangle, Star, Polygon - use RoundedRectangle if has corner radius
-        corner_radii = parse_corners(node)
+        corner_radii = computed_style(node).corners
         if corner_radii and corner_radii.is_uniform and corner_radii.top_left > 0:
             shape_name = f"RoundedRectangle(cornerRadius: {int(corner_radii.top_left)})"
         else:
@@ -601,7 +602,7 @@ def _swiftui_shape_node(node: Dict[str, Any], indent: int) -> str:
             break
         elif fill.get('type', '').startswith('GRADIENT_'):
             # Generate actual gradient fill code
-            fill_layers = parse_fills(node)
+            fill_layers = computed_style(node).fills
             for layer in fill_layers:
                 if layer.gradient:
                     grad_code, _ = _gradient_to_swiftui(layer.gradient)
@@ -622,7 +623,7 @@ def _swiftui_shape_node(node: Dict[str, Any], indent: int) -> str:
         lines.append(f'{prefix}    .scaledToFill()')
         if w and h:
             lines.append(f'{prefix}    .frame(width: {w}, height: {h})')
-        corner_radii = parse_corners(node)
+        corner_radii = computed_style(node).corners
         if corner_radii and corner_radii.is_uniform and corner_radii.top_left > 0:
             lines.append(f'{prefix}    .clipShape(RoundedRectangle(cornerRadius: {int(corner_radii.top_left)}))')
         else:
@@ -669,7 +670,7 @@ def _swiftui_shape_node(node: Dict[str, Any], indent: int) -> str:
         lines.append(f'{prefix}    .frame(width: {w}, height: {h})')
 
     # Non-uniform corner radius (clip shape) - skip if all corners are 0
-    corner_radii = parse_corners(node)
+    corner_radii = computed_style(node).corners
     if corner_radii and not corner_radii.is_uniform:
         tl = int(corner_radii.top_left)
         tr = int(corner_radii.top_right)
@@ -788,7 +789,7 @@ def _swiftui_vector_node(node: Dict[str, Any], indent: int) -> str:
                 fill_code = f".fill(Color(red: {r:.3f}, green: {g:.3f}, blue: {b:.3f}))"
             break
         elif fill.get('type', '').startswith('GRADIENT_'):
-            fill_layers = parse_fills(node)
+            fill_layers = computed_style(node).fills
             for layer in fill_layers:
                 if layer.gradient:
                     grad_code, _ = _gradient_to_swiftui(layer.gradient)
@@ -848,55 +849,32 @@ def _swiftui_vector_node(node: Dict[str, Any], indent: int) -> str:
 # Task 6: Container node renderer
 # ---------------------------------------------------------------------------
 
-def _analyze_children_layout(children: list, container_bbox: dict) -> tuple:
-    """Analyze children positions to determine best container type.
-    Returns (container_type, estimated_spacing).
-    container_type: 'VStack', 'HStack', or 'ZStack'
-    """
-    visible = [c for c in children if c.get('visible', True) and c.get('absoluteBoundingBox')]
-    if len(visible) <= 1:
-        return 'ZStack', 0
-
-    # Sort by Y position
-    sorted_by_y = sorted(visible, key=lambda c: c['absoluteBoundingBox'].get('y', 0))
-    # Sort by X position
-    sorted_by_x = sorted(visible, key=lambda c: c['absoluteBoundingBox'].get('x', 0))
-
-    # Check Y-axis sequential (no overlap)
-    y_sequential = True
-    y_gaps = []
-    for i in range(len(sorted_by_y) - 1):
-        cur = sorted_by_y[i]['absoluteBoundingBox']
-        nxt = sorted_by_y[i + 1]['absoluteBoundingBox']
-        cur_bottom = cur.get('y', 0) + cur.get('height', 0)
-        nxt_top = nxt.get('y', 0)
-        if cur_bottom > nxt_top + 1:  # 1px tolerance
-            y_sequential = False
-            break
-        y_gaps.append(max(0, nxt_top - cur_bottom))
-
-    if y_sequential and len(sorted_by_y) > 1:
-        avg_gap = sum(y_gaps) / len(y_gaps) if y_gaps else 0
-        return 'VStack', round(avg_gap)
-
-    # Check X-axis sequential (no overlap)
-    x_sequential = True
-    x_gaps = []
-    for i in range(len(sorted_by_x) - 1):
-        cur = sorted_by_x[i]['absoluteBoundingBox']
-        nxt = sorted_by_x[i + 1]['absoluteBoundingBox']
-        cur_right = cur.get('x', 0) + cur.get('width', 0)
-        nxt_left = nxt.get('x', 0)
-        if cur_right > nxt_left + 1:
-            x_sequential = False
-            break
-        x_gaps.append(max(0, nxt_left - cur_right))
+_SWIFTUI_ALIGNMENTS = {
+    'VERTICAL': {'MIN': '.leading', 'CENTER': '.center', 'MAX': '.trailing'},
+    'HORIZONTAL': {'MIN': '.top', 'CENTER': '.center', 'MAX': '.bottom'},
+}
 
-    if x_sequential and len(sorted_by_x) > 1:
-        avg_gap = sum(x_gaps) / len(x_gaps) if x_gaps else 0
-        return 'HStack', round(avg_gap)
 
-    return 'ZStack', 0
+def _swiftui_stack(layout: ContainerLayout, counter_align: str) -> tuple:
+    """Map a container layout to (container_type, alignment).
+    container_type: 'VStack', 'HStack', or 'ZStack'
+    """
+    if layout.axis is None:
+        return 'ZStack', '.center'
+    container = 'VStack' if layout.axis == 'VERTICAL' else 'HStack'
+    if layout.inferred:
+        # Inferred stacks have no counter-axis alignment to honor
+        return container, '.leading' if container == 'VStack' else '.center'
+    return container, _SWIFTUI_ALIGNMENTS[layout.axis].get(counter_align, '.center')
+
+
+def _swiftui_offset(placement: Optional[ChildPlacement], prefix: str) -> str:
+    """ZStack offset modifier from the container center, or '' when within 1pt."""
+    if placement is None:
+        return ''
+    if abs(placement.center_dx) > 1 or abs(placement.center_dy) > 1:
+        return f'\n{prefix}.offset(x: {int(placement.center_dx)}, y: {int(placement.center_dy)})'
+    return ''
 
 
 def _is_icon_container(node: Dict[str, Any]) -> bool:
@@ -1038,7 +1016,7 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
 
         # Check if container has styling (background, cornerRadius)
         has_fills = any(f.get('visible', True) and f.get('type') == 'SOLID' for f in node.get('fills', []))
-        corner_radii = parse_corners(node)
+        corner_radii = computed_style(node).corners
         has_styling = has_fills or (corner_radii and corner_radii.top_left > 0)
 
         if has_styling:
@@ -1082,32 +1060,14 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
         else:
             return f'{prefix}Image(systemName: "{sf_symbol}") // {icon_name}\n{prefix}    .frame(width: {w}, height: {h})'
 
-    # Determine container type from layout mode
-    layout_mode = node.get('layoutMode')
-    gap = node.get('itemSpacing', 0)
-    primary_align = node.get('primaryAxisAlignItems', 'MIN')
-    counter_align = node.get('counterAxisAlignItems', 'MIN')
+    # If no children, render as styled Rectangle
+    if not children:
+        return _swiftui_empty_container(node, indent)
 
-    if layout_mode == 'VERTICAL':
-        container = 'VStack'
-        h_align_map = {'MIN': '.leading', 'CENTER': '.center', 'MAX': '.trailing'}
-        alignment = h_align_map.get(counter_align, '.center')
-    elif layout_mode == 'HORIZONTAL':
-        container = 'HStack'
-        v_align_map = {'MIN': '.top', 'CENTER': '.center', 'MAX': '.bottom'}
-        alignment = v_align_map.get(counter_align, '.center')
-    else:
-        # Smart heuristic: analyze children positions to pick VStack/HStack/ZStack
-        container_bbox = node.get('absoluteBoundingBox', {})
-        container, inferred_gap = _analyze_children_layout(children, container_bbox)
-        if container == 'VStack':
-            alignment = '.leading'
-            gap = inferred_gap
-        elif container == 'HStack':
-            alignment = '.center'
-            gap = inferred_gap
-        else:
-            alignment = '.center'
+    # Determine container type from the shared container layout
+    layout = computed_style(node).container_layout
+    container, alignment = _swiftui_stack(layout, node.get('counterAxisAlignItems', 'MIN'))
+    gap = layout.gap
 
     # Build spacing param
     params = []
@@ -1117,40 +1077,25 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
         params.append(f"spacing: {int(gap)}")
     params_str = ', '.join(params)
 
-    # If no children, render as styled Rectangle
-    if not children:
-        return _swiftui_empty_container(node, indent)
-
     # Filter visible children for SPACE_BETWEEN logic
-    visible_children = [c for c in children if c.get('visible', True)]
+    visible_children = layout.visible_children
 
     # Single-child frame flatten: if container has exactly 1 visible child and
     # the child is also a container with similar dimensions, skip the wrapper
-    if len(visible_children) == 1 and layout_mode:
-        child = visible_children[0]
-        child_type = child.get('type', '')
-        if child_type in ('FRAME', 'GROUP', 'COMPONENT', 'INSTANCE'):
-            child_bbox = child.get('absoluteBoundingBox', {})
-            node_bbox = node.get('absoluteBoundingBox', {})
-            cw = child_bbox.get('width', 0)
-            ch = child_bbox.get('height', 0)
-            nw = node_bbox.get('width', 0)
-            nh = node_bbox.get('height', 0)
-            # Same dimensions = redundant wrapper
-            if nw > 0 and abs(cw - nw) < 2 and abs(ch - nh) < 2:
-                child_code = _generate_swiftui_node(child, indent, depth + 1, parent_node=node)
-                if child_code:
-                    # Apply this node's modifiers to the child
-                    modifiers, gradient_def = _swiftui_collect_modifiers(node)
-                    if gradient_def:
-                        child_code += '\n' + gradient_def
-                    for mod in modifiers:
-                        child_code += f'\n{prefix}{mod}'
-                    return child_code
+    child = _flattened_child(node, layout)
+    if child is not None:
+        child_code = _generate_swiftui_node(child, indent, depth + 1, parent_node=node)
+        if child_code:
+            # Apply this node's modifiers to the child
+            modifiers, gradient_def = _swiftui_collect_modifiers(node)
+            if gradient_def:
+                child_code += '\n' + gradient_def
+            for mod in modifiers:
+                child_code += f'\n{prefix}{mod}'
+            return child_code
 
     # Detect layout wrap (flex-wrap: wrap) → LazyVGrid with adaptive columns
-    layout_wrap = node.get('layoutWrap', 'NO_WRAP')
-    needs_wrap = (layout_wrap == 'WRAP' and container == 'HStack')
+    needs_wrap = layout.kind == 'grid'
 
     # Detect horizontal overflow → wrap in ScrollView(.horizontal)
     # Key insight: Figma's absoluteBoundingBox for auto-layout HStack = full content width,
@@ -1165,24 +1110,13 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
             parent_w = parent_bbox.get('width', 0)
             if parent_w > 0 and node_w > parent_w + 1:
                 needs_scroll = True
+        children_total_w = layout.content_width + gap * max(0, len(visible_children) - 1)
         # Check 2: this node clips its own content
         if not needs_scroll and node.get('clipsContent', False):
-            children_total_w = sum(
-                c.get('absoluteBoundingBox', {}).get('width', 0)
-                for c in visible_children
-                if c.get('absoluteBoundingBox')
-            )
-            children_total_w += gap * max(0, len(visible_children) - 1)
             if children_total_w > node_w + 1:
                 needs_scroll = True
         # Check 3: content significantly wider than node's own frame
         if not needs_scroll and node_w > 0:
-            children_total_w = sum(
-                c.get('absoluteBoundingBox', {}).get('width', 0)
-                for c in visible_children
-                if c.get('absoluteBoundingBox')
-            )
-            children_total_w += gap * max(0, len(visible_children) - 1)
             if children_total_w > node_w * 1.1:
                 needs_scroll = True
 
@@ -1203,37 +1137,12 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
         # Open container
         lines.append(f'{prefix}{container}({params_str}) {{')
 
-    # For ZStack with absolute positioning, calculate offsets from container origin
-    container_bbox = node.get('absoluteBoundingBox', {})
-    container_x = container_bbox.get('x', 0)
-    container_y = container_bbox.get('y', 0)
-    container_w = container_bbox.get('width', 0)
-    container_h = container_bbox.get('height', 0)
-    use_offsets = (container == 'ZStack' and len(visible_children) > 1)
-
-    # Render children recursively
-    child_count = 0
-    for i, child in enumerate(visible_children):
-        if child_count >= MAX_NATIVE_CHILDREN_LIMIT:
-            lines.append(f'{prefix}    // ... {len(visible_children) - MAX_NATIVE_CHILDREN_LIMIT} more children truncated')
-            break
-        child_code = _generate_swiftui_node(child, indent + 4, depth + 1, parent_node=node)
-        if child_code:
-            # Add offset for ZStack children based on absolute position
-            if use_offsets:
-                child_bbox = child.get('absoluteBoundingBox', {})
-                if child_bbox:
-                    child_w = child_bbox.get('width', 0)
-                    child_h = child_bbox.get('height', 0)
-                    # Calculate offset from container center (ZStack default alignment)
-                    offset_x = (child_bbox.get('x', 0) + child_w / 2) - (container_x + container_w / 2)
-                    offset_y = (child_bbox.get('y', 0) + child_h / 2) - (container_y + container_h / 2)
-                    if abs(offset_x) > 1 or abs(offset_y) > 1:
-                        child_code += f'\n{prefix}        .offset(x: {int(offset_x)}, y: {int(offset_y)})'
-            lines.append(child_code)
-            child_count += 1
-            if primary_align == 'SPACE_BETWEEN' and i < len(visible_children) - 1:
-                lines.append(f'{prefix}    Spacer()')
+    # Render children recursively, or a usage of the instance's subview
+    component = instance_component(node)
+    if component is not None:
+        lines.append(f'{prefix}    {_instance_usage(component, node)}')
+    else:
+        lines.extend(_swiftui_children(node, layout, container, indent + 4, depth + 1))
 
     # Close container
     if needs_wrap:
@@ -1257,6 +1166,89 @@ def _swiftui_container_node(node: Dict[str, Any], indent: int, depth: int, paren
     return '\n'.join(lines)
 
 
+def _flattened_child(node: Dict[str, Any], layout: ContainerLayout) -> Optional[Dict[str, Any]]:
+    """The only child of an auto-layout container that has the container's size."""
+    if len(layout.visible_children) != 1 or not node.get('layoutMode'):
+        return None
+    child = layout.visible_children[0]
+    if child.get('type', '') not in ('FRAME', 'GROUP', 'COMPONENT', 'INSTANCE'):
+        return None
+    child_bbox = child.get('absoluteBoundingBox', {})
+    node_bbox = node.get('absoluteBoundingBox', {})
+    cw = child_bbox.get('width', 0)
+    ch = child_bbox.get('height', 0)
+    nw = node_bbox.get('width', 0)
+    nh = node_bbox.get('height', 0)
+    # Same dimensions = redundant wrapper
+    if nw > 0 and abs(cw - nw) < 2 and abs(ch - nh) < 2:
+        return child
+    return None
+
+
+def _swiftui_children(node: Dict[str, Any], layout: ContainerLayout, container: str, indent: int, depth: int) -> list[str]:
+    """Render a container's visible children, offset from the center inside a ZStack."""
+    prefix = ' ' * indent
+    visible_children = layout.visible_children
+    # For ZStack with absolute positioning, offset children from the container center
+    use_offsets = (container == 'ZStack' and len(visible_children) > 1)
+    space_between = node.get('primaryAxisAlignItems', 'MIN') == 'SPACE_BETWEEN'
+
+    lines = []
+    child_count = 0
+    for i, child in enumerate(visible_children):
+        if child_count >= MAX_NATIVE_CHILDREN_LIMIT:
+            lines.append(f'{prefix}// ... {len(visible_children) - MAX_NATIVE_CHILDREN_LIMIT} more children truncated')
+            break
+        child_code = _generate_swiftui_node(child, indent, depth, parent_node=node)
+        if child_code:
+            # Add offset for ZStack children based on absolute position
+            if use_offsets:
+                child_code += _swiftui_offset(place_child(child, node), f'{prefix}    ')
+            lines.append(child_code)
+            child_count += 1
+            if space_between and i < len(visible_children) - 1:
+                lines.append(f'{prefix}Spacer()')
+    return lines
+
+
+def _swiftui_string(value: str) -> str:
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{escaped}"'
+
+
+def _instance_usage(component: InstanceComponent, node: Dict[str, Any]) -> str:
+    arguments = ', '.join(f'{prop}: {_swiftui_string(value)}' for prop, value in instance_arguments(component, node))
+    return f'{component.name}({arguments})'
+
+
+def _instance_dedupe_eligible(node: Dict[str, Any]) -> bool:
+    """Instances the container renderer draws with their children inside a stack."""
+    return not _is_icon_container(node) and _flattened_child(node, computed_style(node).container_layout) is None
+
+
+def _instance_subview(component: InstanceComponent, components: InstanceComponents) -> str:
+    """Subview struct rendering an instance's children.
+
+    Each usage sits inside the instance's own stack, so the body's children
+    lay out exactly as the instance's children would.
+    """
+    template = components.template(component)
+    layout = computed_style(template).container_layout
+    container, _ = _swiftui_stack(layout, template.get('counterAxisAlignItems', 'MIN'))
+    body = '\n'.join(_swiftui_children(template, layout, container, 8, component.depth + 1)) or '        EmptyView()'
+    body = components.bind(component, body, quoted='{}', bare='\\({})')
+    fields = ''.join(f'    let {prop}: String\n' for prop in component.props)
+    if fields:
+        fields += '\n'
+    return f'''
+
+struct {component.name}: View {{
+{fields}    var body: some View {{
+{body}
+    }}
+}}'''
+
+
 def _swiftui_empty_container(node: Dict[str, Any], indent: int) -> str:
     """Render a container with no children as a styled shape."""
     prefix = ' ' * indent
@@ -1302,12 +1294,13 @@ _sanitize_component_name = sanitize_component_name  # Use shared sanitizer from
 # Task 7: Public entry point
 # ---------------------------------------------------------------------------
 
-def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str:
+def generate_swiftui_code(node: Dict[str, Any], component_name: str = '', dedupe_instances: bool = False) -> str:
     """Generate complete SwiftUI view from Figma node tree.
 
     Public entry point. Produces a full SwiftUI struct with:
     - Import statement
     - View struct with body
+    - Subview structs for repeated instances if ``dedupe_instances``
     - Gradient definitions if needed
     - Preview provider
     - RoundedCorner helper shape if needed
@@ -1315,6 +1308,16 @@ def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str
     if not component_name:
         component_name = _sanitize_component_name(node.get('name', 'GeneratedView'))
 
+    components = None
+    if dedupe_instances:
+        components = InstanceComponents(node, reserved_names=(component_name,), eligible=_instance_dedupe_eligible)
+    with instance_components_scope(components):
+        return _swiftui_view_code(node, component_name, components)
+
+
+def _swiftui_view_code(node: Dict[str, Any], component_name: str, components: Optional[InstanceComponents]) -> str:
+    subviews = ''.join(_instance_subview(component, components) for component in components or ())
+
     # Generate body content
     body_code = _generate_swiftui_node(node, indent=12, depth=0)
     if not body_code:
@@ -1325,31 +1328,9 @@ def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str
     modifiers_str = '\n        '.join(modifiers) if modifiers else ''
 
     # Determine root container
-    layout_mode = node.get('layoutMode')
-    gap = node.get('itemSpacing', 0)
-    counter_align = node.get('counterAxisAlignItems', 'MIN')
-
-    if layout_mode == 'VERTICAL':
-        container = 'VStack'
-        h_align_map = {'MIN': '.leading', 'CENTER': '.center', 'MAX': '.trailing'}
-        alignment = h_align_map.get(counter_align, '.center')
-    elif layout_mode == 'HORIZONTAL':
-        container = 'HStack'
-        v_align_map = {'MIN': '.top', 'CENTER': '.center', 'MAX': '.bottom'}
-        alignment = v_align_map.get(counter_align, '.center')
-    else:
-        # Smart heuristic for root container too
-        children = node.get('children', [])
-        container_bbox = node.get('absoluteBoundingBox', {})
-        container, inferred_gap = _analyze_children_layout(children, container_bbox)
-        if container == 'VStack':
-            alignment = '.leading'
-            gap = inferred_gap
-        elif container == 'HStack':
-            alignment = '.center'
-            gap = inferred_gap
-        else:
-            alignment = '.center'
+    layout = computed_style(node).container_layout
+    container, alignment = _swiftui_stack(layout, node.get('counterAxisAlignItems', 'MIN'))
+    gap = layout.gap
 
     params = []
     if alignment != '.center' or container != 'ZStack':
@@ -1364,13 +1345,10 @@ def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str
         gradient_section = f'\n{gradient_def}\n'
 
     # Build children code directly (not via _swiftui_container_node to avoid double wrapping)
-    children = node.get('children', [])
-    visible_children = [c for c in children if c.get('visible', True)]
+    visible_children = layout.visible_children
 
     # ZStack offset calculation for root container
     root_bbox = node.get('absoluteBoundingBox', {})
-    root_x = root_bbox.get('x', 0)
-    root_y = root_bbox.get('y', 0)
     root_w = root_bbox.get('width', 0)
     root_h = root_bbox.get('height', 0)
     use_root_offsets = (container == 'ZStack' and len(visible_children) > 1)
@@ -1385,14 +1363,7 @@ def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str
         if child_code:
             # Add offset for ZStack children in root container
             if use_root_offsets:
-                child_bbox = child.get('absoluteBoundingBox', {})
-                if child_bbox:
-                    child_w = child_bbox.get('width', 0)
-                    child_h = child_bbox.get('height', 0)
-                    offset_x = (child_bbox.get('x', 0) + child_w / 2) - (root_x + root_w / 2)
-                    offset_y = (child_bbox.get('y', 0) + child_h / 2) - (root_y + root_h / 2)
-                    if abs(offset_x) > 1 or abs(offset_y) > 1:
-                        child_code += f'\n                .offset(x: {int(offset_x)}, y: {int(offset_y)})'
+                child_code += _swiftui_offset(place_child(child, node), '                ')
             children_lines.append(child_code)
             child_count += 1
 
@@ -1401,15 +1372,8 @@ def generate_swiftui_code(node: Dict[str, Any], component_name: str = '') -> str
     # Detect horizontal overflow for root → wrap in ScrollView(.horizontal)
     root_needs_scroll = False
     if container == 'HStack':
-        root_bbox = node.get('absoluteBoundingBox', {})
-        root_w = root_bbox.get('width', 0)
         if root_w > 0:
-            children_total_w = sum(
-                c.get('absoluteBoundingBox', {}).get('width', 0)
-                for c in visible_children
-                if c.get('absoluteBoundingBox')
-            )
-            children_total_w += gap * max(0, len(visible_children) - 1)
+            children_total_w = layout.content_width + gap * max(0, len(visible_children) - 1)
             if children_total_w > root_w * 1.05:
                 root_needs_scroll = True
 
@@ -1470,7 +1434,7 @@ struct {component_name}: View {{{gradient_section}
         {body_content}
         {modifiers_str}
     }}
-}}
+}}{subviews}
 
 #Preview {{
     {component_name}()
@@ -8,21 +8,21 @@ blur, opacity, blend modes, rotation, padding, auto-layout, text styling,
 hyperlinks, line clamping, and paragraph spacing.
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, Generator, List, Optional
 
 # Import shared constants and CSS helpers from base module
 from generators.base import (
     TAILWIND_WEIGHT_MAP,
     TAILWIND_ALIGN_MAP,
     MAX_CHILDREN_LIMIT,
-    _get_background_css,
-    _extract_stroke_data,
-    _corner_radii_to_css,
+    computed_style,
     _transform_to_css,
     _blend_mode_to_css,
     _rgba_to_hex,
     _text_case_to_css,
     _text_decoration_to_css,
+    run_nested,
+    walk_nodes,
 )
 
 
@@ -68,7 +68,12 @@ defineProps<{{
 
 
 def recursive_node_to_vue_template(node: Dict[str, Any], indent: int = 4, use_tailwind: bool = True) -> str:
-    """Recursively generate Vue template code for nested children with enhanced styles."""
+    """Generate Vue template code for a node and its nested children with enhanced styles."""
+    return run_nested(_vue_template_task(node, indent, use_tailwind))
+
+
+def _vue_template_task(node: Dict[str, Any], indent: int, use_tailwind: bool) -> Generator[Any, str, str]:
+    """Render one node's template, yielding a task per child for ``run_nested``."""
     lines = []
     prefix = ' ' * indent
     node_type = node.get('type', '')
@@ -80,10 +85,11 @@ def recursive_node_to_vue_template(node: Dict[str, Any], indent: int = 4, use_ta
 
     # Fills (with gradient support)
     fills = node.get('fills', [])
-    bg_value, bg_type = _get_background_css(node)
+    computed = computed_style(node)
+    bg_value, bg_type = computed.background_css
 
     # Strokes
-    stroke_data = _extract_stroke_data(node)
+    stroke_data = computed.stroke_data
     stroke_color = ''
     stroke_weight = stroke_data['weight'] if stroke_data else 0
     if stroke_data and stroke_data['colors']:
@@ -92,7 +98,7 @@ def recursive_node_to_vue_template(node: Dict[str, Any], indent: int = 4, use_ta
             stroke_color = first_stroke.get('color', '')
 
     # Corner radius (with individual corners)
-    corner_radius_css = _corner_radii_to_css(node)
+    corner_radius_css = computed.corner_radius_css
 
     # Transform
     transform_css = _transform_to_css(node)
@@ -271,7 +277,7 @@ def recursive_node_to_vue_template(node: Dict[str, Any], indent: int = 4, use_ta
 
         children = node.get('children', [])
         for child in children[:MAX_CHILDREN_LIMIT]:
-            child_template = recursive_node_to_vue_template(child, indent + 2, use_tailwind)
+            child_template = yield _vue_template_task(child, indent + 2, use_tailwind)
             if child_template:
                 lines.append(child_template)
 
@@ -281,7 +287,16 @@ def recursive_node_to_vue_template(node: Dict[str, Any], indent: int = 4, use_ta
 
 
 def generate_recursive_css(node: Dict[str, Any], rules: List[str], parent_name: str = '') -> List[str]:
-    """Generate CSS rules for all nodes recursively."""
+    """Generate CSS rules for a node and its descendants in document order."""
+    for current, _, _, _ in walk_nodes(node, max_children=20):
+        rule = _node_css_rule(current)
+        if rule:
+            rules.append(rule)
+    return rules
+
+
+def _node_css_rule(node: Dict[str, Any]) -> Optional[str]:
+    """Build the CSS rule for one node, or None when it has no styles."""
     node_type = node.get('type', '')
     name = node.get('name', 'Unknown')
     class_name = name.lower().replace(' ', '-').replace('/', '-')
@@ -366,13 +381,8 @@ def generate_recursive_css(node: Dict[str, Any], rules: List[str], parent_name:
             css_props.append(f"text-decoration: {text_dec_value};")
 
     if css_props:
-        rule = f".{class_name} {{\n  " + "\n  ".join(css_props) + "\n}"
-        rules.append(rule)
-
-    for child in node.get('children', [])[:20]:
-        generate_recursive_css(child, rules, class_name)
-
-    return rules
+        return f".{class_name} {{\n  " + "\n  ".join(css_props) + "\n}"
+    return None
 
 
 # ---------------------------------------------------------------------------
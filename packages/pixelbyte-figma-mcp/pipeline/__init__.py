@@ -6,6 +6,7 @@ from pipeline.models import (
     GateStatus,
     PipelineRunRequest,
     PipelineRunResult,
+    PipelineBatchResult,
     GateResult,
     DesignIR,
     AssetManifestItem,
@@ -19,6 +20,7 @@ __all__ = [
     "GateStatus",
     "PipelineRunRequest",
     "PipelineRunResult",
+    "PipelineBatchResult",
     "GateResult",
     "DesignIR",
     "AssetManifestItem",
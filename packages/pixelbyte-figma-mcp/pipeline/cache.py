@@ -1,19 +1,146 @@
-"""Stage-level JSON cache for deterministic pipeline runs."""
+"""Stage-level cache for deterministic pipeline runs."""
 
 from __future__ import annotations
 
+import gzip
 import hashlib
 import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+import msgpack
+
+from pipeline import service_metrics
+from pipeline.metrics import record_io
+
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 14 * 24 * 3600.0
+
+_STAT_FIELDS = ("memory_hits", "disk_hits", "misses", "corrupt", "bytes_read", "bytes_written")
+_ENTRY_NAME_RE = re.compile(r"^[0-9a-f]{64}\.(?:bin|json\.gz|json)$")
+_STALE_TEMP_SECONDS = 3600.0
+_ZLIB_LEVEL = 1
+
+# Entry header: magic, then the SHA-256 of the stage key and the body. The digest
+# is checked before anything is decompressed or parsed, so damaged, truncated or
+# misplaced entries are rejected up front. Bodies are zlib-compressed MessagePack,
+# which encodes several times faster than JSON and decodes only into plain
+# mappings, lists and scalars. Entries from the previous gzip JSON format are
+# still read; entries in the earlier marshal format carry no header and are
+# discarded unread.
+_ENTRY_MAGIC = b"PBC3"
+_JSON_ENTRY_MAGIC = b"PBC2"
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+def _entry_digest(stage_key: str, body: bytes) -> bytes:
+    digest = hashlib.sha256(stage_key.encode("ascii"))
+    digest.update(body)
+    return digest.digest()
+
+
+def _encode_entry(stage_key: str, data: Dict[str, Any]) -> Tuple[bytes, int]:
+    """Serialize a payload to a digest-checked MessagePack entry; returns (entry bytes, raw size)."""
+    raw = msgpack.packb(data, use_bin_type=True)
+    body = zlib.compress(raw, _ZLIB_LEVEL)
+    return _ENTRY_MAGIC + _entry_digest(stage_key, body) + body, len(raw)
+
+
+def _decode_entry(stage_key: str, stored: bytes) -> Tuple[Dict[str, Any], int]:
+    """Inverse of ``_encode_entry``; raises ``ValueError`` for foreign or damaged entries."""
+    magic = stored[: len(_ENTRY_MAGIC)]
+    header_size = len(_ENTRY_MAGIC) + _DIGEST_SIZE
+    if len(stored) < header_size or magic not in (_ENTRY_MAGIC, _JSON_ENTRY_MAGIC):
+        raise ValueError("not a stage cache entry")
+    body = stored[header_size:]
+    if stored[len(_ENTRY_MAGIC) : header_size] != _entry_digest(stage_key, body):
+        raise ValueError("stage cache entry digest mismatch")
+    if magic == _JSON_ENTRY_MAGIC:
+        raw = gzip.decompress(body)
+        data = json.loads(raw.decode("utf-8"))
+    else:
+        raw = zlib.decompress(body)
+        data = msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    if not isinstance(data, dict):
+        raise ValueError("stage cache entry is not a mapping")
+    return data, len(raw)
+
+
+class _MemoryTier:
+    """Byte-bounded LRU of parsed stage payloads."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, value: Dict[str, Any], size: int) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared per cache root so runners created for separate tool calls reuse parsed payloads.
+_MEMORY_TIERS: Dict[str, _MemoryTier] = {}
+_MEMORY_TIERS_LOCK = threading.Lock()
+
+
+def _shared_memory_tier(root_dir: Path, max_bytes: int) -> _MemoryTier:
+    key = str(root_dir.resolve())
+    with _MEMORY_TIERS_LOCK:
+        tier = _MEMORY_TIERS.get(key)
+        if tier is None:
+            tier = _MemoryTier(max_bytes)
+            _MEMORY_TIERS[key] = tier
+        else:
+            tier.max_bytes = max_bytes
+        return tier
 
 
 class StageCache:
-    """Simple file-backed cache keyed by stable hashes."""
+    """File-backed cache keyed by stable hashes, fronted by an in-process LRU.
 
-    def __init__(self, root_dir: Path) -> None:
+    Disk entries are zlib-compressed MessagePack behind a SHA-256 digest, written
+    atomically; entries whose digest does not match or that fail to decode are
+    deleted and counted as corrupt. JSON entries from older releases are still
+    read and replaced on the next save. Writes go through to disk and
+    memory. Payloads returned by ``load`` may be shared with the memory tier and
+    must be treated as read-only by callers.
+    """
+
+    def __init__(self, root_dir: Path, memory_bytes: int = DEFAULT_MEMORY_BYTES) -> None:
         self.root_dir = Path(root_dir)
         self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._memory = _shared_memory_tier(self.root_dir, memory_bytes) if memory_bytes > 0 else None
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(_STAT_FIELDS, 0))
 
     @staticmethod
     def _stable_json(value: Dict[str, Any]) -> str:
@@ -27,20 +154,182 @@ class StageCache:
         return digest.hexdigest()
 
     def _stage_file(self, stage_key: str) -> Path:
-        return self.root_dir / f"{stage_key}.json"
+        return self.root_dir / f"{stage_key}.bin"
 
-    def load(self, stage_key: str) -> Optional[Dict[str, Any]]:
-        path = self._stage_file(stage_key)
-        if not path.exists():
+    def _legacy_stage_files(self, stage_key: str) -> Tuple[Path, Path]:
+        return self.root_dir / f"{stage_key}.json.gz", self.root_dir / f"{stage_key}.json"
+
+    @staticmethod
+    def _decode_legacy(path: Path, stored: bytes) -> Tuple[Dict[str, Any], int]:
+        raw = gzip.decompress(stored) if path.suffix == ".gz" else stored
+        data = json.loads(raw.decode("utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError("stage cache entry is not a mapping")
+        return data, len(raw)
+
+    def _read_entry(self, stage_key: str) -> Optional[Tuple[Dict[str, Any], int, int, Path]]:
+        """Return (payload, raw size, stored size, path), deleting entries that fail to decode."""
+        for path in (self._stage_file(stage_key), *self._legacy_stage_files(stage_key)):
+            try:
+                stored = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            try:
+                if path.suffix == ".bin":
+                    data, raw_size = _decode_entry(stage_key, stored)
+                else:
+                    data, raw_size = self._decode_legacy(path, stored)
+            except (OSError, EOFError, ValueError, TypeError, zlib.error, UnicodeDecodeError):
+                path.unlink(missing_ok=True)
+                return None
+            return data, raw_size, len(stored), path
+        return None
+
+    def _has_entry(self, stage_key: str) -> bool:
+        return any(path.exists() for path in (self._stage_file(stage_key), *self._legacy_stage_files(stage_key)))
+
+    def load(self, stage_key: str, stage_name: str = "unknown") -> Optional[Dict[str, Any]]:
+        stats = self._stats[stage_name]
+        if self._memory is not None:
+            entry = self._memory.get(stage_key)
+            if entry is not None:
+                stats["memory_hits"] += 1
+                service_metrics.inc("pbfigma_stage_cache_lookups_total", stage=stage_name, result="memory_hit")
+                self._touch(stage_key)
+                return entry[0]
+
+        if not self._has_entry(stage_key):
+            stats["misses"] += 1
+            service_metrics.inc("pbfigma_stage_cache_lookups_total", stage=stage_name, result="miss")
             return None
-        try:
-            return json.loads(path.read_text(encoding="utf-8"))
-        except json.JSONDecodeError:
+
+        entry = self._read_entry(stage_key)
+        if entry is None:
+            stats["corrupt"] += 1
+            stats["misses"] += 1
+            service_metrics.inc("pbfigma_stage_cache_lookups_total", stage=stage_name, result="corrupt")
             return None
 
-    def save(self, stage_key: str, data: Dict[str, Any]) -> Path:
+        data, raw_size, stored_size, path = entry
+        stats["disk_hits"] += 1
+        stats["bytes_read"] += stored_size
+        record_io(read=stored_size)
+        service_metrics.inc("pbfigma_stage_cache_lookups_total", stage=stage_name, result="disk_hit")
+        service_metrics.inc("pbfigma_stage_cache_bytes_total", stored_size, direction="read")
+        self._touch(stage_key, path)
+        if self._memory is not None:
+            self._memory.put(stage_key, data, raw_size)
+        return data
+
+    def _touch(self, stage_key: str, path: Optional[Path] = None) -> None:
+        """Record an access; file mtime doubles as the last-access time for eviction."""
+        try:
+            os.utime(path or self._stage_file(stage_key))
+        except OSError:
+            pass
+
+    def save(self, stage_key: str, data: Dict[str, Any], stage_name: str = "unknown") -> Path:
         path = self._stage_file(stage_key)
-        temp_path = path.with_suffix(".tmp")
-        temp_path.write_text(json.dumps(data, ensure_ascii=True, indent=2), encoding="utf-8")
-        temp_path.replace(path)
+        stored, raw_size = _encode_entry(stage_key, data)
+
+        # Unique temp file + fsync + rename: readers never observe a partial entry,
+        # and concurrent writers of the same key cannot clobber each other's temp file.
+        fd, temp_name = tempfile.mkstemp(dir=self.root_dir, prefix=f".{stage_key[:16]}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(stored)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temp_name, path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+        for legacy_path in self._legacy_stage_files(stage_key):
+            legacy_path.unlink(missing_ok=True)
+
+        self._stats[stage_name]["bytes_written"] += len(stored)
+        record_io(written=len(stored))
+        service_metrics.inc("pbfigma_stage_cache_bytes_total", len(stored), direction="write")
+        if self._memory is not None:
+            self._memory.put(stage_key, data, raw_size)
         return path
+
+    def _entries(self) -> List[Tuple[Path, int, float]]:
+        entries: List[Tuple[Path, int, float]] = []
+        for path in self.root_dir.iterdir():
+            if not _ENTRY_NAME_RE.match(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def disk_stats(self) -> Dict[str, Any]:
+        """Entry count, stored bytes and last-access range of the on-disk tier."""
+        entries = self._entries()
+        accessed = [mtime for _, _, mtime in entries]
+
+        def _iso(value: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(value, timezone.utc).isoformat() if value is not None else None
+
+        return {
+            "root_dir": str(self.root_dir),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "oldest_access": _iso(min(accessed) if accessed else None),
+            "newest_access": _iso(max(accessed) if accessed else None),
+        }
+
+    def prune(
+        self,
+        max_bytes: Optional[int] = DEFAULT_MAX_DISK_BYTES,
+        max_age_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+    ) -> Dict[str, Any]:
+        """Drop entries idle longer than ``max_age_seconds``, then least-recently-used ones above ``max_bytes``."""
+        now = time.time()
+        removed = 0
+        freed = 0
+
+        for temp_path in self.root_dir.glob(".*.tmp"):
+            try:
+                if now - temp_path.stat().st_mtime > _STALE_TEMP_SECONDS:
+                    temp_path.unlink()
+            except OSError:
+                pass
+
+        kept: List[Tuple[Path, int, float]] = []
+        for path, size, mtime in self._entries():
+            if max_age_seconds is not None and now - mtime > max_age_seconds:
+                path.unlink(missing_ok=True)
+                removed += 1
+                freed += size
+            else:
+                kept.append((path, size, mtime))
+
+        total = sum(size for _, size, _ in kept)
+        if max_bytes is not None and total > max_bytes:
+            kept.sort(key=lambda item: item[2])
+            while kept and total > max_bytes:
+                path, size, _ = kept.pop(0)
+                path.unlink(missing_ok=True)
+                removed += 1
+                freed += size
+                total -= size
+
+        return {
+            "removed_entries": removed,
+            "freed_bytes": freed,
+            "remaining_entries": len(kept),
+            "remaining_bytes": total,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage hit/miss/byte counters plus current memory-tier occupancy."""
+        return {
+            "stages": {name: dict(counters) for name, counters in sorted(self._stats.items())},
+            "memory_entries": len(self._memory) if self._memory is not None else 0,
+            "memory_bytes": self._memory.current_bytes if self._memory is not None else 0,
+            "memory_max_bytes": self._memory.max_bytes if self._memory is not None else 0,
+        }
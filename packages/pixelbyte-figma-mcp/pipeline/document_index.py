@@ -0,0 +1,180 @@
+"""One-pass structural index over a Figma document tree, and a small cache of fetched documents."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+from generators.base import walk_nodes
+
+
+class DocumentIndex:
+    """Id, parent, ancestor-path, type and component-instance lookups over a node tree.
+
+    Built in a single explicit-stack walk. Nodes are shared with the tree and
+    must not be mutated. When ids repeat, the first node in document order
+    wins. Type buckets and component instances list node ids in document
+    order.
+    """
+
+    def __init__(self, root: Dict[str, Any]) -> None:
+        self.root = root
+        self.root_id: str = root.get("id", "")
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._parent_ids: Dict[str, Optional[str]] = {}
+        self._depths: Dict[str, int] = {}
+        self._by_type: Dict[str, List[str]] = {}
+        self._instances: Dict[str, List[str]] = {}
+        for node, parent, depth, _ in walk_nodes(root):
+            node_id = node.get("id")
+            if not node_id or node_id in self._by_id:
+                continue
+            self._by_id[node_id] = node
+            self._parent_ids[node_id] = parent.get("id") if parent is not None else None
+            self._depths[node_id] = depth
+            self._by_type.setdefault(node.get("type", ""), []).append(node_id)
+            component_id = node.get("componentId")
+            if component_id and node.get("type") == "INSTANCE":
+                self._instances.setdefault(component_id, []).append(node_id)
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._by_id)
+
+    def get(self, node_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(node_id)
+
+    def parent_id(self, node_id: str) -> Optional[str]:
+        return self._parent_ids.get(node_id)
+
+    def parent(self, node_id: str) -> Optional[Dict[str, Any]]:
+        parent_id = self._parent_ids.get(node_id)
+        return self._by_id.get(parent_id) if parent_id else None
+
+    def depth(self, node_id: str) -> int:
+        return self._depths[node_id]
+
+    def ancestor_ids(self, node_id: str) -> List[str]:
+        """Ids from the root down to the node's parent."""
+        if node_id not in self._by_id:
+            raise KeyError(f"Node '{node_id}' is not in the document index.")
+        ancestors: List[str] = []
+        parent_id = self._parent_ids[node_id]
+        while parent_id:
+            ancestors.append(parent_id)
+            parent_id = self._parent_ids.get(parent_id)
+        ancestors.reverse()
+        return ancestors
+
+    def path(self, node_id: str) -> List[str]:
+        """Node names from the root down to and including the node."""
+        return [self._by_id[item].get("name", "") for item in self.ancestor_ids(node_id)] + [
+            self._by_id[node_id].get("name", "")
+        ]
+
+    def of_type(self, *node_types: str) -> List[Dict[str, Any]]:
+        if len(node_types) == 1:
+            return [self._by_id[node_id] for node_id in self._by_type.get(node_types[0], [])]
+        wanted = set(node_types)
+        return [node for node in self._by_id.values() if node.get("type") in wanted]
+
+    def type_counts(self) -> Dict[str, int]:
+        return {node_type: len(ids) for node_type, ids in sorted(self._by_type.items())}
+
+    def instances_of(self, component_id: str) -> List[Dict[str, Any]]:
+        return [self._by_id[node_id] for node_id in self._instances.get(component_id, [])]
+
+    def component_instance_counts(self) -> Dict[str, int]:
+        return {component_id: len(ids) for component_id, ids in sorted(self._instances.items())}
+
+
+class CachedDocument:
+    """A fetched document root plus response metadata; the index is built on first use."""
+
+    def __init__(self, root: Dict[str, Any], meta: Dict[str, Any], size: int = 0) -> None:
+        self.root = root
+        self.meta = meta
+        self.size = size
+        self.fetched_at = time.monotonic()
+        self._index: Optional[DocumentIndex] = None
+
+    @property
+    def index(self) -> DocumentIndex:
+        if self._index is None:
+            self._index = DocumentIndex(self.root)
+        return self._index
+
+
+class DocumentCache:
+    """Thread-safe LRU of recently fetched documents with a time-to-live.
+
+    Cached trees are shared between callers and must be treated as read-only.
+    A ``ttl_seconds`` of zero or less disables caching. The cache is bounded by
+    ``max_entries`` and/or ``max_bytes`` (the sum of the ``size`` given to
+    ``put``); a document larger than ``max_bytes`` is not cached.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries) if max_entries is not None else None
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Hashable, CachedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[CachedDocument]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.fetched_at > self.ttl_seconds:
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        root: Dict[str, Any],
+        meta: Optional[Dict[str, Any]] = None,
+        size: int = 0,
+    ) -> CachedDocument:
+        entry = CachedDocument(root, meta or {}, size)
+        if not self.enabled:
+            return entry
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self.current_bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+            ):
+                self._discard(next(iter(self._entries)))
+        return entry
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
@@ -1,24 +1,207 @@
-"""Stage timing and quality metrics helpers."""
+"""Stage timing, tracing spans and quality metrics helpers."""
 
 from __future__ import annotations
 
+import itertools
+import sys
 import time
-from typing import Any, Dict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from pipeline import service_metrics
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+
+@dataclass
+class Span:
+    """One timed operation; times are seconds relative to the trace origin.
+
+    ``cpu_seconds`` is process CPU time while the span was open, so concurrent
+    spans share it. ``peak_rss_delta_bytes`` is how far the process's peak RSS
+    rose during the span. I/O bytes are reported explicitly via ``record_io``
+    and include those of child spans.
+    """
+
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    category: str
+    start: float
+    duration: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_delta_bytes: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "category": self.category,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "peak_rss_delta_bytes": self.peak_rss_delta_bytes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "args": dict(self.args),
+        }
+
+
+_active: ContextVar[Optional[Tuple["StageMetrics", Span]]] = ContextVar("pipeline_active_span", default=None)
+
+
+def _peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
 
 
 class StageMetrics:
-    """Collects per-stage durations and run-level quality metrics."""
+    """Collects per-stage durations, nested tracing spans and run-level quality metrics.
+
+    Spans nest through a context variable, so sub-operations started inside a
+    stage (including in tasks and threads spawned from it) attach to that stage.
+    Code outside the runner reports into the active trace with the module-level
+    ``span`` and ``record_io`` helpers, which do nothing when no trace is active.
+    """
 
     def __init__(self) -> None:
         self.stage_timings: Dict[str, float] = {}
         self.quality_metrics: Dict[str, Any] = {}
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+
+    @contextmanager
+    def span(self, name: str, category: str = "operation", **args: Any) -> Iterator[Span]:
+        active = _active.get()
+        parent = active[1] if active is not None and active[0] is self else None
+        current = Span(
+            span_id=next(self._ids),
+            parent_id=parent.span_id if parent is not None else None,
+            name=name,
+            category=category,
+            start=time.perf_counter() - self._origin,
+            args=args,
+        )
+        self.spans.append(current)
+        cpu_start = time.process_time()
+        rss_start = _peak_rss_bytes()
+        token = _active.set((self, current))
+        try:
+            yield current
+        except BaseException as exc:
+            current.args["error"] = type(exc).__name__
+            raise
+        finally:
+            _active.reset(token)
+            current.duration = time.perf_counter() - self._origin - current.start
+            current.cpu_seconds = time.process_time() - cpu_start
+            current.peak_rss_delta_bytes = max(0, _peak_rss_bytes() - rss_start)
+            if parent is not None:
+                parent.bytes_read += current.bytes_read
+                parent.bytes_written += current.bytes_written
 
-    async def timed(self, stage_name: str, coro):
-        start = time.perf_counter()
-        result = await coro
-        elapsed = time.perf_counter() - start
-        self.stage_timings[stage_name] = round(elapsed, 3)
+    async def timed(self, stage_name: str, work: Union[Awaitable[Any], Callable[[], Awaitable[Any]]]):
+        """Await ``work`` inside a stage span; callables are invoked inside the span too."""
+        with self.span(stage_name, "stage") as stage_span:
+            result = await (work() if callable(work) else work)
+        self.stage_timings[stage_name] = round(self.stage_timings.get(stage_name, 0.0) + stage_span.duration, 3)
+        service_metrics.observe("pbfigma_pipeline_stage_seconds", stage_span.duration, stage=stage_name)
         return result
 
     def set_quality(self, metrics: Dict[str, Any]) -> None:
         self.quality_metrics.update(metrics)
+
+    def stage_resources(self) -> Dict[str, Dict[str, Any]]:
+        """Resource totals of top-level stage spans, summed per stage name."""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for item in self.spans:
+            if item.category != "stage" or item.parent_id is not None:
+                continue
+            row = totals.setdefault(
+                item.name,
+                {"calls": 0, "cpu_seconds": 0.0, "peak_rss_delta_bytes": 0, "bytes_read": 0, "bytes_written": 0},
+            )
+            row["calls"] += 1
+            row["cpu_seconds"] = round(row["cpu_seconds"] + item.cpu_seconds, 6)
+            row["peak_rss_delta_bytes"] = max(row["peak_rss_delta_bytes"], item.peak_rss_delta_bytes)
+            row["bytes_read"] += item.bytes_read
+            row["bytes_written"] += item.bytes_written
+        return totals
+
+    def chrome_trace(self, process_name: str = "pipeline") -> Dict[str, Any]:
+        """Export spans in the Chrome Trace Event format (chrome://tracing, Perfetto).
+
+        Overlapping spans that do not nest (concurrent sub-operations) are placed
+        on separate thread lanes so every lane is a proper call stack.
+        """
+
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": process_name}}
+        ]
+        lanes: List[List[int]] = []
+        ordered = sorted(self.spans, key=lambda item: (item.start, -item.duration, item.span_id))
+        for item in ordered:
+            start_us = int(item.start * 1_000_000)
+            duration_us = max(1, int(item.duration * 1_000_000))
+            end_us = start_us + duration_us
+            for tid, open_ends in enumerate(lanes):
+                while open_ends and open_ends[-1] <= start_us:
+                    open_ends.pop()
+                if not open_ends or end_us <= open_ends[-1]:
+                    open_ends.append(end_us)
+                    break
+            else:
+                lanes.append([end_us])
+                tid = len(lanes) - 1
+            events.append(
+                {
+                    "name": item.name,
+                    "cat": item.category,
+                    "ph": "X",
+                    "ts": start_us,
+                    "dur": duration_us,
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {
+                        **item.args,
+                        "span_id": item.span_id,
+                        "parent_id": item.parent_id,
+                        "cpu_ms": round(item.cpu_seconds * 1000.0, 3),
+                        "peak_rss_delta_bytes": item.peak_rss_delta_bytes,
+                        "bytes_read": item.bytes_read,
+                        "bytes_written": item.bytes_written,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+@contextmanager
+def span(name: str, category: str = "operation", **args: Any) -> Iterator[Optional[Span]]:
+    """Open a child span in the active trace, or do nothing outside one."""
+    active = _active.get()
+    if active is None:
+        yield None
+        return
+    with active[0].span(name, category, **args) as current:
+        yield current
+
+
+def record_io(read: int = 0, written: int = 0) -> None:
+    """Attribute I/O bytes to the active span, if any."""
+    active = _active.get()
+    if active is not None:
+        active[1].bytes_read += read
+        active[1].bytes_written += written
@@ -121,3 +121,18 @@ class PipelineRunResult(BaseModel):
     cache_hits: List[str] = Field(default_factory=list)
     cache_misses: List[str] = Field(default_factory=list)
     metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class PipelineBatchResult(BaseModel):
+    """Aggregate output of a multi-node pipeline batch."""
+
+    model_config = ConfigDict(validate_assignment=True, extra="allow")
+
+    batch_id: str
+    status: PipelineStatus
+    runs: List[PipelineRunResult] = Field(default_factory=list)
+    failures: Dict[str, str] = Field(default_factory=dict)
+    status_counts: Dict[str, int] = Field(default_factory=dict)
+    wall_seconds: float = Field(default=0.0, ge=0.0)
+    shared_calls: Dict[str, int] = Field(default_factory=dict)
+    artifacts: Dict[str, str] = Field(default_factory=dict)
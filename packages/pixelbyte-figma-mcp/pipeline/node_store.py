@@ -0,0 +1,129 @@
+"""Id-addressed view over a snapshot's Figma node tree."""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+from pipeline.document_index import DocumentIndex
+
+
+class NodeStore:
+    """Read-only index of the snapshot tree keyed by node id.
+
+    The snapshot is the single owner of the raw tree; the design IR and
+    downstream stage outputs carry node ids and small patch maps instead of
+    copies of it. Nodes returned by ``get`` are shared with the snapshot (and
+    possibly the stage cache) and must not be mutated; ``materialize`` returns
+    a private copy with patches applied for consumers that need a full tree.
+
+    Each node also has Merkle-style content hashes: ``own_hash`` covers the
+    node's fields except ``children`` and ``subtree_hash`` combines it with the
+    children's subtree hashes, so an edit changes the hashes of the edited node
+    and its ancestors only. Hashes are computed lazily for the subtree that is
+    looked up and memoized per node. Parent, path and type lookups go through
+    ``index``.
+    """
+
+    def __init__(self, root_node: Dict[str, Any]) -> None:
+        self.root_node = root_node
+        self.root_id: str = root_node.get("id", "")
+        self.index = DocumentIndex(root_node)
+        # Keyed by id() of the node objects, which ``root_node`` keeps alive.
+        self._hashes: Dict[int, Tuple[str, str]] = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "NodeStore":
+        return cls(snapshot["node"])
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def get(self, node_id: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(node_id)
+
+    def _node_hashes(self, node: Dict[str, Any]) -> Tuple[str, str]:
+        cached = self._hashes.get(id(node))
+        if cached is not None:
+            return cached
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            children = current.get("children", [])
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in children if id(child) not in self._hashes)
+                continue
+
+            own = json.dumps(
+                {key: value for key, value in current.items() if key != "children"},
+                ensure_ascii=True,
+                sort_keys=True,
+                separators=(",", ":"),
+            )
+            own_hash = hashlib.sha256(own.encode("utf-8")).hexdigest()
+            subtree = hashlib.sha256(own_hash.encode("ascii"))
+            for child in children:
+                subtree.update(self._hashes[id(child)][1].encode("ascii"))
+            self._hashes[id(current)] = (own_hash, subtree.hexdigest())
+        return self._hashes[id(node)]
+
+    def hashes(self, node_id: str) -> Tuple[str, str]:
+        """Return ``(own_hash, subtree_hash)`` for a node.
+
+        Only the requested subtree is hashed; results are memoized per node, so
+        later lookups inside or above it reuse the descendants' hashes.
+        """
+        node = self.root_node if node_id == self.root_id else self.index.get(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        return self._node_hashes(node)
+
+    def own_hash(self, node_id: str) -> str:
+        return self.hashes(node_id)[0]
+
+    def subtree_hash(self, node_id: Optional[str] = None) -> str:
+        return self.hashes(self.root_id if node_id is None else node_id)[1]
+
+    def materialize(
+        self,
+        node_id: Optional[str] = None,
+        image_urls: Optional[Mapping[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Deep-copy a subtree (the root by default) and set ``imageUrl`` on visible image fills."""
+
+        source = self.root_node if node_id is None else self.index.get(node_id)
+        if source is None:
+            raise KeyError(f"Node '{node_id}' is not in the node store.")
+
+        # Copied level by level: ``copy.deepcopy`` recurses per tree level.
+        subtree = {key: copy.deepcopy(value) for key, value in source.items() if key != "children"}
+        stack = [(source, subtree)]
+        while stack:
+            original, copied = stack.pop()
+            if "children" not in original:
+                continue
+            copied["children"] = []
+            for child in original["children"]:
+                child_copy = {key: copy.deepcopy(value) for key, value in child.items() if key != "children"}
+                copied["children"].append(child_copy)
+                stack.append((child, child_copy))
+        if image_urls:
+            stack = [subtree]
+            while stack:
+                node = stack.pop()
+                for fill in node.get("fills", []):
+                    if fill.get("type") == "IMAGE" and fill.get("visible", True):
+                        image_ref = fill.get("imageRef")
+                        if image_ref and image_ref in image_urls:
+                            fill["imageUrl"] = image_urls[image_ref]
+                stack.extend(node.get("children", []))
+        return subtree
@@ -6,8 +6,12 @@ import asyncio
 import re
 import sys
 import tempfile
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from pipeline import service_metrics
+from pipeline.metrics import record_io, span
 
 
 _IMPORT_LINE_RE = re.compile(r"(?m)^\s*import\s+[^;]+;\s*$")
@@ -76,6 +80,74 @@ async def _capture_with_playwright(
         await browser.close()
 
 
+class ImplementationRenderPool:
+    """One headless Chromium shared by many implementation renders.
+
+    The browser is launched on the first capture and each render gets its own
+    page; ``max_pages`` bounds concurrently open pages. Use as an async context
+    manager so the browser is closed when the batch ends.
+    """
+
+    def __init__(self, max_pages: int = 4) -> None:
+        self._max_pages = max(1, max_pages)
+        self._pages = asyncio.Semaphore(self._max_pages)
+        self._launch_lock = asyncio.Lock()
+        self._playwright: Any = None
+        self._browser: Any = None
+
+    async def _get_browser(self) -> Any:
+        async with self._launch_lock:
+            if self._browser is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                try:
+                    self._browser = await self._playwright.chromium.launch(headless=True)
+                except Exception:
+                    await self._playwright.stop()
+                    self._playwright = None
+                    raise
+                service_metrics.inc("pbfigma_render_pool_capacity", self._max_pages)
+            return self._browser
+
+    async def capture(
+        self,
+        html_path: Path,
+        output_path: Path,
+        viewport_width: int,
+        viewport_height: int,
+        timeout_ms: int,
+    ) -> None:
+        browser = await self._get_browser()
+        async with self._pages:
+            service_metrics.inc("pbfigma_render_pool_pages_in_use")
+            try:
+                page = await browser.new_page(viewport={"width": viewport_width, "height": viewport_height})
+                try:
+                    await page.goto(html_path.as_uri(), wait_until="domcontentloaded", timeout=timeout_ms)
+                    await page.wait_for_timeout(1500)
+                    await page.screenshot(path=str(output_path), full_page=False)
+                finally:
+                    await page.close()
+            finally:
+                service_metrics.inc("pbfigma_render_pool_pages_in_use", -1)
+
+    async def close(self) -> None:
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+            service_metrics.inc("pbfigma_render_pool_capacity", -self._max_pages)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self) -> "ImplementationRenderPool":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        await self.close()
+
+
 async def render_react_implementation_screenshot(
     generated_code: str,
     component_name: str,
@@ -85,8 +157,12 @@ async def render_react_implementation_screenshot(
     output_path: str,
     use_tailwind: bool = True,
     timeout_ms: int = 45_000,
+    pool: Optional[ImplementationRenderPool] = None,
 ) -> Dict[str, Any]:
-    """Render TSX code in headless browser and capture PNG screenshot."""
+    """Render TSX code in headless browser and capture PNG screenshot.
+
+    With ``pool`` the capture reuses the pool's browser instead of launching one.
+    """
 
     output = Path(output_path).expanduser().resolve()
     output.parent.mkdir(parents=True, exist_ok=True)
@@ -142,18 +218,26 @@ __PBRoot.render(React.createElement(__PBTarget));
 </html>
 """
 
+    capture = pool.capture if pool is not None else _capture_with_playwright
+
     with tempfile.TemporaryDirectory(prefix="pb_figma_render_") as temp_dir:
         html_path = Path(temp_dir) / "render.html"
         html_path.write_text(html, encoding="utf-8")
 
         try:
-            await _capture_with_playwright(html_path, output, width, height, timeout_ms)
+            started = time.perf_counter()
+            with span("browser_capture", "render", pooled=pool is not None):
+                await capture(html_path, output, width, height, timeout_ms)
+                record_io(written=output.stat().st_size)
+            service_metrics.observe(
+                "pbfigma_render_seconds", time.perf_counter() - started, pooled=str(pool is not None).lower()
+            )
         except Exception as exc:  # noqa: BLE001
             message = str(exc)
             if "Executable doesn't exist" in message or "download new browsers" in message:
                 try:
                     await _ensure_playwright_chromium()
-                    await _capture_with_playwright(html_path, output, width, height, timeout_ms)
+                    await capture(html_path, output, width, height, timeout_ms)
                 except Exception as install_exc:  # noqa: BLE001
                     return {
                         "path": None,
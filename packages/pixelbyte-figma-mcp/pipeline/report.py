@@ -4,12 +4,12 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
-def _write_json(path: Path, payload: Any) -> None:
+def _write_json(path: Path, payload: Any, indent: Optional[int] = 2) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=True, indent=2), encoding="utf-8")
+    path.write_text(json.dumps(payload, ensure_ascii=True, indent=indent), encoding="utf-8")
 
 
 def _write_text(path: Path, content: str) -> None:
@@ -43,8 +43,10 @@ def package_run_artifacts(
     visual_gate_path = run_dir / "gate-visual.json"
     summary_path = run_dir / "summary.json"
 
-    _write_json(snapshot_path, snapshot)
-    _write_json(ir_path, design_ir)
+    # The node-tree artifacts are written compact: indented output goes through the
+    # pure-Python encoder, which made these two files most of a cached run's time.
+    _write_json(snapshot_path, snapshot, indent=None)
+    _write_json(ir_path, design_ir, indent=None)
     _write_json(assets_path, asset_materialization)
     _write_json(graph_path, component_graph)
     _write_text(code_path, generation.get("code", ""))
@@ -73,3 +75,24 @@ def package_run_artifacts(
         artifacts["implementation_screenshot"] = str(implementation_screenshot_path)
 
     return artifacts
+
+
+def package_batch_report(output_root: Path, batch_id: str, summary: Dict[str, Any]) -> Dict[str, str]:
+    """Persist the aggregate report of a multi-node batch and return its paths."""
+
+    batch_dir = output_root / batch_id
+    summary_path = batch_dir / "batch-summary.json"
+    _write_json(summary_path, summary)
+    return {
+        "batch_dir": str(batch_dir),
+        "batch_summary": str(summary_path),
+    }
+
+
+def package_trace(output_root: Path, run_id: str, trace: Dict[str, Any]) -> Dict[str, str]:
+    """Persist a run's Chrome-trace JSON next to its other artifacts."""
+
+    trace_path = output_root / run_id / "trace.json"
+    trace_path.parent.mkdir(parents=True, exist_ok=True)
+    trace_path.write_text(json.dumps(trace, ensure_ascii=True, separators=(",", ":")), encoding="utf-8")
+    return {"trace": str(trace_path)}
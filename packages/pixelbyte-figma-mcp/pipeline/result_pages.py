@@ -0,0 +1,96 @@
+"""Stable page cursors over list results that tools keep in a short-lived cache."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pipeline.document_index import DocumentCache
+
+
+class PageCursorError(ValueError):
+    """Raised for malformed cursors and for cursors issued to a different request."""
+
+
+def result_handle(*parts: Any) -> str:
+    """Deterministic handle for a request; equal requests get equal handles and cursors."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def versioned_handle(request: str, version: Any) -> str:
+    """Handle for the result of ``request`` built from one version of the document.
+
+    It starts with the request handle, so a cursor can be matched to its
+    request before anything is fetched, and it changes when the file does.
+    """
+    return request + hashlib.sha1(str(version).encode("utf-8")).hexdigest()[:8]
+
+
+def encode_cursor(handle: str, section: str, offset: int) -> str:
+    raw = f"{handle}:{section}:{offset}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    """Split a cursor into ``(handle, section, offset)``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        handle, section, offset = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split(":")
+        value = int(offset)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise PageCursorError(f"Invalid cursor '{cursor}'.") from None
+    if not handle or not section or value < 0:
+        raise PageCursorError(f"Invalid cursor '{cursor}'.")
+    return handle, section, value
+
+
+class ResultPages:
+    """Named sections of list results, kept per request handle.
+
+    Later pages of a result are sliced from the stored sections instead of
+    recomputing and re-serializing the whole response. Entries expire like
+    documents in ``DocumentCache``; an expired handle is rebuilt by the tool
+    from a fresh fetch, and because handles include the document version,
+    outstanding cursors stay valid only while the file is unchanged.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self._store = DocumentCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def get(self, handle: str) -> Optional[Dict[str, List[Any]]]:
+        entry = self._store.get(handle)
+        return entry.root if entry is not None else None
+
+    def put(self, handle: str, sections: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        return self._store.put(handle, sections).root
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    @staticmethod
+    def page(
+        handle: str,
+        sections: Dict[str, List[Any]],
+        section: str,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """Slice one section; ``nextCursor`` is ``None`` on the last page.
+
+        A ``limit`` of 0 lists no items, and its cursor starts at ``offset``.
+        """
+        if section not in sections:
+            raise PageCursorError(f"Unknown result section '{section}'.")
+        items = sections[section]
+        end = offset + max(0, limit)
+        return {
+            "section": section,
+            "offset": offset,
+            "total": len(items),
+            "items": items[offset:end],
+            "nextCursor": encode_cursor(handle, section, end) if end < len(items) else None,
+        }
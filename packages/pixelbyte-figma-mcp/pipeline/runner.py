@@ -3,18 +3,31 @@
 from __future__ import annotations
 
 import asyncio
+import copy
 import hashlib
 import json
 import re
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
+from pipeline import service_metrics
 from pipeline.cache import StageCache
 from pipeline.exception_lane import run_exception_lane
 from pipeline.metrics import StageMetrics
-from pipeline.models import GateResult, GateStatus, PipelineRunRequest, PipelineRunResult, PipelineStatus
+from pipeline.models import (
+    GateResult,
+    GateStatus,
+    PipelineBatchResult,
+    PipelineRunRequest,
+    PipelineRunResult,
+    PipelineStatus,
+)
+from pipeline.node_store import NodeStore
+from pipeline.report import package_batch_report, package_trace
+from pipeline.screenshot_index import ScreenshotIndex
 from pipeline.stages import (
     build_component_dag,
     fetch_snapshot,
@@ -29,6 +42,10 @@ from pipeline.stages import (
 _CLASSNAME_LITERAL_RE = re.compile(r'className="([^"]*)"')
 _CLASSNAME_TEMPLATE_RE = re.compile(r"className=\{`([^`]*)`\}")
 _ARBITRARY_VALUE_RE = re.compile(r"\[([^\[\]]+)\]")
+_REUSE_TABLE_MAX_ENTRIES = 4096
+# Shape of the extract_tokens payload. Bump it whenever token fields change, so
+# that cached token stages (and the stages keyed on them) are rebuilt.
+_TOKENS_SCHEMA_VERSION = 3
 
 
 @dataclass
@@ -45,6 +62,8 @@ class PipelineDependencies:
         [str, str, List[Dict[str, Any]], int, int, str, bool],
         Awaitable[Dict[str, Any]],
     ]
+    probe_file_version: Optional[Callable[[str], Awaitable[Optional[str]]]] = None
+    render_subtree_jsx: Optional[Callable[..., str]] = None
 
 
 @dataclass
@@ -55,9 +74,17 @@ class PipelineConfig:
     cache_root: Path = Path(".qa/cache")
     output_root: Path = Path(".qa/runs")
     cache_enabled: bool = True
+    cache_memory_bytes: int = 64 * 1024 * 1024
+    cache_max_bytes: Optional[int] = 512 * 1024 * 1024
+    cache_ttl_seconds: Optional[float] = 14 * 24 * 3600.0
     pass_threshold: float = 95.0
     warn_threshold: float = 85.0
     visual_mode: str = "hybrid"
+    visual_evidence_mode: str = "async"
+    visual_evidence_max_dimension: int = 0
+    visual_evidence_palette: bool = False
+    codegen_workers: Optional[int] = None
+    visual_workers: Optional[int] = None
 
 
 def _stable_digest(payload: Dict[str, Any]) -> str:
@@ -106,20 +133,410 @@ def _add_overflow_hidden_for_rounded(code: str) -> str:
     return result
 
 
+def _evict_on_failure(tasks: Dict[str, "asyncio.Future[Any]"], key: str) -> Callable[["asyncio.Future[Any]"], None]:
+    """Done-callback that drops a failed or cancelled shared call so the next caller retries it."""
+
+    def _callback(task: "asyncio.Future[Any]") -> None:
+        if (task.cancelled() or task.exception() is not None) and tasks.get(key) is task:
+            del tasks[key]
+
+    return _callback
+
+
+class _SharedFetches:
+    """Coalesces the per-node Figma calls of a batch into one call per file.
+
+    Snapshot fetches request every batch node of a file in a single
+    ``ids=a,b,c`` call, version probes run once per file, and image-ref
+    resolution only asks for refs no earlier call has attempted. A shared call
+    that fails is reported to the runs waiting on it and retried by later ones.
+    """
+
+    def __init__(self, deps: PipelineDependencies, node_ids_by_file: Dict[str, List[str]]) -> None:
+        self._deps = deps
+        self._node_ids_by_file = node_ids_by_file
+        self._snapshots: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self._versions: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+        self._image_urls: Dict[str, Dict[str, str]] = {}
+        self._attempted_refs: Dict[str, set[str]] = {}
+        self._image_lock = asyncio.Lock()
+        self.calls = {"snapshot_fetches": 0, "version_probes": 0, "image_resolutions": 0}
+
+    async def fetch_snapshot(self, file_key: str, node_id: str) -> Dict[str, Any]:
+        task = self._snapshots.get(file_key)
+        if task is None:
+            node_ids = self._node_ids_by_file.get(file_key) or [node_id]
+            self.calls["snapshot_fetches"] += 1
+            task = asyncio.ensure_future(self._deps.fetch_snapshot(file_key, ",".join(node_ids)))
+            task.add_done_callback(_evict_on_failure(self._snapshots, file_key))
+            self._snapshots[file_key] = task
+        # Shielded: a cancelled run must not cancel the call other runs wait on.
+        raw = await asyncio.shield(task)
+
+        nodes = raw.get("nodes") or {}
+        if node_id not in nodes:
+            self.calls["snapshot_fetches"] += 1
+            return await self._deps.fetch_snapshot(file_key, node_id)
+        envelope = {key: value for key, value in raw.items() if key != "nodes"}
+        envelope["nodes"] = {node_id: nodes[node_id]}
+        return envelope
+
+    async def probe_file_version(self, file_key: str) -> Optional[str]:
+        task = self._versions.get(file_key)
+        if task is None:
+            assert self._deps.probe_file_version is not None
+            self.calls["version_probes"] += 1
+            task = asyncio.ensure_future(self._deps.probe_file_version(file_key))
+            task.add_done_callback(_evict_on_failure(self._versions, file_key))
+            self._versions[file_key] = task
+        return await asyncio.shield(task)
+
+    async def resolve_image_urls(self, file_key: str, image_refs: List[str]) -> Dict[str, str]:
+        async with self._image_lock:
+            known = self._image_urls.setdefault(file_key, {})
+            attempted = self._attempted_refs.setdefault(file_key, set())
+            missing = [ref for ref in image_refs if ref not in known and ref not in attempted]
+            if missing:
+                self.calls["image_resolutions"] += 1
+                attempted.update(missing)
+                known.update(await self._deps.resolve_image_urls(file_key, missing))
+        return {ref: known[ref] for ref in image_refs if ref in known}
+
+
+class _VisualGateBatch:
+    """Scores the visual gates of a batch's concurrent runs together on a process pool.
+
+    A run hands over its (figma, implementation) screenshot pair and waits. Once
+    every run that holds a concurrency slot is waiting (or has finished), the
+    collected pairs go through ``visual_gates.run_batch`` in one call, so pixel
+    scoring of different nodes runs on several cores instead of behind the GIL.
+    """
+
+    def __init__(self, config: PipelineConfig) -> None:
+        self._config = config
+        self._pending: List[Tuple[Optional[str], Optional[str], str, "asyncio.Future[GateResult]"]] = []
+        self._active = 0
+        self._scoring: set["asyncio.Task[None]"] = set()
+        self.batch_sizes: List[int] = []
+
+    def enter(self) -> None:
+        self._active += 1
+
+    def leave(self) -> None:
+        self._active -= 1
+        self._maybe_score()
+
+    async def score(
+        self,
+        figma_screenshot_path: Optional[str],
+        implementation_screenshot_path: Optional[str],
+        visual_mode: str,
+    ) -> GateResult:
+        future: "asyncio.Future[GateResult]" = asyncio.get_running_loop().create_future()
+        self._pending.append((figma_screenshot_path, implementation_screenshot_path, visual_mode, future))
+        self._maybe_score()
+        return await future
+
+    def _maybe_score(self) -> None:
+        if not self._pending or len(self._pending) < self._active:
+            return
+        pending, self._pending = self._pending, []
+        self.batch_sizes.append(len(pending))
+        task = asyncio.ensure_future(self._score(pending))
+        self._scoring.add(task)
+        task.add_done_callback(self._scoring.discard)
+
+    async def _score(self, pending: List[Tuple[Optional[str], Optional[str], str, "asyncio.Future[GateResult]"]]) -> None:
+        by_mode: Dict[str, List[Tuple[Optional[str], Optional[str], "asyncio.Future[GateResult]"]]] = {}
+        for figma_path, implementation_path, visual_mode, future in pending:
+            by_mode.setdefault(visual_mode, []).append((figma_path, implementation_path, future))
+
+        async def _score_mode(visual_mode: str, entries: List[Tuple[Optional[str], Optional[str], "asyncio.Future[GateResult]"]]) -> None:
+            try:
+                gates = await asyncio.to_thread(
+                    visual_gates.run_batch,
+                    [(figma_path, implementation_path) for figma_path, implementation_path, _ in entries],
+                    pass_threshold=self._config.pass_threshold,
+                    warn_threshold=self._config.warn_threshold,
+                    visual_mode=visual_mode,
+                    max_workers=self._config.visual_workers,
+                    evidence_mode=self._config.visual_evidence_mode,
+                    evidence_max_dimension=self._config.visual_evidence_max_dimension,
+                    evidence_palette=self._config.visual_evidence_palette,
+                )
+            except Exception as exc:  # noqa: BLE001
+                for _, _, future in entries:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            for (_, _, future), gate in zip(entries, gates):
+                if not future.done():
+                    future.set_result(gate)
+
+        await asyncio.gather(*(_score_mode(visual_mode, entries) for visual_mode, entries in by_mode.items()))
+
+
 class PipelineRunner:
     """Coordinates deterministic stages, caching, and gate-driven outcomes."""
 
-    def __init__(self, deps: PipelineDependencies, config: PipelineConfig) -> None:
+    def __init__(
+        self,
+        deps: PipelineDependencies,
+        config: PipelineConfig,
+        component_pool: Optional[generate_react.ComponentPool] = None,
+    ) -> None:
         self.deps = deps
         self.config = config
-        self.cache = StageCache(config.cache_root)
+        self.cache = StageCache(config.cache_root, memory_bytes=config.cache_memory_bytes)
+        self.screenshot_index = ScreenshotIndex(config.cache_root / "screenshot-index.json")
+        self.component_pool = component_pool or generate_react.ComponentPool(config.codegen_workers)
+        self._prune_after_run = True
+        self._visual_batch: Optional[_VisualGateBatch] = None
+
+    async def run_many(
+        self,
+        requests: List[PipelineRunRequest],
+        max_concurrency: int = 4,
+        output_dir: Optional[str] = None,
+    ) -> PipelineBatchResult:
+        """Run several nodes with shared Figma fetches and bounded parallelism.
+
+        Per-node runs share this runner's cache and screenshot index; a node
+        whose run raises is reported under ``failures`` without stopping the
+        batch, and ``runs`` keeps request order for the rest. Identical
+        requests are run once and visual gates are scored together across
+        processes. The aggregate report is written to ``<output>/<batch_id>/``.
+        """
+
+        started = time.perf_counter()
+        requests = list({request.model_dump_json(): request for request in requests}.values())
+        node_ids_by_file: Dict[str, List[str]] = {}
+        for request in requests:
+            node_ids = node_ids_by_file.setdefault(request.file_key, [])
+            if request.node_id not in node_ids:
+                node_ids.append(request.node_id)
+
+        shared = _SharedFetches(self.deps, node_ids_by_file)
+        batch_runner = copy.copy(self)
+        batch_runner._prune_after_run = False
+        batch_runner._visual_batch = visual_batch = _VisualGateBatch(self.config)
+        batch_runner.deps = replace(
+            self.deps,
+            fetch_snapshot=shared.fetch_snapshot,
+            resolve_image_urls=shared.resolve_image_urls,
+            probe_file_version=shared.probe_file_version if self.deps.probe_file_version else None,
+        )
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def _run_one(request: PipelineRunRequest) -> PipelineRunResult:
+            async with semaphore:
+                visual_batch.enter()
+                try:
+                    return await batch_runner.run(request)
+                finally:
+                    visual_batch.leave()
+
+        outcomes = await asyncio.gather(*(_run_one(request) for request in requests), return_exceptions=True)
+        # Runs wait for the evidence they report; this also settles diff maps of
+        # rejected patch iterations before the batch returns.
+        await asyncio.to_thread(visual_gates.flush_evidence_writes)
+
+        runs: List[PipelineRunResult] = []
+        failures: Dict[str, str] = {}
+        for request, outcome in zip(requests, outcomes):
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    raise outcome
+                failures[f"{request.file_key}:{request.node_id}"] = f"{type(outcome).__name__}: {outcome}"
+            else:
+                runs.append(outcome)
+
+        status_counts = {status.value: 0 for status in PipelineStatus}
+        for run in runs:
+            status_counts[run.status.value] += 1
+        status_counts[PipelineStatus.ERROR.value] += len(failures)
+        batch_status = next(
+            (
+                status
+                for status in (PipelineStatus.ERROR, PipelineStatus.FAIL, PipelineStatus.WARN)
+                if status_counts[status.value]
+            ),
+            PipelineStatus.PASS,
+        )
+
+        identity = sorted(
+            f"{request.file_key}:{request.node_id}:{request.framework}:{request.mode.value}" for request in requests
+        )
+        batch_id = (
+            f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_batch_"
+            f"{_stable_digest({'runs': identity, 'pipeline_version': self.config.pipeline_version})[:10]}"
+        )
+        wall_seconds = round(time.perf_counter() - started, 6)
+
+        if self.config.cache_enabled:
+            self.cache.prune(max_bytes=self.config.cache_max_bytes, max_age_seconds=self.config.cache_ttl_seconds)
+
+        output_root = Path(output_dir).expanduser().resolve() if output_dir else self.config.output_root.resolve()
+        summary = {
+            "batch_id": batch_id,
+            "status": batch_status.value,
+            "status_counts": status_counts,
+            "wall_seconds": wall_seconds,
+            "stage_seconds_total": round(sum(sum(run.stage_timings.values()) for run in runs), 6),
+            "shared_calls": dict(shared.calls),
+            "visual_gate_batches": visual_batch.batch_sizes,
+            "max_concurrency": max(1, max_concurrency),
+            "runs": [
+                {
+                    "node_id": request.node_id,
+                    "run_id": outcome.run_id,
+                    "status": outcome.status.value,
+                    "visual_score": outcome.quality_metrics.get("visual_score"),
+                    "cache_hits": outcome.cache_hits,
+                    "run_dir": outcome.artifacts.get("run_dir"),
+                }
+                for request, outcome in zip(requests, outcomes)
+                if isinstance(outcome, PipelineRunResult)
+            ],
+            "failures": failures,
+        }
+        artifacts = package_batch_report(output_root, batch_id, summary)
+
+        return PipelineBatchResult(
+            batch_id=batch_id,
+            status=batch_status,
+            runs=runs,
+            failures=failures,
+            status_counts=status_counts,
+            wall_seconds=wall_seconds,
+            shared_calls=dict(shared.calls),
+            artifacts=artifacts,
+        )
+
+    async def _load_snapshot(
+        self,
+        request: PipelineRunRequest,
+        metrics: StageMetrics,
+        cache_hits: List[str],
+        cache_misses: List[str],
+    ) -> Dict[str, Any]:
+        """Reuse the cached snapshot when a lightweight version probe says the file is unchanged."""
+
+        def _fetch() -> Awaitable[Dict[str, Any]]:
+            return metrics.timed(
+                "fetch_snapshot",
+                fetch_snapshot.run(request.file_key, request.node_id, self.deps.fetch_snapshot),
+            )
+
+        if not (request.use_cache and self.config.cache_enabled and self.deps.probe_file_version):
+            return await _fetch()
+
+        snapshot_key = self.cache.build_stage_key(
+            _stable_digest(
+                {
+                    "file_key": request.file_key,
+                    "node_id": request.node_id,
+                    "pipeline_version": self.config.pipeline_version,
+                }
+            ),
+            "fetch_snapshot",
+            {},
+        )
+
+        try:
+            current_version = await metrics.timed(
+                "probe_figma_version",
+                self.deps.probe_file_version(request.file_key),
+            )
+        except Exception:  # noqa: BLE001
+            current_version = None
+
+        cached = self.cache.load(snapshot_key, "fetch_snapshot")
+        if (
+            cached is not None
+            and current_version
+            and cached.get("meta", {}).get("figma_version") == current_version
+        ):
+            cache_hits.append("fetch_snapshot")
+            metrics.stage_timings.setdefault("fetch_snapshot", 0.0)
+            return cached
+
+        cache_misses.append("fetch_snapshot")
+        snapshot = await _fetch()
+        # Hashing the whole tree is the largest cost of a cached run, so the root
+        # content hash is stored with the snapshot instead of recomputed per run.
+        snapshot["meta"]["content_hash"] = NodeStore.from_snapshot(snapshot).subtree_hash()
+        self.cache.save(snapshot_key, snapshot, "fetch_snapshot")
+        return snapshot
+
+    async def _evaluate_visual_gate(
+        self,
+        figma_screenshot_path: Optional[str],
+        implementation_screenshot_path: Optional[str],
+        visual_mode: str,
+        use_index: bool,
+    ) -> tuple[GateResult, bool]:
+        """Run the visual gate off the event loop, reusing indexed results for unchanged pairs.
+
+        Inside ``run_many`` the pair is scored with the rest of the batch's pairs
+        on a process pool.
+        """
+
+        indexed = (
+            use_index
+            and figma_screenshot_path
+            and implementation_screenshot_path
+            and Path(figma_screenshot_path).exists()
+            and Path(implementation_screenshot_path).exists()
+        )
+        settings = {
+            "pipeline_version": self.config.pipeline_version,
+            "pass_threshold": self.config.pass_threshold,
+            "warn_threshold": self.config.warn_threshold,
+            "visual_mode": visual_mode,
+        }
+
+        if indexed:
+            cached = await asyncio.to_thread(
+                self.screenshot_index.load_gate, figma_screenshot_path, implementation_screenshot_path, settings
+            )
+            if cached is not None:
+                extra_evidence = [path for path in cached.get("evidence_paths", [])[2:] if Path(path).exists()]
+                cached["evidence_paths"] = [figma_screenshot_path, implementation_screenshot_path, *extra_evidence]
+                return GateResult(**cached), True
+
+        if self._visual_batch is not None:
+            gate = await self._visual_batch.score(figma_screenshot_path, implementation_screenshot_path, visual_mode)
+        else:
+            gate = await asyncio.to_thread(
+                visual_gates.run,
+                figma_screenshot_path=figma_screenshot_path,
+                implementation_screenshot_path=implementation_screenshot_path,
+                pass_threshold=self.config.pass_threshold,
+                warn_threshold=self.config.warn_threshold,
+                visual_mode=visual_mode,
+                evidence_mode=self.config.visual_evidence_mode,
+                evidence_max_dimension=self.config.visual_evidence_max_dimension,
+                evidence_palette=self.config.visual_evidence_palette,
+            )
+
+        if indexed:
+            await asyncio.to_thread(
+                self.screenshot_index.save_gate,
+                figma_screenshot_path,
+                implementation_screenshot_path,
+                settings,
+                gate.model_dump(mode="json"),
+            )
+            await asyncio.to_thread(self.screenshot_index.flush)
+        return gate, False
 
     async def run(self, request: PipelineRunRequest) -> PipelineRunResult:
+        # Every option that changes the output is part of the run id, so distinct
+        # requests never share a run directory.
         run_identity = {
-            "file_key": request.file_key,
-            "node_id": request.node_id,
-            "framework": request.framework,
-            "mode": request.mode.value,
+            **request.model_dump(mode="json", exclude={"output_dir"}),
             "pipeline_version": self.config.pipeline_version,
         }
         run_hash = _stable_digest(run_identity)
@@ -145,53 +562,57 @@ class PipelineRunner:
                 "framework": request.framework,
             }
         )
-        # Always fetch a fresh snapshot first so downstream cache keys can include figma_version.
-        snapshot = await metrics.timed(
-            "fetch_snapshot",
-            fetch_snapshot.run(request.file_key, request.node_id, self.deps.fetch_snapshot),
-        )
-
-        figma_version = (
-            snapshot.get("meta", {}).get("figma_version")
-            or snapshot.get("meta", {}).get("last_modified")
-            or "unknown"
-        )
+        # Resolve the snapshot first so downstream cache keys can hash its content.
+        snapshot = await self._load_snapshot(request, metrics, cache_hits, cache_misses)
+        node_store = NodeStore.from_snapshot(snapshot)
 
+        # Stage keys are content-addressed (Merkle hash of the requested subtree)
+        # rather than keyed on the file-wide figma_version, so edits elsewhere in
+        # the file do not invalidate this node's stages.
         base_cache_key = _stable_digest(
             {
                 "file_key": request.file_key,
                 "node_id": request.node_id,
-                "figma_version": figma_version,
+                "content_hash": snapshot["meta"].get("content_hash") or node_store.subtree_hash(),
                 "pipeline_version": self.config.pipeline_version,
                 "config_hash": config_hash,
                 "framework": request.framework,
                 "mode": request.mode.value,
             }
         )
+        reuse_enabled = request.use_cache and self.config.cache_enabled
+
+        # Stage keys chain on their upstream stage keys (which already determine the
+        # upstream output) instead of re-hashing large upstream payloads.
+        stage_keys: Dict[str, str] = {}
 
         async def run_stage_cached(stage_name: str, payload: Dict[str, Any], producer: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
-            if request.use_cache and self.config.cache_enabled:
-                stage_key = self.cache.build_stage_key(base_cache_key, stage_name, payload)
-                cached = self.cache.load(stage_key)
+            stage_key = self.cache.build_stage_key(base_cache_key, stage_name, payload)
+            stage_keys[stage_name] = stage_key
+            if reuse_enabled:
+                with metrics.span("cache_load", "cache", stage=stage_name) as load_span:
+                    cached = self.cache.load(stage_key, stage_name)
+                    load_span.args["hit"] = cached is not None
                 if cached is not None:
                     cache_hits.append(stage_name)
                     metrics.stage_timings.setdefault(stage_name, 0.0)
                     return cached
 
                 cache_misses.append(stage_name)
-                result = await metrics.timed(stage_name, producer())
-                self.cache.save(stage_key, result)
+                result = await metrics.timed(stage_name, producer)
+                with metrics.span("cache_save", "cache", stage=stage_name):
+                    self.cache.save(stage_key, result, stage_name)
                 return result
 
             cache_misses.append(stage_name)
-            return await metrics.timed(stage_name, producer())
+            return await metrics.timed(stage_name, producer)
 
         tokens = await run_stage_cached(
             "extract_tokens",
             {
                 "file_key": request.file_key,
                 "node_id": request.node_id,
-                "figma_version": figma_version,
+                "schema_version": _TOKENS_SCHEMA_VERSION,
             },
             lambda: self.deps.extract_tokens(request.file_key, request.node_id, snapshot["node"]),
         )
@@ -200,58 +621,112 @@ class PipelineRunner:
             "normalize_ir",
             {
                 "node_id": request.node_id,
-                "token_hash": _stable_digest(tokens),
+                "tokens_key": stage_keys["extract_tokens"],
             },
-            lambda: _wrap_sync(normalize_ir.run(snapshot, tokens)),
+            lambda: _wrap_sync(normalize_ir.run(snapshot, tokens, node_store)),
+        )
+
+        # Subtree-level reuse tables outlive content changes: they are keyed by
+        # file/node and hold entries addressed by image ref or subtree hash.
+        asset_table_key = self.cache.build_stage_key(
+            _stable_digest({"file_key": request.file_key, "pipeline_version": self.config.pipeline_version}),
+            "asset_refs",
+            {"assets_root": str(self.config.cache_root / "assets")},
         )
 
+        async def _materialize_assets() -> Dict[str, Any]:
+            known_assets = self.cache.load(asset_table_key, "asset_refs") if reuse_enabled else None
+            result = await materialize_assets.run(
+                node_store,
+                request.file_key,
+                self.deps.resolve_image_urls,
+                self.config.cache_root / "assets",
+                known_assets=known_assets,
+            )
+            if reuse_enabled and result["manifest"]:
+                # Re-read right before saving: concurrent batch runs of the same file share this table.
+                latest = self.cache.load(asset_table_key, "asset_refs") or {}
+                table = {**latest, **{row["image_ref"]: row for row in result["manifest"]}}
+                self.cache.save(asset_table_key, dict(list(table.items())[-_REUSE_TABLE_MAX_ENTRIES:]), "asset_refs")
+            return result
+
         asset_materialization = await run_stage_cached(
             "materialize_assets",
             {
                 "node_id": request.node_id,
-                "figma_version": figma_version,
+                "design_ir_key": stage_keys["normalize_ir"],
             },
-            lambda: materialize_assets.run(
-                design_ir,
-                request.file_key,
-                self.deps.resolve_image_urls,
-                self.config.cache_root / "assets",
-            ),
+            _materialize_assets,
         )
 
-        design_ir = asset_materialization["design_ir"]
+        design_ir = {
+            **design_ir,
+            "meta": snapshot["meta"],
+            "assets": {
+                "manifest": asset_materialization.get("manifest", []),
+                "by_image_ref": asset_materialization.get("by_image_ref", {}),
+                "download_errors": asset_materialization.get("download_errors", []),
+            },
+        }
 
         component_graph = await run_stage_cached(
             "build_component_dag",
             {
-                "ordering_hash": _stable_digest({"ordering": design_ir.get("ordering", [])}),
+                "design_ir_key": stage_keys["materialize_assets"],
             },
             lambda: _wrap_sync(build_component_dag.run(design_ir)),
         )
 
+        jsx_table_key = self.cache.build_stage_key(
+            _stable_digest(
+                {
+                    "file_key": request.file_key,
+                    "node_id": request.node_id,
+                    "pipeline_version": self.config.pipeline_version,
+                    "config_hash": config_hash,
+                }
+            ),
+            "generate_react_subtrees",
+            {"framework": request.framework, "mode": request.mode.value},
+        )
+
+        def _generate() -> Dict[str, Any]:
+            jsx_memo = generate_react.SubtreeJSXMemo(
+                node_store,
+                design_ir["assets"]["by_image_ref"],
+                self.cache.load(jsx_table_key, "generate_react_subtrees") if reuse_enabled else None,
+            )
+            result = generate_react.run(
+                design_ir,
+                node_store,
+                request.framework,
+                request.mode,
+                request.run_label,
+                self.deps.generate_react_code,
+                self.deps.sanitize_component_name,
+                jsx_memo=jsx_memo,
+                component_graph=component_graph,
+                render_subtree_fn=self.deps.render_subtree_jsx,
+                component_pool=self.component_pool,
+            )
+            if reuse_enabled and jsx_memo.stored:
+                self.cache.save(jsx_table_key, jsx_memo.entries(), "generate_react_subtrees")
+            return result
+
         generation = await run_stage_cached(
             "generate_react",
             {
                 "framework": request.framework,
                 "mode": request.mode.value,
                 "run_label": request.run_label or "",
-                "asset_manifest_hash": _stable_digest({"manifest": asset_materialization.get("manifest", [])}),
+                "design_ir_key": stage_keys["materialize_assets"],
             },
-            lambda: _wrap_sync(
-                generate_react.run(
-                    design_ir,
-                    request.framework,
-                    request.mode,
-                    request.run_label,
-                    self.deps.generate_react_code,
-                    self.deps.sanitize_component_name,
-                )
-            ),
+            lambda: asyncio.to_thread(_generate),
         )
 
         static_gate = await metrics.timed(
             "static_gates",
-            _wrap_sync(
+            lambda: _wrap_sync(
                 static_gates.run(
                     generation["code"],
                     asset_materialization.get("manifest", []),
@@ -264,6 +739,7 @@ class PipelineRunner:
         gate_results: List[GateResult] = [GateResult(**static_gate)]
 
         visual_mode = request.visual_mode or self.config.visual_mode
+        use_index = request.use_cache and self.config.cache_enabled
         figma_screenshot_path = None
         implementation_screenshot_path = request.implementation_screenshot_path
 
@@ -307,19 +783,41 @@ class PipelineRunner:
                 except asyncio.TimeoutError:
                     errors.append("Implementation screenshot render timed out after 90 seconds.")
 
-            figma_screenshot_path = await metrics.timed(
-                "capture_figma_screenshot",
-                self.deps.get_figma_screenshot(request.file_key, request.node_id, request.figma_screenshot_scale),
-            )
-
-            visual_gate_result = visual_gates.run(
-                figma_screenshot_path=figma_screenshot_path,
-                implementation_screenshot_path=implementation_screenshot_path,
-                pass_threshold=self.config.pass_threshold,
-                warn_threshold=self.config.warn_threshold,
-                visual_mode=visual_mode,
+            figma_screenshot_path = None
+            screenshot_key = None
+            if request.use_cache and self.config.cache_enabled:
+                screenshot_key = self.cache.build_stage_key(
+                    base_cache_key,
+                    "capture_figma_screenshot",
+                    {"scale": request.figma_screenshot_scale},
+                )
+                cached_screenshot = self.cache.load(screenshot_key, "capture_figma_screenshot") or {}
+                cached_path = cached_screenshot.get("path")
+                if cached_path and Path(cached_path).exists():
+                    figma_screenshot_path = cached_path
+                    cache_hits.append("capture_figma_screenshot")
+
+            if figma_screenshot_path is None:
+                figma_screenshot_path = await metrics.timed(
+                    "capture_figma_screenshot",
+                    self.deps.get_figma_screenshot(request.file_key, request.node_id, request.figma_screenshot_scale),
+                )
+                if screenshot_key and figma_screenshot_path:
+                    cache_misses.append("capture_figma_screenshot")
+                    self.cache.save(screenshot_key, {"path": figma_screenshot_path}, "capture_figma_screenshot")
+
+            visual_gate_result, visual_reused = await metrics.timed(
+                "visual_gates",
+                self._evaluate_visual_gate(
+                    figma_screenshot_path,
+                    implementation_screenshot_path,
+                    visual_mode,
+                    use_index=use_index,
+                ),
             )
-            visual_gate = await metrics.timed("visual_gates", _wrap_sync(visual_gate_result.model_dump()))
+            if visual_reused:
+                cache_hits.append("visual_gates")
+            visual_gate = visual_gate_result.model_dump()
 
         gate_results.append(GateResult(**visual_gate))
 
@@ -390,12 +888,28 @@ class PipelineRunner:
                     )
                     break
 
-                patched_visual = visual_gates.run(
-                    figma_screenshot_path=figma_screenshot_path,
-                    implementation_screenshot_path=candidate_impl_path,
-                    pass_threshold=self.config.pass_threshold,
-                    warn_threshold=self.config.warn_threshold,
-                    visual_mode=visual_mode,
+                # A render that looks the same as the current one cannot lift the score;
+                # the indexed fingerprints tell without running the full pixel diff.
+                if (
+                    use_index
+                    and implementation_screenshot_path
+                    and await asyncio.to_thread(
+                        self.screenshot_index.near_identical, implementation_screenshot_path, candidate_impl_path
+                    )
+                ):
+                    errors.append(
+                        f"Exception patch iteration {iteration} rendered no visible change; patch rejected."
+                    )
+                    continue
+
+                patched_visual, _ = await metrics.timed(
+                    f"exception_visual_{iteration}",
+                    self._evaluate_visual_gate(
+                        figma_screenshot_path,
+                        candidate_impl_path,
+                        visual_mode,
+                        use_index=use_index,
+                    ),
                 )
 
                 if patched_visual.score <= baseline_score:
@@ -404,7 +918,8 @@ class PipelineRunner:
                     )
                     continue
 
-                generation["code"] = patched_code
+                # Cached stage payloads are shared read-only objects; rebind instead of mutating.
+                generation = {**generation, "code": patched_code}
                 static_gate = patched_static.model_dump()
                 visual_gate = patched_visual.model_dump()
                 implementation_screenshot_path = candidate_impl_path
@@ -430,6 +945,18 @@ class PipelineRunner:
             errors.extend(exception_result.get("errors", []))
             status = exception_result.get("status", PipelineStatus.FAIL)
 
+        # Diff maps may still be queued on the evidence writer; wait for them so the
+        # summary, report and screenshot index only point at files that exist.
+        evidence_paths = [path for gate in gate_results for path in gate.evidence_paths]
+        failed_evidence = await asyncio.to_thread(visual_gates.flush_evidence_writes, evidence_paths)
+        if failed_evidence:
+            errors.extend(f"Visual diff evidence was not written: {path}" for path in sorted(failed_evidence))
+            gate_results = [
+                gate.model_copy(update={"evidence_paths": [p for p in gate.evidence_paths if p not in failed_evidence]})
+                for gate in gate_results
+            ]
+            visual_gate = {**visual_gate, "evidence_paths": gate_results[-1].evidence_paths}
+
         quality_metrics = dict(generation.get("quality_metrics", {}))
         quality_metrics["visual_score"] = visual_gate.get("score", 0.0)
 
@@ -438,6 +965,7 @@ class PipelineRunner:
             "status": status.value if isinstance(status, PipelineStatus) else str(status),
             "request": request.model_dump(),
             "stage_timings": metrics.stage_timings,
+            "stage_resources": metrics.stage_resources(),
             "quality_metrics": quality_metrics,
             "gates": [gate.model_dump() for gate in gate_results],
             "cache_hits": cache_hits,
@@ -456,7 +984,7 @@ class PipelineRunner:
 
         artifacts = await metrics.timed(
             "package_report",
-            _wrap_sync(
+            lambda: _wrap_sync(
                 package_report.run(
                     output_root=output_root,
                     run_id=run_id,
@@ -471,8 +999,15 @@ class PipelineRunner:
                 )
             ),
         )
+        artifacts = {**artifacts, **package_trace(output_root, run_id, metrics.chrome_trace(run_id))}
 
         pipeline_status = status if isinstance(status, PipelineStatus) else PipelineStatus(str(status))
+        service_metrics.inc("pbfigma_pipeline_runs_total", status=pipeline_status.value)
+        for gate in gate_results:
+            service_metrics.inc("pbfigma_gate_results_total", gate=gate.gate_name, status=gate.status.value)
+
+        if self.config.cache_enabled and self._prune_after_run:
+            self.cache.prune(max_bytes=self.config.cache_max_bytes, max_age_seconds=self.config.cache_ttl_seconds)
 
         return PipelineRunResult(
             run_id=run_id,
@@ -489,6 +1024,7 @@ class PipelineRunner:
                 "pipeline_version": self.config.pipeline_version,
                 "config_hash": config_hash,
                 "visual_mode": visual_mode,
+                "cache_stats": self.cache.stats(),
             },
         )
 
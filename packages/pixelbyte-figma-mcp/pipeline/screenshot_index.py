@@ -0,0 +1,226 @@
+"""Perceptual-hash index of pipeline screenshots and reusable visual gate results."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_HASH_SIZE = 8
+_THUMBNAIL_SIZE = 32
+# Largest per-pixel thumbnail difference (0-255) still treated as no visible change.
+_NEAR_IDENTICAL_MAX_DELTA = 1
+_MAX_PATHS = 2048
+_MAX_IMAGES = 2048
+_MAX_GATES = 2048
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _image_fingerprint(path: Path) -> Dict[str, Any]:
+    """Difference hash plus a grayscale thumbnail; empty when the file cannot be decoded."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            gray = image.convert("L")
+            box = getattr(getattr(Image, "Resampling", Image), "BOX")
+            hash_source = gray.resize((_HASH_SIZE + 1, _HASH_SIZE), resample=box).tobytes()
+            thumbnail = gray.resize((_THUMBNAIL_SIZE, _THUMBNAIL_SIZE), resample=box).tobytes()
+    except Exception:  # noqa: BLE001
+        return {}
+
+    bits = 0
+    for row in range(_HASH_SIZE):
+        offset = row * (_HASH_SIZE + 1)
+        for col in range(_HASH_SIZE):
+            bits = (bits << 1) | int(hash_source[offset + col] > hash_source[offset + col + 1])
+
+    return {
+        "width": width,
+        "height": height,
+        "phash": f"{bits:0{_HASH_SIZE * _HASH_SIZE // 4}x}",
+        "thumbnail": base64.b64encode(thumbnail).decode("ascii"),
+    }
+
+
+class ScreenshotIndex:
+    """Small JSON index keyed by screenshot path and content digest.
+
+    Each screenshot is fingerprinted once (content digest, perceptual hash and a
+    downsampled thumbnail). A path whose size and mtime are unchanged is resolved
+    without reading the file again, and gate results are stored per
+    (reference digest, implementation digest, gate settings) so an unchanged pair
+    is answered without decoding either image. ``similarity`` and
+    ``near_identical`` compare indexed fingerprints, so screenshots from earlier
+    runs are compared without a full decode. Methods are safe to call from
+    worker threads; the index file is replaced atomically on flush.
+    """
+
+    def __init__(self, index_path: Path) -> None:
+        self.index_path = Path(index_path)
+        self._data: Dict[str, Dict[str, Any]] = {"paths": {}, "images": {}, "gates": {}}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if self.index_path.exists():
+            try:
+                loaded = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, OSError):
+                loaded = {}
+            for section in self._data:
+                if isinstance(loaded.get(section), dict):
+                    self._data[section] = loaded[section]
+
+    def entry(self, path: str | Path) -> Optional[Dict[str, Any]]:
+        """Return the fingerprint of a screenshot, computing it on first sight."""
+        file_path = Path(path)
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return None
+
+        path_key = str(file_path.resolve())
+        with self._lock:
+            known = self._data["paths"].get(path_key)
+        if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+            digest = known["digest"]
+        else:
+            try:
+                digest = _file_digest(file_path)
+            except OSError:
+                return None
+            with self._lock:
+                self._data["paths"][path_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+                self._dirty = True
+
+        with self._lock:
+            fingerprint = self._data["images"].get(digest)
+        if fingerprint is None:
+            fingerprint = _image_fingerprint(file_path)
+            with self._lock:
+                self._data["images"][digest] = fingerprint
+                self._dirty = True
+        return {"digest": digest, **fingerprint}
+
+    def similarity(self, path_a: str | Path, path_b: str | Path) -> Optional[float]:
+        """Thumbnail similarity (0-100) of two screenshots from their indexed fingerprints."""
+        entry_a = self.entry(path_a)
+        entry_b = self.entry(path_b)
+        if not entry_a or not entry_b:
+            return None
+        if entry_a["digest"] == entry_b["digest"]:
+            return 100.0
+        if not entry_a.get("thumbnail") or not entry_b.get("thumbnail"):
+            return None
+        thumb_a = base64.b64decode(entry_a["thumbnail"])
+        thumb_b = base64.b64decode(entry_b["thumbnail"])
+        mean_delta = sum(abs(a - b) for a, b in zip(thumb_a, thumb_b)) / len(thumb_a)
+        return round(100.0 - (mean_delta / 255.0) * 100.0, 2)
+
+    def near_identical(self, path_a: str | Path, path_b: str | Path) -> bool:
+        """Whether two screenshots show no visible difference.
+
+        Both must match in size and perceptual hash, and their thumbnails may differ
+        by at most ``_NEAR_IDENTICAL_MAX_DELTA`` levels per pixel.
+        """
+        entry_a = self.entry(path_a)
+        entry_b = self.entry(path_b)
+        if not entry_a or not entry_b:
+            return False
+        if entry_a["digest"] == entry_b["digest"]:
+            return True
+        if not entry_a.get("phash") or (entry_a["width"], entry_a["height"], entry_a["phash"]) != (
+            entry_b.get("width"),
+            entry_b.get("height"),
+            entry_b.get("phash"),
+        ):
+            return False
+        thumb_a = base64.b64decode(entry_a["thumbnail"])
+        thumb_b = base64.b64decode(entry_b["thumbnail"])
+        return max(abs(a - b) for a, b in zip(thumb_a, thumb_b)) <= _NEAR_IDENTICAL_MAX_DELTA
+
+    def _gate_key(self, figma_path: str | Path, implementation_path: str | Path, settings: Dict[str, Any]) -> Optional[str]:
+        entry_a = self.entry(figma_path)
+        entry_b = self.entry(implementation_path)
+        if not entry_a or not entry_b:
+            return None
+        payload = json.dumps(
+            {"figma": entry_a["digest"], "implementation": entry_b["digest"], "settings": settings},
+            ensure_ascii=True,
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load_gate(
+        self,
+        figma_path: str | Path,
+        implementation_path: str | Path,
+        settings: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        key = self._gate_key(figma_path, implementation_path, settings)
+        if key is None:
+            return None
+        with self._lock:
+            cached = self._data["gates"].get(key)
+        return dict(cached) if cached is not None else None
+
+    def save_gate(
+        self,
+        figma_path: str | Path,
+        implementation_path: str | Path,
+        settings: Dict[str, Any],
+        gate: Dict[str, Any],
+    ) -> None:
+        key = self._gate_key(figma_path, implementation_path, settings)
+        if key is None:
+            return
+        with self._lock:
+            gates = self._data["gates"]
+            gates.pop(key, None)
+            gates[key] = gate
+            self._dirty = True
+
+    def _trim(self) -> None:
+        for section, limit in (("images", _MAX_IMAGES), ("gates", _MAX_GATES), ("paths", _MAX_PATHS)):
+            entries = self._data[section]
+            for key in list(entries)[: max(0, len(entries) - limit)]:
+                del entries[key]
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._trim()
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            handle = tempfile.NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=self.index_path.parent,
+                prefix=f".{self.index_path.name}.",
+                suffix=".tmp",
+                delete=False,
+            )
+            try:
+                with handle:
+                    json.dump(self._data, handle, ensure_ascii=True, separators=(",", ":"))
+                os.replace(handle.name, self.index_path)
+            except BaseException:
+                Path(handle.name).unlink(missing_ok=True)
+                raise
+            self._dirty = False
@@ -0,0 +1,174 @@
+"""Opt-in Prometheus-style metrics for the long-lived MCP server."""
+
+from __future__ import annotations
+
+import re
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help)
+_FAMILIES: Dict[str, Tuple[str, str]] = {
+    "pbfigma_tool_calls_total": ("counter", "MCP tool invocations by tool and outcome."),
+    "pbfigma_tool_call_seconds": ("histogram", "MCP tool call duration in seconds."),
+    "pbfigma_figma_requests_total": ("counter", "Figma API request attempts by endpoint and HTTP status."),
+    "pbfigma_figma_request_seconds": ("histogram", "Figma API request attempt latency in seconds."),
+    "pbfigma_figma_rate_limited_total": ("counter", "Figma API responses with status 429."),
+    "pbfigma_document_cache_lookups_total": ("counter", "Server document cache lookups by result."),
+    "pbfigma_stage_cache_lookups_total": ("counter", "Pipeline stage cache lookups by stage and result."),
+    "pbfigma_stage_cache_bytes_total": ("counter", "Pipeline stage cache bytes read or written from disk."),
+    "pbfigma_pipeline_stage_seconds": ("histogram", "Pipeline stage duration in seconds."),
+    "pbfigma_pipeline_runs_total": ("counter", "Pipeline runs by final status."),
+    "pbfigma_gate_results_total": ("counter", "Pipeline gate results by gate and status."),
+    "pbfigma_render_seconds": ("histogram", "Implementation screenshot capture duration in seconds."),
+    "pbfigma_render_pool_pages_in_use": ("gauge", "Browser pages currently capturing in render pools."),
+    "pbfigma_render_pool_capacity": ("gauge", "Browser page slots of open render pools."),
+}
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Sequence[float] = _DEFAULT_BUCKETS) -> None:
+        self._lock = threading.Lock()
+        self._buckets = tuple(sorted(buckets))
+        self._values: Dict[str, Dict[_LabelKey, float]] = {name: {} for name in _FAMILIES}
+        self._histograms: Dict[str, Dict[_LabelKey, List[float]]] = {
+            name: {} for name, (kind, _) in _FAMILIES.items() if kind == "histogram"
+        }
+
+    @staticmethod
+    def _key(labels: Dict[str, object]) -> _LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[name][self._key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Per-series layout: one non-cumulative count per bucket plus +Inf, then sum.
+            series = self._histograms[name].setdefault(key, [0.0] * (len(self._buckets) + 2))
+            series[bisect_left(self._buckets, value)] += 1
+            series[-1] += value
+
+    def value(self, name: str, **labels: object) -> float:
+        key = self._key(labels)
+        with self._lock:
+            if name in self._histograms:
+                series = self._histograms[name].get(key)
+                return sum(series[:-1]) if series else 0.0
+            return self._values[name].get(key, 0.0)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in _FAMILIES.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind != "histogram":
+                    for labels, value in sorted(self._values[name].items()):
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                for labels, series in sorted(self._histograms[name].items()):
+                    cumulative = 0.0
+                    for bound, count in zip((*self._buckets, float("inf")), series[:-1]):
+                        cumulative += count
+                        le = ("le", _format_value(bound))
+                        lines.append(f"{name}_bucket{_format_labels(labels, le)} {_format_value(cumulative)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(series[-1])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return "\n".join(lines) + "\n"
+
+
+_registry: Optional[MetricsRegistry] = None
+
+
+def enable() -> MetricsRegistry:
+    """Turn collection on (idempotent) and return the process-wide registry."""
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+    return _registry
+
+
+def registry() -> Optional[MetricsRegistry]:
+    return _registry
+
+
+def inc(name: str, value: float = 1.0, **labels: object) -> None:
+    if _registry is not None:
+        _registry.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels: object) -> None:
+    if _registry is not None:
+        _registry.set(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: object) -> None:
+    if _registry is not None:
+        _registry.observe(name, value, **labels)
+
+
+_ENDPOINT_ID_RE = re.compile(r"^(files|images|file_versions|components|component_sets|styles)/[^/]+")
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Collapse file keys and ids out of a Figma API path to keep label cardinality bounded."""
+    path = endpoint.split("?", 1)[0].strip("/")
+    return _ENDPOINT_ID_RE.sub(r"\1/:key", path)
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``GET /metrics`` from a daemon thread; enables collection."""
+
+    metrics = enable()
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802 - http.server naming
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            return
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="pbfigma-metrics", daemon=True).start()
+    return server
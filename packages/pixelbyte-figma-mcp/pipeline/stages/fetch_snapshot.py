@@ -26,8 +26,17 @@ async def run(
         "fetched_at": datetime.now(timezone.utc).isoformat(),
     }
 
+    # ``node`` is the only copy of the tree; ``raw`` keeps the response envelope
+    # (components, styles, ...) without repeating each requested document.
+    envelope = dict(raw)
+    envelope["nodes"] = {
+        key: {field: value for field, value in entry.items() if field != "document"}
+        for key, entry in nodes.items()
+        if isinstance(entry, dict)
+    }
+
     return {
         "meta": meta,
         "node": node,
-        "raw": raw,
+        "raw": envelope,
     }
@@ -2,12 +2,321 @@
 
 from __future__ import annotations
 
-import copy
+import hashlib
 import inspect
+import os
 import re
-from typing import Any, Callable, Dict
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
 
+from pipeline.metrics import span
 from pipeline.models import PipelineMode
+from pipeline.node_store import NodeStore
+
+_MEMO_NODE_TYPES = {"FRAME", "COMPONENT", "INSTANCE", "GROUP"}
+_MEMO_MAX_ENTRIES = 4096
+_ROOT_INDENT = 6
+# Smallest unit (in shipped nodes) worth a worker. Measured on react_generator
+# output: rendering costs ~24us per node, cutting and pickling a unit ~4us per node
+# plus ~100us per unit of IPC; 4-node units ran at half the serial speed and
+# break-even sat around 16 nodes, so 64 leaves a margin.
+_UNIT_MIN_NODES = 64
+
+
+class SubtreeJSXMemo(dict):
+    """Per-subtree JSX memo keyed by node-store Merkle hashes.
+
+    Only component-like subtrees below the root are memoized. Keys combine the
+    subtree hash, the parent's own hash (JSX offsets depend on the parent) and a
+    digest of the image-URL patch applied at materialization, so an entry is
+    reused only when its rendered input is identical.
+    """
+
+    def __init__(
+        self,
+        node_store: NodeStore,
+        image_urls: Optional[Dict[str, str]] = None,
+        entries: Optional[Dict[str, str]] = None,
+    ) -> None:
+        super().__init__(entries or {})
+        self._store = node_store
+        self._patch_digest = hashlib.sha256(
+            "".join(f"{ref}={url};" for ref, url in sorted((image_urls or {}).items())).encode("utf-8")
+        ).hexdigest()
+        self._touched: Dict[str, None] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def key(
+        self,
+        node: Dict[str, Any],
+        parent_node: Optional[Dict[str, Any]],
+        indent: int,
+        use_tailwind: bool,
+        hard_fidelity_profile: bool,
+    ) -> Optional[str]:
+        if parent_node is None or node.get("type") not in _MEMO_NODE_TYPES:
+            return None
+        node_id, parent_id = node.get("id"), parent_node.get("id")
+        if node_id not in self._store or parent_id not in self._store:
+            return None
+        own_parent = self._store.own_hash(parent_id)
+        return hashlib.sha256(
+            (
+                f"{self._store.subtree_hash(node_id)}:{own_parent}:{self._patch_digest}:"
+                f"{indent}:{int(use_tailwind)}:{int(hard_fidelity_profile)}"
+            ).encode("ascii")
+        ).hexdigest()
+
+    def get(self, key: str, default: Any = None) -> Any:  # type: ignore[override]
+        value = super().get(key, default)
+        if value is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._touched[key] = None
+        return value
+
+    def __setitem__(self, key: str, value: str) -> None:
+        super().__setitem__(key, value)
+        self._touched[key] = None
+        self.stored += 1
+
+    def entries(self) -> Dict[str, str]:
+        """Entries to persist: untouched older ones first, then this run's, capped."""
+        ordered = {key: value for key, value in self.items() if key not in self._touched}
+        ordered.update((key, self[key]) for key in self._touched)
+        keys = list(ordered)[-_MEMO_MAX_ENTRIES:]
+        return {key: ordered[key] for key in keys}
+
+
+class _UnitJSXMemo(dict):
+    """Worker-side memo for one component unit: precomputed keys plus child JSX."""
+
+    def __init__(self, keys_by_id: Dict[str, str], entries: Dict[str, str]) -> None:
+        super().__init__(entries)
+        self._keys_by_id = keys_by_id
+        self.produced: Dict[str, str] = {}
+
+    def key(self, node: Dict[str, Any], parent_node: Optional[Dict[str, Any]], *_: Any) -> Optional[str]:
+        return self._keys_by_id.get(node.get("id", ""))
+
+    def __setitem__(self, key: str, value: str) -> None:
+        super().__setitem__(key, value)
+        self.produced[key] = value
+
+
+def _render_unit(
+    render_subtree_fn: Callable[..., str],
+    unit: Tuple[Dict[str, Any], Dict[str, Any], int, bool, bool, Dict[str, str], Dict[str, str]],
+) -> Dict[str, str]:
+    """Render one component subtree; returns the memo entries it produced."""
+
+    subtree, parent_node, indent, use_tailwind, hard_fidelity_profile, keys_by_id, entries = unit
+    memo = _UnitJSXMemo(keys_by_id, entries)
+    render_subtree_fn(
+        subtree,
+        indent,
+        use_tailwind,
+        parent_node=parent_node,
+        hard_fidelity_profile=hard_fidelity_profile,
+        jsx_memo=memo,
+    )
+    return memo.produced
+
+
+class ComponentPool:
+    """Process pool for component units, started on first use and reused across runs.
+
+    A pool that breaks is discarded and the next run starts a fresh one.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 1:
+            return None
+        with self._lock:
+            if self._executor is None:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                except (OSError, ValueError):
+                    return None
+            return self._executor
+
+    def discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+def _unit_view(node: Dict[str, Any], stubbed: Collection[str]) -> Dict[str, Any]:
+    """Shallow view of a materialized subtree with ``stubbed`` descendants cut to stubs.
+
+    Only node dicts are rebuilt; property values are shared with the source, which
+    is fine because units are pickled before a worker renders them.
+    """
+
+    view = dict(node)
+    stack = [view]
+    while stack:
+        current = stack.pop()
+        if "children" not in current:
+            continue
+        children = []
+        for child in current["children"]:
+            if child.get("id") in stubbed:
+                children.append({"id": child["id"], "type": child.get("type")})
+            else:
+                child_view = dict(child)
+                children.append(child_view)
+                stack.append(child_view)
+        current["children"] = children
+    return view
+
+
+def schedule_component_units(
+    design_ir: Dict[str, Any],
+    component_graph: Dict[str, Any],
+    node_store: NodeStore,
+    root_node: Dict[str, Any],
+    jsx_memo: SubtreeJSXMemo,
+    render_subtree_fn: Callable[..., str],
+    use_tailwind: bool,
+    hard_fidelity_profile: bool,
+    pool: Optional[ComponentPool] = None,
+) -> Dict[str, int]:
+    """Render component subtrees bottom-up on ``pool`` so the root render only composes them.
+
+    Each non-root component in the DAG is a unit. Batches are visited in order
+    (leaves first) and a unit is sent to a worker once it would ship at least
+    ``_UNIT_MIN_NODES`` nodes; smaller units are rendered along with the unit
+    that encloses them, since per-unit dispatch costs more than rendering a few
+    nodes. Already-rendered units inside a unit are passed as memo entries and
+    stubbed out of its subtree. Units are cut from ``root_node``, the already
+    materialized root. Units already in ``jsx_memo`` are skipped, and whatever
+    is not dispatched (everything, without a multi-worker pool) is rendered by
+    the root render, which also takes over when the pool breaks mid-run.
+    Results land in ``jsx_memo``.
+    """
+
+    rows = {row["id"]: row for row in design_ir.get("nodes", [])}
+
+    unit_keys: Dict[str, str] = {}
+    levels: List[List[str]] = []
+    for batch in component_graph.get("batches", []):
+        level: List[str] = []
+        for component_id in batch.get("components", []):
+            row = rows.get(component_id)
+            node = node_store.get(component_id)
+            if row is None or node is None or not row.get("parent_id"):
+                continue
+            parent = node_store.get(row["parent_id"])
+            indent = _ROOT_INDENT + 2 * int(row.get("depth", 0))
+            key = jsx_memo.key(node, parent, indent, use_tailwind, hard_fidelity_profile)
+            if not key:
+                continue
+            unit_keys[component_id] = key
+            if key not in jsx_memo:
+                level.append(component_id)
+        levels.append(level)
+
+    pending = sum(len(level) for level in levels)
+    stats = {
+        "units": len(unit_keys),
+        "reused": len(unit_keys) - pending,
+        "rendered": pending,
+        "dispatched": 0,
+        "workers": 0,
+    }
+    if not pending or pool is None or pool.max_workers <= 1:
+        return stats
+
+    # Own node count of every unit (without the units nested in it) and its
+    # directly nested units, from one walk of the materialized root.
+    materialized: Dict[str, Dict[str, Any]] = {}
+    own_nodes: Dict[str, int] = {}
+    nested_units: Dict[str, List[str]] = {}
+    stack: List[Tuple[Dict[str, Any], Optional[str]]] = [(root_node, None)]
+    while stack:
+        node, owner = stack.pop()
+        node_id = node.get("id")
+        if node_id in unit_keys:
+            materialized[node_id] = node
+            if owner is not None:
+                nested_units.setdefault(owner, []).append(node_id)
+            owner = node_id
+        if owner is not None:
+            own_nodes[owner] = own_nodes.get(owner, 0) + 1
+        stack.extend((child, owner) for child in node.get("children", []))
+
+    def build_unit(component_id: str) -> Tuple[Any, ...]:
+        row = rows[component_id]
+        keys_by_id = {component_id: unit_keys[component_id]}
+        ready: List[str] = []
+        stack = list(materialized[component_id].get("children", []))
+        while stack:
+            child = stack.pop()
+            child_id = child.get("id")
+            if child_id in unit_keys:
+                keys_by_id[child_id] = unit_keys[child_id]
+                if unit_keys[child_id] in jsx_memo:
+                    ready.append(child_id)
+                    continue
+            stack.extend(child.get("children", []))
+        subtree = _unit_view(materialized[component_id], set(ready))
+        parent = node_store.get(row["parent_id"]) or {}
+        parent_own = {key: value for key, value in parent.items() if key != "children"}
+        entries = {unit_keys[child_id]: dict.__getitem__(jsx_memo, unit_keys[child_id]) for child_id in ready}
+        indent = _ROOT_INDENT + 2 * int(row.get("depth", 0))
+        return (subtree, parent_own, indent, use_tailwind, hard_fidelity_profile, keys_by_id, entries)
+
+    # Nodes a unit would ship: its own plus those of nested units not rendered yet.
+    shipped: Dict[str, int] = {}
+    executor: Optional[ProcessPoolExecutor] = None
+    for level in levels:
+        dispatch = []
+        for component_id in level:
+            shipped[component_id] = own_nodes.get(component_id, 0) + sum(
+                shipped.get(child_id, 0)
+                for child_id in nested_units.get(component_id, [])
+                if unit_keys[child_id] not in jsx_memo
+            )
+            if shipped[component_id] >= _UNIT_MIN_NODES and unit_keys[component_id] not in jsx_memo:
+                dispatch.append(component_id)
+        # One unit alone gains nothing from a worker; it is rendered with its parent.
+        if len(dispatch) < 2:
+            continue
+        if executor is None:
+            executor = pool.executor()
+            if executor is None:
+                break
+        units = [build_unit(component_id) for component_id in dispatch]
+        try:
+            chunksize = max(1, len(units) // (pool.max_workers * 4))
+            results = list(executor.map(_render_unit, [render_subtree_fn] * len(units), units, chunksize=chunksize))
+        except (OSError, RuntimeError, BrokenProcessPool):
+            pool.discard(executor)
+            break
+        stats["dispatched"] += len(units)
+        stats["workers"] = max(stats["workers"], min(pool.max_workers, len(units)))
+        for produced in results:
+            for key, value in produced.items():
+                jsx_memo[key] = value
+    return stats
 
 
 def _apply_responsive_pass(code: str) -> str:
@@ -55,18 +364,29 @@ def _quality_metrics(code: str) -> Dict[str, Any]:
 
 def run(
     design_ir: Dict[str, Any],
+    node_store: NodeStore,
     framework: str,
     mode: PipelineMode,
     run_label: str | None,
     generate_react_code_fn: Callable[[Dict[str, Any], str, bool], str],
     sanitize_component_name_fn: Callable[[str], str],
+    jsx_memo: Optional[SubtreeJSXMemo] = None,
+    component_graph: Optional[Dict[str, Any]] = None,
+    render_subtree_fn: Optional[Callable[..., str]] = None,
+    component_pool: Optional[ComponentPool] = None,
 ) -> Dict[str, Any]:
-    """Generate React/React-Tailwind code deterministically from IR."""
+    """Generate React/React-Tailwind code deterministically from IR.
+
+    With ``jsx_memo``, generators that accept it reuse JSX for unchanged subtrees.
+    With ``component_graph`` and ``render_subtree_fn`` as well, components are
+    first rendered as units per DAG batch on ``component_pool`` (see
+    ``schedule_component_units``).
+    """
 
     if framework not in {"react", "react_tailwind"}:
         raise ValueError(f"Unsupported framework for deterministic React stage: {framework}")
 
-    root_node = copy.deepcopy(design_ir["root_node"])
+    root_node = node_store.materialize(image_urls=design_ir.get("assets", {}).get("by_image_ref"))
     source_name = run_label or root_node.get("name", "Component")
     component_name = sanitize_component_name_fn(source_name)
 
@@ -76,28 +396,45 @@ def run(
         PipelineMode.STRICT_PIXEL_PLUS_RESPONSIVE,
     }
 
-    supports_hard_fidelity = False
     try:
-        supports_hard_fidelity = "hard_fidelity_profile" in inspect.signature(generate_react_code_fn).parameters
+        parameters = inspect.signature(generate_react_code_fn).parameters
     except (TypeError, ValueError):
-        supports_hard_fidelity = False
-
-    if supports_hard_fidelity:
-        code = generate_react_code_fn(
-            root_node,
-            component_name,
-            use_tailwind,
-            hard_fidelity_profile=hard_fidelity_profile,
-        )
-    else:
-        code = generate_react_code_fn(root_node, component_name, use_tailwind)
+        parameters = {}
+
+    options: Dict[str, Any] = {}
+    if "hard_fidelity_profile" in parameters:
+        options["hard_fidelity_profile"] = hard_fidelity_profile
+    schedule: Optional[Dict[str, int]] = None
+    if jsx_memo is not None and "jsx_memo" in parameters:
+        options["jsx_memo"] = jsx_memo
+        if component_graph is not None and render_subtree_fn is not None:
+            with span("schedule_component_units", "codegen") as schedule_span:
+                schedule = schedule_component_units(
+                    design_ir,
+                    component_graph,
+                    node_store,
+                    root_node,
+                    jsx_memo,
+                    render_subtree_fn,
+                    use_tailwind,
+                    hard_fidelity_profile,
+                    pool=component_pool,
+                )
+                if schedule_span is not None:
+                    schedule_span.args.update(schedule)
+
+    with span("render_root", "codegen"):
+        code = generate_react_code_fn(root_node, component_name, use_tailwind, **options)
 
     if mode == PipelineMode.STRICT_PIXEL_PLUS_RESPONSIVE:
         code = _apply_responsive_pass(code)
 
-    return {
+    result = {
         "component_name": component_name,
         "framework": framework,
         "code": code,
         "quality_metrics": _quality_metrics(code),
     }
+    if schedule is not None:
+        result["schedule"] = schedule
+    return result
@@ -4,22 +4,24 @@ from __future__ import annotations
 
 import hashlib
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 import httpx
 
+from generators.base import walk_nodes
+from pipeline.metrics import record_io, span
+from pipeline.node_store import NodeStore
 
-def _collect_image_refs(node: Dict[str, Any], refs: Set[str], ref_to_node: Dict[str, str]) -> None:
-    node_id = node.get("id", "")
-    for fill in node.get("fills", []):
-        if fill.get("type") == "IMAGE" and fill.get("visible", True):
-            image_ref = fill.get("imageRef")
-            if image_ref:
-                refs.add(image_ref)
-                ref_to_node.setdefault(image_ref, node_id)
 
-    for child in node.get("children", []):
-        _collect_image_refs(child, refs, ref_to_node)
+def _collect_image_refs(root_node: Dict[str, Any], refs: Set[str], ref_to_node: Dict[str, str]) -> None:
+    # Hidden subtrees are never rendered, so their images are not fetched.
+    for node, _, _, _ in walk_nodes(root_node, skip_invisible=True):
+        for fill in node.get("fills", []):
+            if fill.get("type") == "IMAGE" and fill.get("visible", True):
+                image_ref = fill.get("imageRef")
+                if image_ref:
+                    refs.add(image_ref)
+                    ref_to_node.setdefault(image_ref, node.get("id", ""))
 
 
 def _mime_to_ext(mime_type: str) -> str:
@@ -34,77 +36,68 @@ def _mime_to_ext(mime_type: str) -> str:
     return mapping.get(mime_type.lower(), "bin")
 
 
-def _patch_node_image_urls(node: Dict[str, Any], ref_to_logical_path: Dict[str, str]) -> None:
-    for fill in node.get("fills", []):
-        if fill.get("type") == "IMAGE" and fill.get("visible", True):
-            image_ref = fill.get("imageRef")
-            if image_ref and image_ref in ref_to_logical_path:
-                fill["imageUrl"] = ref_to_logical_path[image_ref]
-
-    for child in node.get("children", []):
-        _patch_node_image_urls(child, ref_to_logical_path)
-
-
 async def run(
-    design_ir: Dict[str, Any],
+    node_store: NodeStore,
     file_key: str,
     resolve_image_urls_fn: Callable[[str, List[str]], Awaitable[Dict[str, str]]],
     assets_root: Path,
+    known_assets: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
-    """Resolve image refs and materialize local assets."""
+    """Resolve image refs and materialize local assets.
+
+    The tree itself is not copied or patched here: ``by_image_ref`` is the patch
+    consumers apply through ``NodeStore.materialize``. ``known_assets`` maps
+    image refs to manifest rows from earlier runs; Figma image refs are content
+    hashes, so a row whose local file still exists is reused without resolving
+    or downloading it again. ``url_to_logical_path`` covers refs resolved in
+    this run only.
+    """
 
-    root_node = design_ir["root_node"]
     refs: Set[str] = set()
     ref_to_node: Dict[str, str] = {}
-    _collect_image_refs(root_node, refs, ref_to_node)
-
-    if not refs:
-        design_ir["assets"] = {
-            "manifest": [],
-            "by_image_ref": {},
-            "download_errors": [],
-        }
-        return {
-            "design_ir": design_ir,
-            "manifest": [],
-            "by_image_ref": {},
-            "download_errors": [],
-            "url_to_logical_path": {},
-        }
-
-    assets_root.mkdir(parents=True, exist_ok=True)
-    image_url_map = await resolve_image_urls_fn(file_key, sorted(refs))
-
-    manifest: List[Dict[str, Any]] = []
-    by_image_ref: Dict[str, str] = {}
+    _collect_image_refs(node_store.root_node, refs, ref_to_node)
+
+    rows_by_ref: Dict[str, Dict[str, Any]] = {}
+    for image_ref in refs:
+        known = (known_assets or {}).get(image_ref)
+        if known and known.get("local_path") and Path(known["local_path"]).exists():
+            rows_by_ref[image_ref] = {**known, "source_node_id": ref_to_node.get(image_ref, "")}
+    pending = sorted(refs - set(rows_by_ref))
+
     url_to_logical_path: Dict[str, str] = {}
     download_errors: List[str] = []
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        for image_ref in sorted(refs):
-            image_url = image_url_map.get(image_ref)
-            if not image_url:
-                download_errors.append(f"Missing URL for imageRef '{image_ref}'.")
-                continue
-
-            try:
-                response = await client.get(image_url)
-                response.raise_for_status()
-                content = response.content
-                digest = hashlib.sha256(content).hexdigest()
-                mime = response.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
-                ext = _mime_to_ext(mime)
-                filename = f"{digest[:16]}.{ext}"
-                local_path = assets_root / filename
-                if not local_path.exists():
-                    local_path.write_bytes(content)
-
-                logical_path = f"/assets/figma/{filename}"
-                by_image_ref[image_ref] = logical_path
-                url_to_logical_path[image_url] = logical_path
-
-                manifest.append(
-                    {
+    if pending:
+        assets_root.mkdir(parents=True, exist_ok=True)
+        with span("resolve_image_urls", "http", refs=len(pending)):
+            image_url_map = await resolve_image_urls_fn(file_key, pending)
+
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            for image_ref in pending:
+                image_url = image_url_map.get(image_ref)
+                if not image_url:
+                    download_errors.append(f"Missing URL for imageRef '{image_ref}'.")
+                    continue
+
+                try:
+                    with span("download_asset", "http", image_ref=image_ref):
+                        response = await client.get(image_url)
+                        response.raise_for_status()
+                        content = response.content
+                        record_io(read=len(content))
+                        digest = hashlib.sha256(content).hexdigest()
+                        mime = response.headers.get("content-type", "application/octet-stream").split(";")[0].strip()
+                        ext = _mime_to_ext(mime)
+                        filename = f"{digest[:16]}.{ext}"
+                        local_path = assets_root / filename
+                        if not local_path.exists():
+                            local_path.write_bytes(content)
+                            record_io(written=len(content))
+
+                    logical_path = f"/assets/figma/{filename}"
+                    url_to_logical_path[image_url] = logical_path
+
+                    rows_by_ref[image_ref] = {
                         "asset_id": digest[:16],
                         "source_node_id": ref_to_node.get(image_ref, ""),
                         "image_ref": image_ref,
@@ -113,22 +106,13 @@ async def run(
                         "hash": digest,
                         "mime": mime,
                     }
-                )
-            except Exception as exc:  # noqa: BLE001
-                download_errors.append(f"Failed to materialize imageRef '{image_ref}': {type(exc).__name__}: {exc}")
-
-    _patch_node_image_urls(root_node, by_image_ref)
-    design_ir["root_node"] = root_node
-    design_ir["assets"] = {
-        "manifest": manifest,
-        "by_image_ref": by_image_ref,
-        "download_errors": download_errors,
-    }
+                except Exception as exc:  # noqa: BLE001
+                    download_errors.append(f"Failed to materialize imageRef '{image_ref}': {type(exc).__name__}: {exc}")
 
+    manifest = [rows_by_ref[image_ref] for image_ref in sorted(rows_by_ref)]
     return {
-        "design_ir": design_ir,
         "manifest": manifest,
-        "by_image_ref": by_image_ref,
+        "by_image_ref": {row["image_ref"]: row["logical_path"] for row in manifest},
         "download_errors": download_errors,
         "url_to_logical_path": url_to_logical_path,
     }
@@ -4,41 +4,34 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional, Tuple
 
+from generators.base import walk_nodes
+from pipeline.node_store import NodeStore
+
 
 def _collect_nodes(
-    node: Dict[str, Any],
-    parent_id: Optional[str],
-    depth: int,
-    child_index: int,
+    root_node: Dict[str, Any],
     ordering: List[str],
     flattened: List[Dict[str, Any]],
 ) -> None:
-    node_id = node.get("id", "")
-    children = node.get("children", [])
-    child_ids = [child.get("id", "") for child in children]
-
-    flattened.append(
-        {
-            "id": node_id,
-            "name": node.get("name", ""),
-            "type": node.get("type", ""),
-            "parent_id": parent_id,
-            "depth": depth,
-            "child_index": child_index,
-            "child_ids": child_ids,
-            "children_count": len(children),
-            "layout_mode": node.get("layoutMode"),
-            "absolute_bounding_box": node.get("absoluteBoundingBox", {}),
-            "fills": node.get("fills", []),
-            "strokes": node.get("strokes", []),
-            "effects": node.get("effects", []),
-            "visible": node.get("visible", True),
-        }
-    )
-    ordering.append(node_id)
-
-    for idx, child in enumerate(children):
-        _collect_nodes(child, node_id, depth + 1, idx, ordering, flattened)
+    for node, parent, depth, child_index in walk_nodes(root_node):
+        node_id = node.get("id", "")
+        children = node.get("children", [])
+        flattened.append(
+            {
+                "id": node_id,
+                "name": node.get("name", ""),
+                "type": node.get("type", ""),
+                "parent_id": parent.get("id", "") if parent is not None else None,
+                "depth": depth,
+                "child_index": child_index,
+                "child_ids": [child.get("id", "") for child in children],
+                "children_count": len(children),
+                "layout_mode": node.get("layoutMode"),
+                "absolute_bounding_box": node.get("absoluteBoundingBox", {}),
+                "visible": node.get("visible", True),
+            }
+        )
+        ordering.append(node_id)
 
 
 def _layout_summary(root_node: Dict[str, Any]) -> Dict[str, Any]:
@@ -57,13 +50,27 @@ def _layout_summary(root_node: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def run(snapshot: Dict[str, Any], tokens: Dict[str, Any]) -> Dict[str, Any]:
-    """Normalize raw snapshot into a deterministic intermediate representation."""
+def run(
+    snapshot: Dict[str, Any],
+    tokens: Dict[str, Any],
+    node_store: Optional[NodeStore] = None,
+) -> Dict[str, Any]:
+    """Normalize raw snapshot into a deterministic intermediate representation.
+
+    The IR indexes nodes by id and references the snapshot tree through
+    ``node_store`` rather than embedding it; paints and geometry stay in the
+    snapshot and are reached via ``NodeStore``. Every node carries its Merkle
+    ``subtree_hash`` so later stages can reuse work for unchanged branches.
+    """
 
     root_node = snapshot["node"]
+    store = node_store or NodeStore(root_node)
     ordering: List[str] = []
     flattened: List[Dict[str, Any]] = []
-    _collect_nodes(root_node, parent_id=None, depth=0, child_index=0, ordering=ordering, flattened=flattened)
+    _collect_nodes(root_node, ordering, flattened)
+    for row in flattened:
+        if row["id"] in store:
+            row["subtree_hash"] = store.subtree_hash(row["id"])
 
     styles = {
         "colors": tokens.get("colors", []),
@@ -86,6 +93,11 @@ def run(snapshot: Dict[str, Any], tokens: Dict[str, Any]) -> Dict[str, Any]:
             "download_errors": [],
         },
         "ordering": ordering,
-        "root_node": root_node,
+        "node_store": {
+            "source": "snapshot.node",
+            "root_id": root_node.get("id", ""),
+            "root_hash": store.subtree_hash(),
+            "node_count": len(ordering),
+        },
     }
     return ir
@@ -2,11 +2,33 @@
 
 from __future__ import annotations
 
+import math
+import os
+import threading
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from pipeline.models import GateResult, GateStatus
 
+# Largest global shift (in pixels, per axis) searched before scoring.
+_ALIGN_MAX_SHIFT = 2
+# Above this many pixels, screenshots are normalized and diffed in horizontal bands
+# instead of materializing full-size composited copies.
+_STREAMING_MIN_PIXELS = 4_000_000
+_DIFF_BAND_ROWS = 256
+# Diff-map evidence: "async" writes in a background thread, "sync" inline, "off" skips it.
+EVIDENCE_MODES = {"async", "sync", "off"}
+_PALETTE_LEVELS = 16
+
+_evidence_lock = threading.Lock()
+_evidence_writer: Optional[ThreadPoolExecutor] = None
+# Queued diff-map writes by evidence path.
+_pending_evidence: Dict[str, Future] = {}
+
 
 def _status_from_score(score: float, pass_threshold: float, warn_threshold: float) -> GateStatus:
     if score >= pass_threshold:
@@ -54,34 +76,235 @@ def _normalize_image_for_diff(image):
     return composited.convert("RGB")
 
 
+class _DiffSource:
+    """White-composited RGB view of a decoded screenshot at a target size.
+
+    Small screenshots are normalized once. Large ones are normalized (and, when
+    needed, LANCZOS-resized through ``resize(box=...)``) one band at a time, so
+    only the decoded source stays resident. The composite is per-pixel, so
+    same-size bands match a full pass exactly; resampled bands can differ from
+    a whole-image resize by one level on isolated pixels (fixed-point filter
+    rounding at fractional band offsets), which does not move the rounded score.
+    """
+
+    def __init__(self, image, size: Tuple[int, int], streaming: bool) -> None:
+        from PIL import Image
+
+        self._image = image
+        self._resampling = getattr(getattr(Image, "Resampling", Image), "LANCZOS")
+        self.size = size
+        self._full = None
+        if not streaming:
+            full = _normalize_image_for_diff(image)
+            if full.size != size:
+                full = full.resize(size, resample=self._resampling)
+            self._full = full
+
+    def band(self, box: Tuple[int, int, int, int]):
+        if self._full is not None:
+            return self._full.crop(box)
+        if self._image.size == self.size:
+            return _normalize_image_for_diff(self._image.crop(box))
+
+        x0, y0, x1, y1 = box
+        source_width, source_height = self._image.size
+        scale_x = source_width / self.size[0]
+        scale_y = source_height / self.size[1]
+        source_box = (x0 * scale_x, y0 * scale_y, x1 * scale_x, y1 * scale_y)
+        # Cover the LANCZOS support (3 source pixels per output pixel) around the band.
+        margin = math.ceil(3 * max(1.0, scale_x, scale_y)) + 2
+        region_box = (
+            max(0, math.floor(source_box[0]) - margin),
+            max(0, math.floor(source_box[1]) - margin),
+            min(source_width, math.ceil(source_box[2]) + margin),
+            min(source_height, math.ceil(source_box[3]) + margin),
+        )
+        region = _normalize_image_for_diff(self._image.crop(region_box))
+        return region.resize(
+            (x1 - x0, y1 - y0),
+            resample=self._resampling,
+            box=(
+                source_box[0] - region_box[0],
+                source_box[1] - region_box[1],
+                source_box[2] - region_box[0],
+                source_box[3] - region_box[1],
+            ),
+        )
+
+
+def _overlap_boxes(size: Tuple[int, int], dx: int, dy: int) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]:
+    """Crop boxes pairing pixel (x, y) of image A with (x + dx, y + dy) of image B."""
+    width, height = size
+    box_a = (max(0, -dx), max(0, -dy), width - max(0, dx), height - max(0, dy))
+    box_b = (max(0, dx), max(0, dy), width - max(0, -dx), height - max(0, -dy))
+    return box_a, box_b
+
+
+def _projection_profiles(source: _DiffSource, size: Tuple[int, int], band_rows: int) -> Tuple[List[float], List[float]]:
+    """Mean luminance per column and per row of the ``size`` region, accumulated band by band."""
+    from PIL import Image
+
+    box = getattr(getattr(Image, "Resampling", Image), "BOX")
+    width, height = size
+    column_sums = [0.0] * width
+    rows: List[float] = []
+    for top in range(0, height, band_rows):
+        bottom = min(height, top + band_rows)
+        as_float = source.band((0, top, width, bottom)).convert("L").convert("F")
+        band_columns = array("f", as_float.resize((width, 1), resample=box).tobytes())
+        weight = bottom - top
+        column_sums = [total + value * weight for total, value in zip(column_sums, band_columns)]
+        rows.extend(array("f", as_float.resize((1, bottom - top), resample=box).tobytes()))
+    return [total / height for total in column_sums], rows
+
+
+def _best_profile_shift(profile_a: List[float], profile_b: List[float], max_shift: int) -> int:
+    """Shift ``s`` minimizing mean |a[i] - b[i + s]| over the overlapping span."""
+    length = len(profile_a)
+    best_shift = 0
+    best_delta: Optional[float] = None
+    for shift in sorted(range(-max_shift, max_shift + 1), key=abs):
+        lo = max(0, -shift)
+        hi = length - max(0, shift)
+        if hi - lo <= 0:
+            continue
+        delta = sum(abs(profile_a[i] - profile_b[i + shift]) for i in range(lo, hi)) / (hi - lo)
+        if best_delta is None or delta < best_delta:
+            best_shift, best_delta = shift, delta
+    return best_shift
+
+
+def _aligned_diff_bands(img_a, img_b, max_shift: int = _ALIGN_MAX_SHIFT) -> Tuple[Tuple[int, int], Iterator[Tuple[int, Any]]]:
+    """Align two screenshots and return the compared size plus (row offset, RGB diff band) pairs.
+
+    Small size mismatches (up to ``max_shift`` pixels per axis) are cropped to
+    the common size instead of resampled; larger mismatches (e.g. a 2x Figma
+    export against a 1x render) still fall back to LANCZOS resizing. A bounded
+    translation search over row/column luminance profiles then finds the global
+    shift, and only the overlapping region is compared. Screenshots above
+    ``_STREAMING_MIN_PIXELS`` are processed in ``_DIFF_BAND_ROWS``-row bands.
+    """
+    from PIL import ImageChops
+
+    streaming = max(img_a.width * img_a.height, img_b.width * img_b.height) > _STREAMING_MIN_PIXELS
+    width_gap = abs(img_a.width - img_b.width)
+    height_gap = abs(img_a.height - img_b.height)
+    if width_gap <= max_shift and height_gap <= max_shift:
+        source_b = _DiffSource(img_b, img_b.size, streaming)
+        common = (min(img_a.width, img_b.width), min(img_a.height, img_b.height))
+    else:
+        source_b = _DiffSource(img_b, img_a.size, streaming)
+        common = img_a.size
+    source_a = _DiffSource(img_a, img_a.size, streaming)
+    band_rows = _DIFF_BAND_ROWS if streaming else max(1, common[1])
+
+    dx = dy = 0
+    if max_shift > 0 and min(common) > 2 * max_shift:
+        # Separable search: a global translation shows up as a shift of the row and
+        # column luminance profiles, so each axis is a cheap 1-D search.
+        columns_a, rows_a = _projection_profiles(source_a, common, band_rows)
+        columns_b, rows_b = _projection_profiles(source_b, common, band_rows)
+        dx = _best_profile_shift(columns_a, columns_b, max_shift)
+        dy = _best_profile_shift(rows_a, rows_b, max_shift)
+
+    box_a, box_b = _overlap_boxes(common, dx, dy)
+    size = (box_a[2] - box_a[0], box_a[3] - box_a[1])
+
+    def _bands() -> Iterator[Tuple[int, Any]]:
+        for top in range(0, size[1], band_rows):
+            bottom = min(size[1], top + band_rows)
+            band_a = source_a.band((box_a[0], box_a[1] + top, box_a[2], box_a[1] + bottom))
+            band_b = source_b.band((box_b[0], box_b[1] + top, box_b[2], box_b[1] + bottom))
+            yield top, ImageChops.difference(band_a, band_b)
+
+    return size, _bands()
+
+
 def _pixel_similarity(path_a: Path, path_b: Path) -> float:
     try:
-        from PIL import Image, ImageChops, ImageStat
+        from PIL import Image, ImageStat
     except ImportError:
         return _byte_similarity_fallback(path_a, path_b)
 
     try:
         with Image.open(path_a) as img_a, Image.open(path_b) as img_b:
-            img_a_rgb = _normalize_image_for_diff(img_a)
-            img_b_rgb = _normalize_image_for_diff(img_b)
-
-            if img_a_rgb.size != img_b_rgb.size:
-                resampling = getattr(getattr(Image, "Resampling", Image), "LANCZOS")
-                img_b_rgb = img_b_rgb.resize(img_a_rgb.size, resample=resampling)
-
-            diff = ImageChops.difference(img_a_rgb, img_b_rgb)
-            stat = ImageStat.Stat(diff)
-            mean_delta = sum(stat.mean) / len(stat.mean) if stat.mean else 255.0
+            size, bands = _aligned_diff_bands(img_a, img_b)
+            channel_sums: List[float] = []
+            for _top, diff in bands:
+                band_sums = ImageStat.Stat(diff).sum
+                channel_sums = [a + b for a, b in zip(channel_sums, band_sums)] if channel_sums else list(band_sums)
+
+            pixel_count = size[0] * size[1]
+            if channel_sums and pixel_count:
+                mean_delta = sum(channel_sums) / (len(channel_sums) * pixel_count)
+            else:
+                mean_delta = 255.0
             similarity = max(0.0, 100.0 - ((mean_delta / 255.0) * 100.0))
             return round(similarity, 2)
     except Exception:  # noqa: BLE001
         return _byte_similarity_fallback(path_a, path_b)
 
 
-def _vision_explanation(path_a: Path, path_b: Path) -> dict:
+def _write_diff_evidence(gray, diff_path: Path, max_dimension: int, palette: bool) -> None:
+    """Autocontrast, optionally shrink/posterize, and save a grayscale diff map."""
+    from PIL import Image, ImageOps
+
+    diff_map = ImageOps.autocontrast(gray)
+    if max_dimension > 0 and max(diff_map.size) > max_dimension:
+        diff_map.thumbnail((max_dimension, max_dimension), resample=getattr(getattr(Image, "Resampling", Image), "BOX"))
+    if palette:
+        diff_map = diff_map.quantize(colors=_PALETTE_LEVELS)
+        diff_map.save(diff_path, bits=4)
+    else:
+        diff_map.save(diff_path)
+
+
+def _submit_evidence_write(gray, diff_path: Path, max_dimension: int, palette: bool) -> None:
+    global _evidence_writer
+    with _evidence_lock:
+        if _evidence_writer is None:
+            _evidence_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pb_figma_evidence")
+        _pending_evidence[str(diff_path)] = _evidence_writer.submit(
+            _write_diff_evidence, gray, diff_path, max_dimension, palette
+        )
+
+
+def flush_evidence_writes(paths: Optional[Iterable[str]] = None, timeout: Optional[float] = None) -> Set[str]:
+    """Block until diff-map evidence queued by ``evidence_mode="async"`` is on disk.
+
+    Waits for the given evidence paths, or for every queued write. Returns
+    the paths whose write failed or did not finish within ``timeout``, so
+    callers can drop them instead of reporting files that do not exist.
+    """
+    with _evidence_lock:
+        if paths is None:
+            pending = dict(_pending_evidence)
+        else:
+            pending = {path: _pending_evidence[path] for path in paths if path in _pending_evidence}
+    if not pending:
+        return set()
+    wait(pending.values(), timeout=timeout)
+
+    failed: Set[str] = set()
+    with _evidence_lock:
+        for path, future in pending.items():
+            if not future.done() or future.exception() is not None:
+                failed.add(path)
+            if future.done() and _pending_evidence.get(path) is future:
+                del _pending_evidence[path]
+    return failed
+
+
+def _vision_explanation(
+    path_a: Path,
+    path_b: Path,
+    evidence_mode: str = "sync",
+    evidence_max_dimension: int = 0,
+    evidence_palette: bool = False,
+) -> dict:
     """Produce deterministic visual-diff explanations and optional evidence paths."""
     try:
-        from PIL import Image, ImageChops, ImageOps
+        from PIL import Image
     except ImportError:
         return {
             "issues": ["Vision explanation unavailable: Pillow is not installed."],
@@ -90,15 +313,11 @@ def _vision_explanation(path_a: Path, path_b: Path) -> dict:
 
     try:
         with Image.open(path_a) as img_a, Image.open(path_b) as img_b:
-            img_a_rgb = _normalize_image_for_diff(img_a)
-            img_b_rgb = _normalize_image_for_diff(img_b)
-
-            if img_a_rgb.size != img_b_rgb.size:
-                resampling = getattr(getattr(Image, "Resampling", Image), "LANCZOS")
-                img_b_rgb = img_b_rgb.resize(img_a_rgb.size, resample=resampling)
+            size, bands = _aligned_diff_bands(img_a, img_b)
+            gray = Image.new("L", size)
+            for top, diff in bands:
+                gray.paste(diff.convert("L"), (0, top))
 
-            diff = ImageChops.difference(img_a_rgb, img_b_rgb)
-            gray = diff.convert("L")
             bbox = gray.getbbox()
             width, height = gray.size
             total_pixels = max(1, width * height)
@@ -123,13 +342,18 @@ def _vision_explanation(path_a: Path, path_b: Path) -> dict:
                 issues.append(f"Primary diff region: x={x0}-{x1}, y={y0}-{y1}.")
 
             evidence_paths: List[str] = []
-            try:
-                diff_map = ImageOps.autocontrast(gray)
-                diff_path = path_b.with_name(path_b.stem + ".diff.png")
-                diff_map.save(diff_path)
+            diff_path = path_b.with_name(path_b.stem + ".diff.png")
+            if evidence_mode == "async":
+                # The verdict does not depend on the diff map; its path is reported now
+                # and the PNG lands once the background writer gets to it.
+                _submit_evidence_write(gray, diff_path, evidence_max_dimension, evidence_palette)
                 evidence_paths.append(str(diff_path))
-            except Exception:  # noqa: BLE001
-                pass
+            elif evidence_mode == "sync":
+                try:
+                    _write_diff_evidence(gray, diff_path, evidence_max_dimension, evidence_palette)
+                    evidence_paths.append(str(diff_path))
+                except Exception:  # noqa: BLE001
+                    pass
 
             return {"issues": issues, "evidence_paths": evidence_paths}
     except Exception as exc:  # noqa: BLE001
@@ -145,6 +369,9 @@ def run(
     pass_threshold: float,
     warn_threshold: float,
     visual_mode: str,
+    evidence_mode: str = "async",
+    evidence_max_dimension: int = 0,
+    evidence_palette: bool = False,
 ) -> GateResult:
     """Run visual validation gate."""
 
@@ -199,7 +426,13 @@ def run(
     status = _status_from_score(score, pass_threshold, warn_threshold)
 
     if status != GateStatus.PASS and visual_mode.lower() == "hybrid":
-        vision = _vision_explanation(figma_path, impl_path)
+        vision = _vision_explanation(
+            figma_path,
+            impl_path,
+            evidence_mode=evidence_mode if evidence_mode in EVIDENCE_MODES else "async",
+            evidence_max_dimension=evidence_max_dimension,
+            evidence_palette=evidence_palette,
+        )
         issues.extend(vision.get("issues", []))
         evidence_paths.extend(vision.get("evidence_paths", []))
 
@@ -211,3 +444,45 @@ def run(
         evidence_paths=evidence_paths,
         issues=issues,
     )
+
+
+def run_batch(
+    pairs: Sequence[Tuple[Optional[str], Optional[str]]],
+    pass_threshold: float,
+    warn_threshold: float,
+    visual_mode: str,
+    max_workers: Optional[int] = None,
+    evidence_mode: str = "async",
+    evidence_max_dimension: int = 0,
+    evidence_palette: bool = False,
+) -> List[GateResult]:
+    """Run the visual gate for many (figma, implementation) pairs across a process pool.
+
+    Only screenshot paths cross the process boundary; each worker decodes its own
+    images. Results are returned in input order. Falls back to serial evaluation
+    for a single pair or when a process pool cannot be started. Pool workers write
+    evidence inline because pending background writes would not survive them.
+    """
+
+    gate = partial(
+        run,
+        pass_threshold=pass_threshold,
+        warn_threshold=warn_threshold,
+        visual_mode=visual_mode,
+        evidence_mode=evidence_mode,
+        evidence_max_dimension=evidence_max_dimension,
+        evidence_palette=evidence_palette,
+    )
+    figma_paths = [pair[0] for pair in pairs]
+    implementation_paths = [pair[1] for pair in pairs]
+
+    workers = min(max_workers or os.cpu_count() or 1, len(pairs))
+    if workers <= 1:
+        return [gate(figma, impl) for figma, impl in zip(figma_paths, implementation_paths)]
+
+    pool_gate = partial(gate, evidence_mode="sync") if evidence_mode == "async" else gate
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(pool_gate, figma_paths, implementation_paths))
+    except (OSError, BrokenProcessPool):
+        return [gate(figma, impl) for figma, impl in zip(figma_paths, implementation_paths)]
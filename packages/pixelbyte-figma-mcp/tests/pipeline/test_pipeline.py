@@ -4,15 +4,22 @@ from __future__ import annotations
 
 import json
 import asyncio
+import threading
 from pathlib import Path
 from typing import Any, Dict
 
 import httpx
 
+from pipeline import document_index, service_metrics
+from pipeline import runner as runner_module
 from pipeline.cache import StageCache
+from pipeline.document_index import DocumentCache, DocumentIndex
+from pipeline.metrics import StageMetrics, record_io, span
 from pipeline.models import GateStatus, PipelineMode, PipelineRunRequest, PipelineStatus
+from pipeline.node_store import NodeStore
+from pipeline.screenshot_index import ScreenshotIndex
 from pipeline.runner import PipelineConfig, PipelineDependencies, PipelineRunner
-from pipeline.stages import materialize_assets, normalize_ir, static_gates, visual_gates
+from pipeline.stages import build_component_dag, generate_react, materialize_assets, normalize_ir, static_gates, visual_gates
 
 
 def _sample_root_node() -> Dict[str, Any]:
@@ -89,6 +96,107 @@ def test_stage_cache_roundtrip(tmp_path: Path):
     assert cache.load(key) == payload
 
 
+def test_stage_cache_memory_tier_counts_and_evicts(tmp_path: Path):
+    cache = StageCache(tmp_path / "cache", memory_bytes=200)
+    small_key = cache.build_stage_key("base", "small", {})
+    large_key = cache.build_stage_key("base", "large", {})
+
+    cache.save(small_key, {"value": 1}, "small")
+    cache._stage_file(small_key).unlink()
+    assert cache.load(small_key, "small") == {"value": 1}
+
+    cache.save(large_key, {"blob": "x" * 300}, "large")
+    assert cache.load(large_key, "large") == {"blob": "x" * 300}
+
+    stats = cache.stats()["stages"]
+    assert stats["small"]["memory_hits"] == 1
+    assert stats["large"]["disk_hits"] == 1
+    assert stats["large"]["bytes_read"] > 0
+    assert cache.stats()["memory_bytes"] <= 200
+
+
+def test_stage_cache_drops_corrupt_entries_and_prunes(tmp_path: Path):
+    import os
+    import time
+
+    cache = StageCache(tmp_path / "cache", memory_bytes=0)
+    keys = [cache.build_stage_key("base", f"stage-{idx}", {}) for idx in range(3)]
+    for key in keys:
+        cache.save(key, {"payload": key * 20})
+
+    cache._stage_file(keys[0]).write_bytes(b"truncated")
+    assert cache.load(keys[0], "stage-0") is None
+    assert cache.stats()["stages"]["stage-0"]["corrupt"] == 1
+    assert not cache._stage_file(keys[0]).exists()
+
+    stale = time.time() - 3600
+    os.utime(cache._stage_file(keys[1]), (stale, stale))
+    summary = cache.prune(max_bytes=None, max_age_seconds=60)
+    assert summary["removed_entries"] == 1
+    assert cache.load(keys[1]) is None
+    assert cache.load(keys[2]) == {"payload": keys[2] * 20}
+    assert cache.disk_stats()["entries"] == 1
+
+    assert cache.prune(max_bytes=0, max_age_seconds=None)["remaining_entries"] == 0
+
+
+def test_pipeline_cache_tool_treats_zero_limits_as_disabled(tmp_path: Path, monkeypatch):
+    import figma_mcp
+
+    cache = StageCache(tmp_path / "cache", memory_bytes=0)
+    key = cache.build_stage_key("base", "stage", {})
+    cache.save(key, {"payload": "kept"})
+    monkeypatch.setattr(figma_mcp, "PIPELINE_V2_DEFAULT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("FIGMA_PIPELINE_CACHE_MAX_MB", "0")
+
+    params = figma_mcp.FigmaPipelineCacheInput(action="prune", max_age_hours=0)
+    summary = json.loads(figma_mcp._strip_version_footer(asyncio.run(figma_mcp.figma_pipeline_cache(params=params))))
+    assert summary["status"] == "success" and summary["removed_entries"] == 0
+    assert cache.load(key) == {"payload": "kept"}
+
+
+def test_stage_cache_checked_entries_and_legacy_json(tmp_path: Path):
+    import gzip
+    import marshal
+
+    from pipeline import cache as cache_module
+
+    cache = StageCache(tmp_path / "cache", memory_bytes=0)
+    key, legacy_key, other_key = (cache.build_stage_key("base", name, {}) for name in ("binary", "legacy", "other"))
+    payload = {"node": {"id": "1:2", "fillGeometry": [{"path": "M0 0 L1 1"}], "opacity": 0.5, "visible": True}}
+
+    cache.save(key, payload)
+    assert cache._stage_file(key).read_bytes().startswith(b"PBC3")
+    assert cache.load(key) == payload
+
+    # Entries of the previous gzip JSON format are still read.
+    json_body = gzip.compress(json.dumps(payload).encode("utf-8"))
+    cache._stage_file(legacy_key).write_bytes(b"PBC2" + cache_module._entry_digest(legacy_key, json_body) + json_body)
+    assert cache.load(legacy_key) == payload
+
+    legacy_path = cache.root_dir / f"{legacy_key}.json.gz"
+    legacy_path.write_bytes(gzip.compress(json.dumps(payload).encode("utf-8")))
+    assert cache.load(legacy_key) == payload
+    cache.save(legacy_key, payload)
+    assert not legacy_path.exists()
+
+    # An intact entry copied under another key fails the digest.
+    cache._stage_file(other_key).write_bytes(cache._stage_file(key).read_bytes())
+    assert cache.load(other_key, "other") is None
+    assert not cache._stage_file(other_key).exists()
+
+    entry = bytearray(cache._stage_file(key).read_bytes())
+    entry[-5] ^= 0xFF
+    cache._stage_file(key).write_bytes(bytes(entry))
+    assert cache.load(key, "binary") is None
+    assert cache.stats()["stages"]["binary"]["corrupt"] == 1
+
+    # Entries in the earlier marshal format are discarded without being decoded.
+    cache._stage_file(key).write_bytes(b"PBC1M" + bytes([3, 11]) + marshal.dumps(payload))
+    assert cache.load(key, "binary") is None
+    assert not cache._stage_file(key).exists()
+
+
 def test_normalize_ir_preserves_child_order():
     snapshot = {
         "meta": {"file_key": "file123456", "node_id": "1:2", "figma_version": "v1"},
@@ -112,14 +220,11 @@ async def _resolve_urls(file_key: str, image_refs: list[str]) -> Dict[str, str]:
 def test_materialize_assets_rewrites_urls(tmp_path: Path, monkeypatch):
     monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
 
-    ir = {
-        "root_node": _sample_root_node(),
-        "assets": {},
-    }
+    store = NodeStore(_sample_root_node())
 
     result = asyncio.run(
         materialize_assets.run(
-            design_ir=ir,
+            node_store=store,
             file_key="file123456",
             resolve_image_urls_fn=_resolve_urls,
             assets_root=tmp_path / "assets",
@@ -128,7 +233,119 @@ def test_materialize_assets_rewrites_urls(tmp_path: Path, monkeypatch):
 
     assert result["manifest"]
     assert result["by_image_ref"]["img_ref_1"].startswith("/assets/figma/")
-    assert "https://" not in result["design_ir"]["root_node"]["fills"][0].get("imageUrl", "")
+    patched = store.materialize(image_urls=result["by_image_ref"])
+    assert patched["fills"][0]["imageUrl"] == result["by_image_ref"]["img_ref_1"]
+    assert "imageUrl" not in store.get("1:2")["fills"][0]
+
+
+def test_design_ir_references_snapshot_tree_by_id():
+    snapshot = {
+        "meta": {"file_key": "file123456", "node_id": "1:2", "figma_version": "v1"},
+        "node": _sample_root_node(),
+        "raw": {},
+    }
+    ir = normalize_ir.run(snapshot, {})
+
+    assert "root_node" not in ir
+    assert all("fills" not in node for node in ir["nodes"])
+    assert ir["node_store"]["root_id"] == "1:2"
+    assert ir["node_store"]["node_count"] == 3
+
+    store = NodeStore.from_snapshot(snapshot)
+    assert len(store) == 3
+    assert store.get("1:3") is snapshot["node"]["children"][0]
+    assert store.materialize("1:4") == snapshot["node"]["children"][1]
+    assert store.materialize("1:4") is not snapshot["node"]["children"][1]
+
+
+def test_node_store_subtree_hashes_change_along_edited_branch():
+    original = NodeStore(_sample_root_node())
+    edited_root = _sample_root_node()
+    edited_root["children"][0]["name"] = "Headline"
+    edited = NodeStore(edited_root)
+
+    assert edited.subtree_hash("1:3") != original.subtree_hash("1:3")
+    assert len(edited._hashes) == 1  # only the looked-up subtree is hashed
+    assert edited.subtree_hash() != original.subtree_hash()
+    assert edited.subtree_hash("1:4") == original.subtree_hash("1:4")
+    assert edited.own_hash("1:2") == original.own_hash("1:2")
+
+    ir = normalize_ir.run({"meta": {}, "node": edited_root, "raw": {}}, {}, edited)
+    assert {row["id"]: row["subtree_hash"] for row in ir["nodes"]}["1:4"] == original.subtree_hash("1:4")
+
+
+def test_document_index_lookups_and_document_cache(monkeypatch):
+    root = _sample_root_node()
+    root["children"][1]["children"] = [
+        {"id": "2:1", "name": "Button", "type": "INSTANCE", "componentId": "C:1", "children": [
+            {"id": "2:2", "name": "Label", "type": "TEXT"},
+        ]},
+        {"id": "2:3", "name": "Button", "type": "INSTANCE", "componentId": "C:1"},
+    ]
+    index = DocumentIndex(root)
+
+    assert len(index) == 6
+    assert index.get("2:2")["name"] == "Label"
+    assert index.parent("2:2")["id"] == "2:1"
+    assert index.parent_id("1:2") is None
+    assert index.ancestor_ids("2:2") == ["1:2", "1:4", "2:1"]
+    assert index.path("2:2") == ["Root", "Body", "Button", "Label"]
+    assert index.depth("2:2") == 3
+    assert [node["id"] for node in index.of_type("TEXT")] == ["1:3", "2:2"]
+    assert [node["id"] for node in index.of_type("INSTANCE", "TEXT")] == ["1:3", "2:1", "2:2", "2:3"]
+    assert index.type_counts() == {"FRAME": 2, "INSTANCE": 2, "TEXT": 2}
+    assert [node["id"] for node in index.instances_of("C:1")] == ["2:1", "2:3"]
+    assert NodeStore(root).index.get("2:3") is index.get("2:3")
+
+    clock = [100.0]
+    monkeypatch.setattr(document_index.time, "monotonic", lambda: clock[0])
+    cache = DocumentCache(ttl_seconds=30, max_entries=2)
+    entry = cache.put("a", root, {"name": "File"})
+    assert cache.get("a") is entry and entry.index.get("2:1") is not None
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+    assert cache.get("b") is None and cache.get("a") is entry
+    clock[0] += 31
+    assert cache.get("a") is None
+    assert DocumentCache(ttl_seconds=0, max_entries=2).get("a") is None
+
+    sized = DocumentCache(ttl_seconds=30, max_bytes=100)
+    sized.put("a", root, size=60)
+    sized.put("b", {}, size=30)
+    sized.put("c", {}, size=30)
+    assert sized.get("a") is None and sized.get("b") is not None and sized.current_bytes == 60
+    sized.put("huge", {}, size=101)
+    assert sized.get("huge") is None and sized.current_bytes == 60
+
+
+def test_deep_trees_normalize_and_skip_hidden_images(tmp_path: Path, monkeypatch):
+    import sys
+
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+    root = node = _sample_root_node()
+    for index in range(sys.getrecursionlimit() + 100):
+        child = {"id": f"9:{index}", "name": "Level", "type": "FRAME", "children": []}
+        node["children"].append(child)
+        node = child
+    root["children"][1]["visible"] = False
+    root["children"][1]["fills"] = [{"type": "IMAGE", "imageRef": "hidden_ref", "visible": True}]
+    store = NodeStore(root)
+
+    ir = normalize_ir.run({"meta": {}, "node": root, "raw": {}}, {}, store)
+    by_id = {row["id"]: row for row in ir["nodes"]}
+    assert by_id[node["id"]]["depth"] == sys.getrecursionlimit() + 100
+    assert store.materialize()["children"][-1]["children"][0]["id"] == "9:1"
+
+    result = asyncio.run(
+        materialize_assets.run(
+            node_store=store,
+            file_key="file123456",
+            resolve_image_urls_fn=_resolve_urls,
+            assets_root=tmp_path / "assets",
+        )
+    )
+    assert set(result["by_image_ref"]) == {"img_ref_1"}
 
 
 def test_static_gate_threshold_boundaries():
@@ -228,7 +445,7 @@ def test_visual_gate_hybrid_adds_vision_explanation(tmp_path: Path, monkeypatch)
     monkeypatch.setattr(
         visual_gates,
         "_vision_explanation",
-        lambda _a, _b: {
+        lambda _a, _b, **_options: {
             "issues": ["Vision summary: Layout/spacing mismatch (changed_pixels=22.00%)."],
             "evidence_paths": ["/tmp/diff-map.png"],
         },
@@ -273,6 +490,236 @@ def test_visual_gate_ignores_alpha_only_differences(tmp_path: Path):
     assert gate.score >= 99.0
 
 
+def test_visual_gate_aligns_small_global_shift(tmp_path: Path):
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return
+
+    figma_path = tmp_path / "figma.png"
+    impl_path = tmp_path / "impl.png"
+
+    def _draw(offset: int, size: tuple[int, int]) -> "Image.Image":
+        image = Image.new("RGB", size, (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        for idx in range(6):
+            x = 8 + idx * 14 + offset
+            draw.rectangle((x, 10 + offset, x + 6, 80 + offset), fill=(20, 20, 20))
+        return image
+
+    _draw(0, (100, 100)).save(figma_path)
+    _draw(2, (101, 99)).save(impl_path)
+
+    score = visual_gates._pixel_similarity(figma_path, impl_path)
+    assert score >= 99.0
+
+
+def test_visual_gate_streaming_diff_matches_full_diff(tmp_path: Path, monkeypatch):
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return
+
+    figma_path = tmp_path / "figma.png"
+    impl_path = tmp_path / "impl.png"
+
+    figma_img = Image.new("RGBA", (120, 400), (255, 255, 255, 0))
+    impl_img = Image.new("RGBA", (121, 399), (255, 255, 255, 255))
+    ImageDraw.Draw(figma_img).rectangle((10, 30, 90, 300), fill=(30, 60, 200, 180))
+    ImageDraw.Draw(impl_img).rectangle((12, 35, 95, 310), fill=(30, 60, 200, 255))
+    figma_img.save(figma_path)
+    impl_img.save(impl_path)
+
+    full_score = visual_gates._pixel_similarity(figma_path, impl_path)
+
+    monkeypatch.setattr(visual_gates, "_STREAMING_MIN_PIXELS", 0)
+    monkeypatch.setattr(visual_gates, "_DIFF_BAND_ROWS", 37)
+    assert visual_gates._pixel_similarity(figma_path, impl_path) == full_score
+
+
+def test_visual_gate_streaming_resampled_diff_matches_full_diff(tmp_path: Path, monkeypatch):
+    try:
+        from PIL import Image, ImageChops, ImageDraw
+    except ImportError:
+        return
+
+    figma_path = tmp_path / "figma@2x.png"
+    impl_path = tmp_path / "impl.png"
+
+    # A 2x export against a 1x render is beyond the crop tolerance, so image B is
+    # LANCZOS-resampled; with streaming forced that happens band by band.
+    figma_img = Image.new("RGBA", (240, 780), (255, 255, 255, 0))
+    impl_img = Image.new("RGBA", (131, 397), (255, 255, 255, 255))
+    figma_draw = ImageDraw.Draw(figma_img)
+    impl_draw = ImageDraw.Draw(impl_img)
+    figma_draw.rectangle((20, 60, 180, 600), fill=(30, 60, 200, 180))
+    figma_draw.ellipse((60, 620, 220, 760), fill=(220, 40, 40, 255))
+    impl_draw.rectangle((11, 31, 99, 305), fill=(30, 60, 200, 255))
+    impl_draw.ellipse((33, 318, 120, 390), fill=(200, 40, 40, 255))
+    for x in range(0, 131, 7):
+        impl_draw.line((x, 0, x, 396), fill=(90, 90, 90, 255))
+    figma_img.save(figma_path)
+    impl_img.save(impl_path)
+
+    full_score = visual_gates._pixel_similarity(figma_path, impl_path)
+    with Image.open(impl_path) as image:
+        full_band = visual_gates._DiffSource(image, figma_img.size, streaming=False).band((0, 0, 240, 780))
+
+        monkeypatch.setattr(visual_gates, "_STREAMING_MIN_PIXELS", 0)
+        monkeypatch.setattr(visual_gates, "_DIFF_BAND_ROWS", 37)
+        streamed = visual_gates._DiffSource(image, figma_img.size, streaming=True)
+        for top in range(0, 780, 37):
+            box = (0, top, 240, min(780, top + 37))
+            delta = ImageChops.difference(streamed.band(box), full_band.crop(box))
+            assert max(high for _low, high in delta.getextrema()) <= 1
+
+    assert visual_gates._pixel_similarity(figma_path, impl_path) == full_score
+
+
+def test_visual_gate_evidence_modes(tmp_path: Path):
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    figma_path = tmp_path / "figma.png"
+    impl_path = tmp_path / "impl.png"
+    diff_path = tmp_path / "impl.diff.png"
+    Image.new("RGB", (40, 40), (255, 255, 255)).save(figma_path)
+    Image.new("RGB", (40, 40), (0, 0, 0)).save(impl_path)
+
+    def _gate(evidence_mode: str, **options):
+        return visual_gates.run(
+            figma_screenshot_path=str(figma_path),
+            implementation_screenshot_path=str(impl_path),
+            pass_threshold=95.0,
+            warn_threshold=85.0,
+            visual_mode="hybrid",
+            evidence_mode=evidence_mode,
+            **options,
+        )
+
+    skipped = _gate("off")
+    assert skipped.status == GateStatus.FAIL
+    assert str(diff_path) not in skipped.evidence_paths
+    assert not diff_path.exists()
+
+    queued = _gate("async", evidence_max_dimension=16, evidence_palette=True)
+    assert str(diff_path) in queued.evidence_paths
+    assert visual_gates.flush_evidence_writes() == set()
+    with Image.open(diff_path) as diff_map:
+        assert diff_map.size == (16, 16)
+        assert diff_map.mode == "P"
+
+
+def test_runner_drops_diff_evidence_whose_write_failed(tmp_path: Path, monkeypatch):
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    figma_path = tmp_path / "figma.png"
+    impl_path = tmp_path / "impl.png"
+    Image.new("RGB", (40, 40), (255, 255, 255)).save(figma_path)
+    Image.new("RGB", (40, 40), (0, 0, 0)).save(impl_path)
+
+    def failing_write(*args, **kwargs):
+        raise OSError("disk full")
+
+    async def figma_screenshot(file_key: str, node_id: str, scale: float) -> str:
+        return str(figma_path)
+
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+    monkeypatch.setattr(visual_gates, "_write_diff_evidence", failing_write)
+    deps = PipelineDependencies(
+        fetch_snapshot=_fetch_snapshot,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_resolve_urls,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=figma_screenshot,
+        render_implementation_screenshot=_render_implementation_screenshot,
+    )
+    config = PipelineConfig(
+        pipeline_version="test",
+        cache_root=tmp_path / "cache",
+        output_root=tmp_path / "runs",
+        cache_enabled=False,
+        visual_mode="hybrid",
+        visual_evidence_mode="async",
+    )
+    request = PipelineRunRequest(
+        file_key="qyFsYyLyBsutXGGzZ9PLCp",
+        node_id="1:2",
+        implementation_screenshot_path=str(impl_path),
+        auto_render_implementation=False,
+        output_dir=str(tmp_path / "runs"),
+    )
+
+    result = asyncio.run(PipelineRunner(deps=deps, config=config).run(request))
+    diff_path = str(tmp_path / "impl.diff.png")
+    summary = json.loads(Path(result.artifacts["summary"]).read_text(encoding="utf-8"))
+    assert all(diff_path not in gate["evidence_paths"] for gate in summary["gates"])
+    assert f"Visual diff evidence was not written: {diff_path}" in summary["errors"]
+
+
+def test_screenshot_index_reuses_gate_for_unchanged_pair(tmp_path: Path):
+    figma_path = tmp_path / "figma.png"
+    impl_path = tmp_path / "run-1" / "impl.png"
+    rerun_impl_path = tmp_path / "run-2" / "impl.png"
+    impl_path.parent.mkdir()
+    rerun_impl_path.parent.mkdir()
+    figma_path.write_bytes(b"figma")
+    impl_path.write_bytes(b"impl")
+    rerun_impl_path.write_bytes(b"impl")
+
+    settings = {"visual_mode": "hybrid", "pass_threshold": 95.0}
+    index = ScreenshotIndex(tmp_path / "index.json")
+    index.save_gate(figma_path, impl_path, settings, {"gate_name": "visual", "status": "WARN", "score": 90.0})
+    index.flush()
+    assert not list(tmp_path.glob(".index.json.*.tmp"))
+
+    reloaded = ScreenshotIndex(tmp_path / "index.json")
+    assert reloaded.load_gate(figma_path, rerun_impl_path, settings)["score"] == 90.0
+
+    rerun_impl_path.write_bytes(b"impl-changed")
+    assert reloaded.load_gate(figma_path, rerun_impl_path, settings) is None
+
+
+def test_screenshot_index_compares_fingerprints_across_runs(tmp_path: Path, monkeypatch):
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return
+
+    from pipeline import screenshot_index
+
+    base = Image.new("RGB", (200, 120), (255, 255, 255))
+    ImageDraw.Draw(base).rectangle((20, 20, 120, 90), fill=(30, 60, 200))
+    base.save(tmp_path / "run-1.png")
+    nudged = base.copy()
+    nudged.putpixel((150, 100), (254, 255, 255))
+    nudged.save(tmp_path / "run-2.png")
+    changed = base.copy()
+    ImageDraw.Draw(changed).rectangle((130, 20, 190, 90), fill=(200, 40, 40))
+    changed.save(tmp_path / "run-3.png")
+
+    index = ScreenshotIndex(tmp_path / "index.json")
+    for name in ("run-1.png", "run-2.png", "run-3.png"):
+        assert index.entry(tmp_path / name)["phash"]
+    index.flush()
+
+    def _no_decode(path: Path) -> Dict[str, Any]:
+        raise AssertionError(f"{path} was decoded again")
+
+    monkeypatch.setattr(screenshot_index, "_image_fingerprint", _no_decode)
+    reloaded = ScreenshotIndex(tmp_path / "index.json")
+    assert reloaded.near_identical(tmp_path / "run-1.png", tmp_path / "run-2.png")
+    assert not reloaded.near_identical(tmp_path / "run-1.png", tmp_path / "run-3.png")
+    assert reloaded.similarity(tmp_path / "run-1.png", tmp_path / "run-2.png") >= 99.9
+    assert reloaded.similarity(tmp_path / "run-1.png", tmp_path / "run-3.png") < 99.0
+
+
 async def _fetch_snapshot(file_key: str, node_id: str) -> Dict[str, Any]:
     return {
         "lastModified": "2026-02-14T00:00:00Z",
@@ -373,8 +820,118 @@ def test_runner_generates_artifacts_and_warn_status(tmp_path: Path, monkeypatch)
     assert Path(result.artifacts["summary"]).exists()
     assert Path(result.artifacts["generated_code"]).exists()
 
+    trace = json.loads(Path(result.artifacts["trace"]).read_text(encoding="utf-8"))
+    spans = {event["name"]: event for event in trace["traceEvents"] if event["ph"] == "X"}
+    download = spans["download_asset"]
+    assert download["args"]["parent_id"] == spans["materialize_assets"]["args"]["span_id"]
+    assert download["args"]["bytes_read"] == len(b"image-bytes-123")
+    assert spans["materialize_assets"]["args"]["bytes_read"] >= download["args"]["bytes_read"]
+    assert spans["cache_save"]["args"]["bytes_written"] > 0
+
+    summary = json.loads(Path(result.artifacts["summary"]).read_text(encoding="utf-8"))
+    assert summary["stage_resources"]["materialize_assets"]["calls"] == 1
+    assert summary["stage_timings"]["normalize_ir"] >= 0.0
+
+    assert "extract_tokens" in asyncio.run(runner.run(request)).cache_hits
+    monkeypatch.setattr(runner_module, "_TOKENS_SCHEMA_VERSION", runner_module._TOKENS_SCHEMA_VERSION + 1)
+    rerun = asyncio.run(runner.run(request))
+    assert {"extract_tokens", "normalize_ir"} <= set(rerun.cache_misses)
+
+
+def test_stage_metrics_nests_spans_and_accumulates_repeated_stages():
+    metrics = StageMetrics()
+
+    async def _stage() -> str:
+        async def _download(index: int) -> None:
+            with span("download", "http", index=index):
+                record_io(read=10)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(_download(0), _download(1))
+        return "done"
+
+    async def _run() -> None:
+        assert await metrics.timed("fetch", _stage) == "done"
+        assert await metrics.timed("fetch", _stage()) == "done"
+
+    asyncio.run(_run())
+
+    stages = [item for item in metrics.spans if item.category == "stage"]
+    downloads = [item for item in metrics.spans if item.name == "download"]
+    assert len(stages) == 2 and len(downloads) == 4
+    assert {item.parent_id for item in downloads} == {stage.span_id for stage in stages}
+    assert all(stage.bytes_read == 20 for stage in stages)
+    assert metrics.stage_timings["fetch"] >= 0.02
+    assert metrics.stage_resources()["fetch"]["calls"] == 2
+
+    with span("outside"):
+        record_io(read=1)
+
+    events = [event for event in metrics.chrome_trace()["traceEvents"] if event["ph"] == "X"]
+    lanes: Dict[int, list] = {}
+    for event in events:
+        lanes.setdefault(event["tid"], []).append((event["ts"], event["ts"] + event["dur"]))
+    for intervals in lanes.values():
+        stack: list = []
+        for start, end in sorted(intervals, key=lambda item: (item[0], -item[1])):
+            while stack and stack[-1] <= start:
+                stack.pop()
+            assert not stack or end <= stack[-1]
+            stack.append(end)
+    assert len(lanes) >= 2
+
+
+def test_service_metrics_registry_tracks_runs_and_serves_prometheus_text(tmp_path: Path, monkeypatch):
+    import urllib.request
 
-def test_runner_cache_hits_on_second_run(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+    monkeypatch.setattr(service_metrics, "_registry", None)
+    service_metrics.inc("pbfigma_pipeline_runs_total", status="PASS")
+    assert service_metrics.registry() is None
+
+    server = service_metrics.serve(0)
+    registry = service_metrics.registry()
+    try:
+        deps = PipelineDependencies(
+            fetch_snapshot=_fetch_snapshot,
+            extract_tokens=_extract_tokens,
+            resolve_image_urls=_resolve_urls,
+            generate_react_code=_generate_react_code,
+            sanitize_component_name=_sanitize,
+            get_figma_screenshot=_figma_screenshot,
+            render_implementation_screenshot=_render_implementation_screenshot,
+        )
+        runner = PipelineRunner(
+            deps=deps,
+            config=PipelineConfig(pipeline_version="test", cache_root=tmp_path / "cache", output_root=tmp_path / "runs"),
+        )
+        request = PipelineRunRequest(file_key="qyFsYyLyBsutXGGzZ9PLCp", node_id="1:2", output_dir=str(tmp_path / "runs"))
+        first = asyncio.run(runner.run(request))
+        asyncio.run(runner.run(request))
+
+        assert registry.value("pbfigma_pipeline_runs_total", status=first.status.value) == 2
+        assert registry.value("pbfigma_stage_cache_lookups_total", stage="normalize_ir", result="miss") == 1
+        assert registry.value("pbfigma_stage_cache_lookups_total", stage="normalize_ir", result="memory_hit") == 1
+        assert registry.value("pbfigma_pipeline_stage_seconds", stage="static_gates") == 2
+        assert registry.value("pbfigma_gate_results_total", gate="static", status=first.gates[0].status.value) == 2
+
+        registry.observe("pbfigma_figma_request_seconds", 0.3, endpoint=service_metrics.endpoint_label("files/abc123/nodes?ids=1:2"))
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "# TYPE pbfigma_figma_request_seconds histogram" in body
+    assert 'pbfigma_figma_request_seconds_bucket{endpoint="files/:key/nodes",le="0.25"} 0' in body
+    assert 'pbfigma_figma_request_seconds_bucket{endpoint="files/:key/nodes",le="0.5"} 1' in body
+    assert 'pbfigma_figma_request_seconds_bucket{endpoint="files/:key/nodes",le="+Inf"} 1' in body
+    assert 'pbfigma_figma_request_seconds_count{endpoint="files/:key/nodes"} 1' in body
+    assert f'pbfigma_pipeline_runs_total{{status="{first.status.value}"}} 2' in body
+
+
+def test_cache_module_hits_on_second_run(tmp_path: Path, monkeypatch):
     monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
 
     deps = PipelineDependencies(
@@ -416,10 +973,454 @@ def test_runner_cache_hits_on_second_run(tmp_path: Path, monkeypatch):
     assert len(second.cache_hits) >= len(first.cache_misses) - 1
 
 
+def test_runner_reuses_snapshot_when_version_unchanged(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+
+    fetch_calls: list[str] = []
+    screenshot_calls: list[str] = []
+    current_version = {"value": "2026-02-14T00:00:00Z"}
+
+    async def _counting_fetch(file_key: str, node_id: str) -> Dict[str, Any]:
+        fetch_calls.append(node_id)
+        raw = await _fetch_snapshot(file_key, node_id)
+        raw["lastModified"] = current_version["value"]
+        return raw
+
+    async def _counting_screenshot(file_key: str, node_id: str, scale: float) -> str:
+        screenshot_calls.append(node_id)
+        path = tmp_path / f"figma-{len(screenshot_calls)}.png"
+        path.write_bytes(b"figma-image")
+        return str(path)
+
+    async def _probe(file_key: str) -> str:
+        return current_version["value"]
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_counting_fetch,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_resolve_urls,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_counting_screenshot,
+        render_implementation_screenshot=_render_implementation_screenshot,
+        probe_file_version=_probe,
+    )
+    config = PipelineConfig(
+        pipeline_version="test",
+        cache_root=tmp_path / "cache",
+        output_root=tmp_path / "runs",
+    )
+    runner = PipelineRunner(deps=deps, config=config)
+    request = PipelineRunRequest(
+        file_key="qyFsYyLyBsutXGGzZ9PLCp",
+        node_id="1:2",
+        output_dir=str(tmp_path / "runs"),
+    )
+
+    asyncio.run(runner.run(request))
+
+    # The root content hash is stored with the cached snapshot, so a cached run
+    # does not hash the tree again.
+    subtree_hash = NodeStore.subtree_hash
+
+    def _no_rehash(self: NodeStore, node_id: Any = None) -> str:
+        raise AssertionError("cached snapshot was hashed again")
+
+    monkeypatch.setattr(NodeStore, "subtree_hash", _no_rehash)
+    second = asyncio.run(runner.run(request))
+    monkeypatch.setattr(NodeStore, "subtree_hash", subtree_hash)
+    assert len(fetch_calls) == 1
+    assert len(screenshot_calls) == 1
+    assert "fetch_snapshot" in second.cache_hits
+    assert "capture_figma_screenshot" in second.cache_hits
+
+    current_version["value"] = "2026-02-15T00:00:00Z"
+    third = asyncio.run(runner.run(request))
+    assert len(fetch_calls) == 2
+    assert "fetch_snapshot" in third.cache_misses
+
+
+def test_runner_reuses_unchanged_subtrees_after_edit(tmp_path: Path, monkeypatch):
+    from generators.react_generator import generate_react_code
+
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+
+    title = {"value": "Title"}
+    resolve_calls: list[list[str]] = []
+    memo_hits: list[int] = []
+    generate_threads: set[str] = set()
+
+    async def _editable_fetch(file_key: str, node_id: str) -> Dict[str, Any]:
+        root = _sample_root_node()
+        root["children"][0]["name"] = title["value"]
+        root["children"][1]["children"] = [
+            {"id": "1:5", "name": "Card", "type": "FRAME", "absoluteBoundingBox": {"x": 20, "y": 50, "width": 80, "height": 40}, "children": []}
+        ]
+        return {"lastModified": f"version-{title['value']}", "nodes": {node_id: {"document": root}}}
+
+    async def _counting_resolve(file_key: str, image_refs: list[str]) -> Dict[str, str]:
+        resolve_calls.append(image_refs)
+        return await _resolve_urls(file_key, image_refs)
+
+    def _memo_generate(node, component_name, use_tailwind, hard_fidelity_profile=False, jsx_memo=None):
+        code = generate_react_code(node, component_name, use_tailwind, hard_fidelity_profile, jsx_memo=jsx_memo)
+        memo_hits.append(jsx_memo.hits if jsx_memo is not None else 0)
+        generate_threads.add(threading.current_thread().name)
+        return code
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_editable_fetch,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_counting_resolve,
+        generate_react_code=_memo_generate,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_figma_screenshot,
+        render_implementation_screenshot=_render_implementation_screenshot,
+    )
+    runner = PipelineRunner(
+        deps=deps,
+        config=PipelineConfig(pipeline_version="test", cache_root=tmp_path / "cache", output_root=tmp_path / "runs"),
+    )
+    request = PipelineRunRequest(file_key="qyFsYyLyBsutXGGzZ9PLCp", node_id="1:2", output_dir=str(tmp_path / "runs"))
+
+    asyncio.run(runner.run(request))
+    title["value"] = "Headline"
+    edited = asyncio.run(runner.run(request))
+
+    assert "generate_react" in edited.cache_misses
+    assert memo_hits == [0, 1]
+    assert threading.main_thread().name not in generate_threads
+    assert len(resolve_calls) == 1
+
+    generated = Path(edited.artifacts["generated_code"]).read_text(encoding="utf-8")
+    uncached = asyncio.run(runner.run(request.model_copy(update={"use_cache": False})))
+    assert memo_hits[-1] == 0
+    assert generated == Path(uncached.artifacts["generated_code"]).read_text(encoding="utf-8")
+    assert "Headline" in generated
+
+
+def test_generate_react_schedules_component_units_per_batch(monkeypatch):
+    from generators.react_generator import generate_react_code, recursive_node_to_jsx
+
+    def _card(index: int) -> Dict[str, Any]:
+        x = 10 + index * 40
+        return {
+            "id": f"2:{index}",
+            "name": f"Card {index}",
+            "type": "FRAME",
+            "layoutMode": "VERTICAL",
+            "absoluteBoundingBox": {"x": x, "y": 60, "width": 36, "height": 80},
+            "children": [
+                {"id": f"3:{index}", "name": "Label", "type": "TEXT", "characters": f"Item {index}", "absoluteBoundingBox": {"x": x, "y": 60, "width": 36, "height": 20}},
+                {
+                    "id": f"4:{index}",
+                    "name": "Button",
+                    "type": "FRAME",
+                    "absoluteBoundingBox": {"x": x, "y": 100, "width": 36, "height": 20},
+                    "children": [
+                        {"id": f"5:{index}", "name": "Text", "type": "TEXT", "characters": "Go", "absoluteBoundingBox": {"x": x, "y": 100, "width": 20, "height": 20}}
+                    ],
+                },
+            ],
+        }
+
+    root = _sample_root_node()
+    root["fills"] = []
+    root["children"][1]["children"] = [_card(index) for index in range(6)]
+    snapshot = {"meta": {"file_key": "k", "node_id": "1:2"}, "node": root}
+    store = NodeStore.from_snapshot(snapshot)
+    design_ir = normalize_ir.run(snapshot, {}, store)
+    design_ir["assets"] = {"by_image_ref": {}}
+    component_graph = build_component_dag.run(design_ir)
+    expected = generate_react_code(store.materialize(), "Root", True, True)
+    monkeypatch.setattr(generate_react, "_UNIT_MIN_NODES", 1)
+
+    results = {}
+    for workers in (1, 2):
+        pool = generate_react.ComponentPool(workers)
+        memo = generate_react.SubtreeJSXMemo(store, {})
+        results[workers] = generate_react.run(
+            design_ir,
+            store,
+            "react_tailwind",
+            PipelineMode.STRICT_PIXEL,
+            "Root",
+            generate_react_code,
+            _sanitize,
+            jsx_memo=memo,
+            component_graph=component_graph,
+            render_subtree_fn=recursive_node_to_jsx,
+            component_pool=pool,
+        )
+        pool.shutdown()
+        assert results[workers]["code"] == expected
+        # The lone top-level unit stays with the root render, which reuses the six cards.
+        assert memo.hits == (6 if results[workers]["schedule"]["workers"] else 0)
+
+    assert results[1]["schedule"] == {"units": 13, "reused": 0, "rendered": 13, "dispatched": 0, "workers": 0}
+    assert results[2]["schedule"]["rendered"] == 13
+    assert results[2]["schedule"]["dispatched"] in {0, 12}
+    assert results[2]["schedule"]["workers"] in {0, 2}
+
+    pool = generate_react.ComponentPool(2)
+    executors = []
+    for _ in range(2):
+        generate_react.run(
+            design_ir,
+            store,
+            "react_tailwind",
+            PipelineMode.STRICT_PIXEL,
+            "Root",
+            generate_react_code,
+            _sanitize,
+            jsx_memo=generate_react.SubtreeJSXMemo(store, {}),
+            component_graph=component_graph,
+            render_subtree_fn=recursive_node_to_jsx,
+            component_pool=pool,
+        )
+        executors.append(pool.executor())
+    pool.shutdown()
+    assert executors[0] is not None and executors[0] is executors[1]
+
+    warm = generate_react.SubtreeJSXMemo(store, {}, memo.entries())
+    rerun = generate_react.run(
+        design_ir,
+        store,
+        "react_tailwind",
+        PipelineMode.STRICT_PIXEL,
+        "Root",
+        generate_react_code,
+        _sanitize,
+        jsx_memo=warm,
+        component_graph=component_graph,
+        render_subtree_fn=recursive_node_to_jsx,
+    )
+    assert rerun["code"] == expected
+    assert rerun["schedule"]["reused"] == 13
+    assert warm.misses == 0
+
+
+def test_runner_run_many_shares_fetches_and_reports(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+
+    fetch_calls: list[str] = []
+    resolve_calls: list[list[str]] = []
+
+    def _root(node_id: str) -> Dict[str, Any]:
+        root = _sample_root_node()
+        root["id"] = node_id
+        return root
+
+    documents = {"1:2": _root("1:2"), "2:2": _root("2:2")}
+
+    async def _multi_fetch(file_key: str, node_ids: str) -> Dict[str, Any]:
+        fetch_calls.append(node_ids)
+        return {
+            "lastModified": "2026-02-14T00:00:00Z",
+            "nodes": {node_id: {"document": documents[node_id]} for node_id in node_ids.split(",") if node_id in documents},
+        }
+
+    async def _counting_resolve(file_key: str, image_refs: list[str]) -> Dict[str, str]:
+        resolve_calls.append(image_refs)
+        return await _resolve_urls(file_key, image_refs)
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_multi_fetch,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_counting_resolve,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_figma_screenshot,
+        render_implementation_screenshot=_render_implementation_screenshot,
+    )
+    runner = PipelineRunner(
+        deps=deps,
+        config=PipelineConfig(pipeline_version="test", cache_root=tmp_path / "cache", output_root=tmp_path / "runs"),
+    )
+    requests = [
+        PipelineRunRequest(file_key="qyFsYyLyBsutXGGzZ9PLCp", node_id=node_id, output_dir=str(tmp_path / "runs"))
+        for node_id in ("1:2", "2:2", "9:9", "1:2")
+    ]
+
+    batch = asyncio.run(runner.run_many(requests, max_concurrency=2))
+
+    assert fetch_calls == ["1:2,2:2,9:9", "9:9"]
+    assert resolve_calls == [["img_ref_1"]]
+    assert [run.status for run in batch.runs] == [PipelineStatus.WARN, PipelineStatus.WARN]
+    assert list(batch.failures) == ["qyFsYyLyBsutXGGzZ9PLCp:9:9"]
+    assert batch.status == PipelineStatus.ERROR
+    assert batch.status_counts["WARN"] == 2 and batch.status_counts["ERROR"] == 1
+
+    summary = json.loads(Path(batch.artifacts["batch_summary"]).read_text(encoding="utf-8"))
+    assert [row["node_id"] for row in summary["runs"]] == ["1:2", "2:2"]
+    assert len({row["run_id"] for row in summary["runs"]}) == 2
+    assert summary["shared_calls"]["snapshot_fetches"] == 2
+
+
+def test_visual_gate_batch_preserves_pair_order(tmp_path: Path):
+    same_a = tmp_path / "same-a.png"
+    same_b = tmp_path / "same-b.png"
+    same_a.write_bytes(b"pixel-perfect")
+    same_b.write_bytes(b"pixel-perfect")
+
+    results = visual_gates.run_batch(
+        [
+            (str(same_a), str(same_b)),
+            (str(same_a), None),
+            (None, str(same_b)),
+        ],
+        pass_threshold=95.0,
+        warn_threshold=85.0,
+        visual_mode="hybrid",
+        max_workers=2,
+    )
+
+    assert [gate.status for gate in results] == [GateStatus.PASS, GateStatus.WARN, GateStatus.SKIPPED]
+
+
+def test_runner_run_many_scores_visual_gates_as_one_batch(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+
+    async def _render_copy(generated_code, component_name, asset_manifest, width, height, output_path, use_tailwind):
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(output_path).write_bytes(b"figma-image")
+        return {"path": output_path, "error": None}
+
+    scored: list[list[tuple[Any, Any]]] = []
+    run_batch = visual_gates.run_batch
+
+    def _recording_run_batch(pairs, **kwargs):
+        scored.append(list(pairs))
+        return run_batch(pairs, **kwargs)
+
+    monkeypatch.setattr(visual_gates, "run_batch", _recording_run_batch)
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_fetch_snapshot,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_resolve_urls,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_figma_screenshot,
+        render_implementation_screenshot=_render_copy,
+    )
+    runner = PipelineRunner(
+        deps=deps,
+        config=PipelineConfig(pipeline_version="test", cache_root=tmp_path / "cache", output_root=tmp_path / "runs"),
+    )
+    requests = [
+        PipelineRunRequest(file_key="qyFsYyLyBsutXGGzZ9PLCp", node_id=node_id, output_dir=str(tmp_path / "runs"))
+        for node_id in ("1:2", "2:2", "3:2")
+    ]
+
+    batch = asyncio.run(runner.run_many(requests, max_concurrency=3))
+
+    assert [len(pairs) for pairs in scored] == [3]
+    assert {Path(impl).name for _figma, impl in scored[0]} == {"implementation.png"}
+    assert [run.gates[-1].status for run in batch.runs] == [GateStatus.PASS] * 3
+    summary = json.loads(Path(batch.artifacts["batch_summary"]).read_text(encoding="utf-8"))
+    assert summary["visual_gate_batches"] == [3]
+
+
+def test_shared_fetches_retry_a_failed_call():
+    attempts: list[str] = []
+
+    async def _flaky_fetch(file_key: str, node_ids: str) -> Dict[str, Any]:
+        attempts.append(node_ids)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise httpx.ReadTimeout("timed out")
+        return {"nodes": {node_id: {"document": {"id": node_id}} for node_id in node_ids.split(",")}}
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_flaky_fetch,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_resolve_urls,
+        generate_react_code=_generate_react_code,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_figma_screenshot,
+        render_implementation_screenshot=_render_implementation_screenshot,
+    )
+    shared = runner_module._SharedFetches(deps, {"file": ["1:2", "2:2"]})
+
+    async def _run() -> None:
+        first = await asyncio.gather(
+            shared.fetch_snapshot("file", "1:2"), shared.fetch_snapshot("file", "2:2"), return_exceptions=True
+        )
+        assert all(isinstance(outcome, httpx.ReadTimeout) for outcome in first)
+        retried = await shared.fetch_snapshot("file", "2:2")
+        assert retried["nodes"] == {"2:2": {"document": {"id": "2:2"}}}
+
+    asyncio.run(_run())
+    assert attempts == ["1:2,2:2", "1:2,2:2"]
+
+
 def _generate_bad_code(node: Dict[str, Any], component_name: str, use_tailwind: bool) -> str:
     return "/* imageRef: still-here */\nconst leak = 'https://s3-alpha-sig.figma.com/x';"
 
 
+def test_runner_rejects_patch_whose_render_shows_no_visible_change(tmp_path: Path, monkeypatch):
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
+    figma_path = tmp_path / "figma.png"
+    Image.new("RGB", (64, 64), (255, 255, 255)).save(figma_path)
+
+    def _generate_unnormalized(node: Dict[str, Any], component_name: str, use_tailwind: bool) -> str:
+        return _generate_react_code(node, component_name, use_tailwind).replace("w-[400px]", "w-[400.0px]")
+
+    async def _figma_png(file_key: str, node_id: str, scale: float) -> str:
+        return str(figma_path)
+
+    async def _render_dark(generated_code, component_name, asset_manifest, width, height, output_path, use_tailwind):
+        image = Image.new("RGB", (64, 64), (0, 0, 0))
+        if "iter" in Path(output_path).name:
+            image.putpixel((3, 3), (1, 0, 0))
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        image.save(output_path)
+        return {"path": output_path, "error": None}
+
+    scored: list[str] = []
+    gate_run = visual_gates.run
+
+    def _counting_gate(**kwargs):
+        scored.append(Path(kwargs["implementation_screenshot_path"]).name)
+        return gate_run(**kwargs)
+
+    monkeypatch.setattr(visual_gates, "run", _counting_gate)
+
+    deps = PipelineDependencies(
+        fetch_snapshot=_fetch_snapshot,
+        extract_tokens=_extract_tokens,
+        resolve_image_urls=_resolve_urls,
+        generate_react_code=_generate_unnormalized,
+        sanitize_component_name=_sanitize,
+        get_figma_screenshot=_figma_png,
+        render_implementation_screenshot=_render_dark,
+    )
+    runner = PipelineRunner(
+        deps=deps,
+        config=PipelineConfig(pipeline_version="test", cache_root=tmp_path / "cache", output_root=tmp_path / "runs"),
+    )
+    result = asyncio.run(
+        runner.run(
+            PipelineRunRequest(
+                file_key="qyFsYyLyBsutXGGzZ9PLCp",
+                node_id="1:2",
+                output_dir=str(tmp_path / "runs"),
+                max_visual_iterations=1,
+            )
+        )
+    )
+
+    assert scored == ["implementation.png"]
+    assert "Exception patch iteration 1 rendered no visible change; patch rejected." in result.errors
+    assert Path(result.gates[-1].evidence_paths[1]).name == "implementation.png"
+
+
 def test_runner_static_fail_enters_exception_lane(tmp_path: Path, monkeypatch):
     monkeypatch.setattr(materialize_assets.httpx, "AsyncClient", _FakeAsyncClient)
 
@@ -263,6 +263,658 @@ class TestTokenGenerationWiring:
         )
 
 
+class TestFusedTokenExtraction:
+    """Verify the single-pass token extractor."""
+
+    def _tree(self):
+        red = {"r": 1, "g": 0, "b": 0, "a": 1}
+        shadow = {"type": "DROP_SHADOW", "color": {"r": 0, "g": 0, "b": 0, "a": 0.25}, "offset": {"x": 0, "y": 2}, "radius": 4}
+        return {
+            "id": "1:1", "name": "Root", "type": "FRAME", "layoutMode": "VERTICAL", "itemSpacing": 8,
+            "fills": [{"type": "SOLID", "color": red}],
+            "effects": [shadow],
+            "children": [
+                {"id": "1:2", "name": "Title", "type": "TEXT", "characters": "Hi",
+                 "style": {"fontFamily": "Inter", "fontSize": 20},
+                 "fills": [{"type": "SOLID", "color": red}],
+                 "strokes": [{"type": "SOLID", "color": {"r": 0, "g": 0, "b": 1, "a": 1}}], "strokeWeight": 1},
+                {"id": "1:3", "name": "Card", "type": "FRAME",
+                 "effects": [dict(shadow), {"type": "DROP_SHADOW", "color": {"r": 0, "g": 0, "b": 0, "a": 0.25}, "offset": {"x": 0, "y": 8}, "radius": 16},
+                             {"type": "LAYER_BLUR", "radius": 4}],
+                 "children": [{"id": "1:4", "name": "Body", "type": "TEXT", "characters": "Text", "style": {"fontFamily": "Inter", "fontSize": 14}}]},
+            ],
+        }
+
+    def test_single_pass_emits_all_categories_deduplicated(self):
+        from figma_mcp import _extract_design_tokens
+
+        tokens = _extract_design_tokens(self._tree())
+
+        assert [c["color"] for c in tokens["colors"]] == ["#ff0000", "rgba(0, 0, 0, 0.25)", "#0000ff"]
+        assert [c["category"] for c in tokens["colors"]] == ["fill", "shadow", "stroke"]
+        assert [t["characters"] for t in tokens["typography"]] == ["Hi", "Text"]
+        assert [s["name"] for s in tokens["spacing"]] == ["Root"]
+        assert [(s["offset"]["y"], s["radius"]) for s in tokens["shadows"]] == [(2, 4), (8, 16)]
+        assert tokens["blurs"] == [{"name": "Card", "type": "LAYER_BLUR", "radius": 4, "usageCount": 1, "nodeIds": ["1:3"]}]
+        assert [(c["usageCount"], c["nodeIds"]) for c in tokens["colors"]] == [(2, ["1:1", "1:2"]), (2, ["1:1", "1:3"]), (1, ["1:2"])]
+
+    def test_stroke_and_shadow_colors_keep_their_kind(self):
+        from figma_mcp import _extract_design_tokens
+
+        black = {"r": 0, "g": 0, "b": 0, "a": 1}
+        tree = {
+            "id": "1:1", "name": "Root", "type": "FRAME",
+            "fills": [{"type": "SOLID", "color": black}],
+            "children": [
+                {"id": "1:2", "name": "Card", "type": "FRAME",
+                 "strokes": [{"type": "SOLID", "color": black}], "strokeWeight": 1,
+                 "effects": [{"type": "DROP_SHADOW", "color": black, "offset": {"x": 0, "y": 2}, "radius": 4}]},
+                {"id": "1:3", "name": "Panel", "type": "FRAME",
+                 "fills": [{"type": "SOLID", "color": black}],
+                 "effects": [{"type": "INNER_SHADOW", "color": black, "offset": {"x": 0, "y": 1}, "radius": 2}]},
+            ],
+        }
+
+        colors = _extract_design_tokens(tree, include_typography=False, include_spacing=False)["colors"]
+
+        assert [(c["category"], c["color"], c["nodeIds"]) for c in colors] == [
+            ("fill", "#000000", ["1:1", "1:3"]),
+            ("shadow", "#000000", ["1:2", "1:3"]),
+            ("stroke", "#000000", ["1:2"]),
+        ]
+
+    def test_typography_and_spacing_are_deduplicated_and_ranked_by_usage(self):
+        from figma_mcp import _TOKEN_NODE_REFS_LIMIT, _extract_design_tokens
+
+        def text(index, size):
+            return {"id": f"2:{index}", "name": f"Text {index}", "type": "TEXT", "characters": f"Line {index}",
+                    "style": {"fontFamily": "Inter", "fontSize": size}}
+
+        rows = [{"id": f"3:{index}", "name": "Row", "type": "FRAME", "layoutMode": "HORIZONTAL", "itemSpacing": 4,
+                 "children": [text(index, 14)]} for index in range(12)]
+        tree = {"id": "1:1", "name": "Page", "type": "FRAME", "children": [text(99, 32), *rows]}
+
+        tokens = _extract_design_tokens(tree, include_colors=False, include_effects=False)
+
+        assert [(t["fontSize"], t["usageCount"]) for t in tokens["typography"]] == [(14, 12), (32, 1)]
+        body = tokens["typography"][0]
+        assert body["characters"] == "Line 0"
+        assert body["nodeIds"] == [f"2:{index}" for index in range(_TOKEN_NODE_REFS_LIMIT)]
+        assert [(s["gap"], s["usageCount"]) for s in tokens["spacing"]] == [(4, 12)]
+
+    def test_disabled_categories_are_omitted(self):
+        from figma_mcp import _extract_design_tokens
+
+        tokens = _extract_design_tokens(self._tree(), include_colors=False, include_spacing=False)
+        assert set(tokens) == {"typography", "shadows", "blurs"}
+
+
+class TestTreeTraversal:
+    """Verify the explicit-stack tree walkers."""
+
+    def _tree(self):
+        return {
+            "id": "1", "type": "FRAME", "children": [
+                {"id": "2", "type": "FRAME", "children": [{"id": "3", "type": "TEXT"}]},
+                {"id": "4", "type": "FRAME", "visible": False, "children": [{"id": "5", "type": "TEXT"}]},
+                {"id": "6", "type": "TEXT"},
+            ],
+        }
+
+    def _chain(self, length):
+        root = node = {"id": "0", "name": "Level", "type": "FRAME", "absoluteBoundingBox": {"width": 10, "height": 10}}
+        for index in range(1, length):
+            child = {"id": str(index), "name": "Level", "type": "FRAME", "absoluteBoundingBox": {"width": 10, "height": 10}}
+            node["children"] = [child]
+            node = child
+        return root
+
+    def test_walk_nodes_prunes_and_limits(self):
+        from generators.base import walk_nodes
+
+        tree = self._tree()
+        visits = [(node["id"], parent["id"] if parent else None, depth, index) for node, parent, depth, index in walk_nodes(tree)]
+        assert visits == [("1", None, 0, 0), ("2", "1", 1, 0), ("3", "2", 2, 0), ("4", "1", 1, 1), ("5", "4", 2, 0), ("6", "1", 1, 2)]
+
+        assert [n["id"] for n, _, _, _ in walk_nodes(tree, skip_invisible=True)] == ["1", "2", "3", "6"]
+        assert [n["id"] for n, _, _, _ in walk_nodes(tree, max_depth=1)] == ["1", "2", "4", "6"]
+        assert [n["id"] for n, _, _, _ in walk_nodes(tree, max_children=1)] == ["1", "2", "3"]
+        assert [n["id"] for n, _, _, _ in walk_nodes(tree, descend=lambda node, _: node["id"] != "2")] == ["1", "2", "4", "5", "6"]
+
+    def test_run_nested_propagates_child_errors_to_parent(self):
+        from generators.base import run_nested
+
+        def failing():
+            raise ValueError("boom")
+            yield  # pragma: no cover
+
+        def parent():
+            try:
+                yield failing()
+            except ValueError as exc:
+                return f"caught {exc}"
+
+        assert run_nested(parent()) == "caught boom"
+
+    def test_deep_trees_do_not_hit_recursion_limit(self):
+        import sys
+        from figma_mcp import _collect_all_assets, _node_to_simplified_tree
+        from generators.react_generator import recursive_node_to_jsx
+        from generators.vue_generator import generate_vue_code
+
+        length = sys.getrecursionlimit() + 100
+        tree = self._chain(length)
+
+        jsx = recursive_node_to_jsx(tree, indent=0, use_tailwind=True)
+        assert jsx.count("</div>") == length
+
+        assert "</template>" in generate_vue_code(tree, "Deep", use_tailwind=False)
+
+        simplified = _node_to_simplified_tree(tree, depth=length, include_empty_frames=True)
+        levels = 0
+        while simplified:
+            levels += 1
+            simplified = (simplified.get("children") or [None])[0]
+        assert levels == length
+
+        assets = {"images": [], "icons": [], "vectors": [], "exports": []}
+        _collect_all_assets(tree, "file", assets, include_icons=False)
+        assert assets == {"images": [], "icons": [], "vectors": [], "exports": []}
+
+
+class TestDocumentCache:
+    """Verify tools share fetched documents and their node index."""
+
+    def test_node_details_reuses_cached_document(self, monkeypatch):
+        import asyncio
+        import json
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+
+        document = {
+            "id": "1:1", "name": "Card", "type": "FRAME",
+            "children": [
+                {"id": "1:2", "name": "Button", "type": "INSTANCE", "componentId": "C:1",
+                 "children": [{"id": "1:3", "name": "Label", "type": "TEXT", "characters": "Go"}]},
+                {"id": "1:4", "name": "Button", "type": "INSTANCE", "componentId": "C:1"},
+            ],
+        }
+        requests = []
+
+        async def fake_request(endpoint, method="GET", params=None):
+            requests.append((endpoint, params))
+            return {"nodes": {"1:1": {"document": document}, "9:9": None}}
+
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=60, max_entries=4))
+
+        details_input = figma_mcp.FigmaNodeInput(file_key="abcdefghij12", node_id="1-1", response_format="json")
+        first = json.loads(figma_mcp._strip_version_footer(asyncio.run(figma_mcp.figma_get_node_details(details_input))))
+        asyncio.run(figma_mcp.figma_get_node_details(details_input))
+        assert len(requests) == 1
+        assert first["descendants"] == {
+            "total": 3, "byType": {"INSTANCE": 2, "TEXT": 1}, "componentInstances": {"C:1": 2},
+        }
+
+        # A response fetched with geometry also serves plain lookups.
+        figma_mcp._DOCUMENT_CACHE.clear()
+        asyncio.run(figma_mcp._fetch_document("abcdefghij12", "1:1", geometry=True))
+        assert asyncio.run(figma_mcp._fetch_document("abcdefghij12", "1:1")).root is document
+        assert requests[-1] == ("files/abcdefghij12/nodes", {"ids": "1:1", "geometry": "paths"})
+        assert len(requests) == 2
+
+        # Unknown nodes come back empty and are not cached.
+        for _ in range(2):
+            assert asyncio.run(figma_mcp._fetch_document("abcdefghij12", "9:9")).root == {}
+        assert len(requests) == 4
+
+
+class TestResultPagination:
+    """Verify list results page through stable cursors without recomputation."""
+
+    def test_design_tokens_and_assets_page_through_cursors(self, monkeypatch):
+        import asyncio
+        import json
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+        from pipeline.result_pages import ResultPages, decode_cursor
+
+        document = {
+            "id": "1:1", "name": "Palette", "type": "FRAME",
+            "children": [
+                {"id": f"2:{i}", "name": f"icon-{i}", "type": "FRAME",
+                 "absoluteBoundingBox": {"x": 0, "y": 0, "width": 24, "height": 24},
+                 "fills": [{"type": "SOLID", "color": {"r": i / 10, "g": 0, "b": 0, "a": 1}}],
+                 "children": [{"id": f"3:{i}", "name": "path", "type": "VECTOR"}]}
+                for i in range(5)
+            ],
+        }
+        requests = []
+
+        async def fake_request(endpoint, method="GET", params=None):
+            requests.append(endpoint)
+            return {"nodes": {"1:1": {"document": document}}}
+
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=0, max_entries=4))
+        monkeypatch.setattr(figma_mcp, "_RESULT_PAGES", ResultPages(ttl_seconds=60, max_entries=4))
+
+        def call(tool, **kwargs):
+            return figma_mcp._strip_version_footer(asyncio.run(tool(**kwargs)))
+
+        token_args = dict(file_key="abcdefghij12", node_id="1:1", include_generated_code=False, page_size=2)
+        first = json.loads(call(figma_mcp.figma_get_design_tokens, params=figma_mcp.FigmaDesignTokensInput(**token_args)))
+        colors = list(first["tokens"]["colors"])
+        assert len(colors) == 2 and first["pagination"]["colors"]["total"] == 5
+        cursor = first["pagination"]["colors"]["nextCursor"]
+        while cursor:
+            page = json.loads(call(
+                figma_mcp.figma_get_design_tokens,
+                params=figma_mcp.FigmaDesignTokensInput(cursor=cursor, **token_args),
+            ))
+            colors.extend(page["items"])
+            cursor = page["nextCursor"]
+        assert [c["nodeIds"] for c in colors] == [[f"2:{i}"] for i in range(5)]
+        assert len(requests) == 1
+        assert decode_cursor(first["pagination"]["colors"]["nextCursor"])[1:] == ("colors", 2)
+
+        # Cursors are tied to the request they were issued for.
+        other = figma_mcp.FigmaDesignTokensInput(
+            cursor=first["pagination"]["colors"]["nextCursor"], **{**token_args, "include_spacing": False}
+        )
+        assert call(figma_mcp.figma_get_design_tokens, params=other).startswith("Error: Cursor belongs")
+
+        asset_args = dict(file_key="abcdefghij12", node_id="1:1", page_size=3)
+        catalog = call(figma_mcp.figma_list_assets, params=figma_mcp.FigmaListAssetsInput(**asset_args))
+        assert "- **Icons:** 5" in catalog and "... and 2 more" in catalog
+        cursor = catalog.split("(cursor: `")[1].split("`")[0]
+        rest = call(figma_mcp.figma_list_assets, params=figma_mcp.FigmaListAssetsInput(cursor=cursor, **asset_args))
+        assert "**Showing:** 4-5 of 5" in rest and "`2:4`" in rest and "cursor:" not in rest
+        assert len(requests) == 2
+
+    def test_asset_pages_fit_the_budget_and_cursors_follow_the_file_version(self, monkeypatch):
+        import asyncio
+        import json
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+        from pipeline.result_pages import ResultPages, decode_cursor
+
+        document = {
+            "id": "1:1", "name": "Icons", "type": "FRAME",
+            "children": [
+                {"id": f"2:{i}", "name": f"mdi:icon-{i}", "type": "FRAME",
+                 "absoluteBoundingBox": {"x": 0, "y": 0, "width": 24, "height": 24},
+                 "children": [{"id": f"3:{i}", "name": "path", "type": "VECTOR"}]}
+                for i in range(300)
+            ],
+        }
+        version = ["1"]
+
+        async def fake_request(endpoint, method="GET", params=None):
+            return {"version": version[0], "nodes": {"1:1": {"document": document}}}
+
+        pages = ResultPages(ttl_seconds=60, max_entries=4)
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=0, max_entries=4))
+        monkeypatch.setattr(figma_mcp, "_RESULT_PAGES", pages)
+        monkeypatch.setattr(figma_mcp, "CHARACTER_LIMIT", 4000)
+
+        def call(**kwargs):
+            params = figma_mcp.FigmaListAssetsInput(file_key="abcdefghij12", node_id="1:1", page_size=1000, **kwargs)
+            return figma_mcp._strip_version_footer(asyncio.run(figma_mcp.figma_list_assets(params=params)))
+
+        # The combined first page is cut to the budget rather than truncated mid-list.
+        catalog = call()
+        assert len(catalog) <= 4000 and "omitted" not in catalog and "- **Icons:** 300" in catalog
+        cursor = catalog.split("(cursor: `")[1].split("`")[0]
+        shown = catalog.count("| `2:")
+        assert 0 < shown < 300 and decode_cursor(cursor)[1:] == ("icons", shown)
+
+        data = json.loads(call(response_format="json"))
+        assert 0 < len(data["assets"]["icons"]) < 300 and data["pagination"]["icons"]["nextCursor"]
+
+        # An expired result is rebuilt for the same version, but a cursor into
+        # a file that changed since is rejected instead of skipping items.
+        pages.clear()
+        assert f"`2:{shown}`" in call(cursor=cursor)
+        pages.clear()
+        version[0] = "2"
+        assert call(cursor=cursor).startswith("Error: The file changed since this cursor was issued")
+
+    def test_design_token_first_pages_shrink_to_fit_the_budget(self, monkeypatch):
+        import asyncio
+        import json
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+        from pipeline.result_pages import ResultPages, decode_cursor
+
+        def card(i):
+            color = {"r": (i % 20) / 20, "g": (i // 20) / 20, "b": 0.5, "a": 1}
+            return {
+                "id": f"2:{i}", "name": f"Card {i}", "type": "FRAME", "layoutMode": "VERTICAL",
+                "itemSpacing": i + 1, "paddingTop": i + 2,
+                "absoluteBoundingBox": {"x": 0, "y": i * 50, "width": 300, "height": 40},
+                "fills": [{"type": "SOLID", "color": color}],
+                "effects": [{"type": "DROP_SHADOW", "visible": True, "radius": i + 1, "spread": 0,
+                             "color": {"r": 0, "g": 0, "b": 0, "a": 0.25}, "offset": {"x": 0, "y": 2}}],
+                "children": [{"id": f"3:{i}", "name": f"Label {i}", "type": "TEXT", "characters": "Label",
+                              "style": {"fontFamily": "Inter", "fontSize": 8 + i, "fontWeight": 400}}],
+            }
+
+        document = {"id": "1:1", "name": "Page", "type": "FRAME", "children": [card(i) for i in range(400)]}
+
+        async def fake_request(endpoint, method="GET", params=None):
+            return {"nodes": {"1:1": {"document": document}}}
+
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=0, max_entries=4))
+        monkeypatch.setattr(figma_mcp, "_RESULT_PAGES", ResultPages(ttl_seconds=60, max_entries=4))
+
+        params = figma_mcp.FigmaDesignTokensInput(file_key="abcdefghij12", node_id="1:1")
+        text = figma_mcp._strip_version_footer(asyncio.run(figma_mcp.figma_get_design_tokens(params=params)))
+        first = json.loads(text)
+        assert len(text) <= figma_mcp.CHARACTER_LIMIT and "_omitted" not in first
+
+        # Every category keeps a shorter first page whose cursor continues right after it.
+        assert set(first["pagination"]) == {"colors", "typography", "spacing", "shadows"}
+        assert "nextCursor" in first["generated"]
+        for key in first["pagination"]:
+            items = first["tokens"][key]
+            assert 0 < len(items) < params.page_size
+            assert decode_cursor(first["pagination"][key]["nextCursor"])[1:] == (key, len(items))
+
+
+class TestResponseBudget:
+    """Verify tool responses are assembled within the character budget."""
+
+    def test_markdown_builder_stops_at_budget(self):
+        import figma_mcp
+
+        lines = figma_mcp._ResponseBuilder(["# Title", ""], budget=1000)
+        for i in range(500):
+            lines.append(f"- row {i}")
+        text = lines.render(hint="Narrow it.")
+        assert lines.full and text.startswith("# Title\n\n- row 0\n")
+        assert len(text) <= 1000
+        assert text.endswith(f"({lines.dropped} more lines omitted to stay under 1000 characters. Narrow it.)")
+        assert figma_mcp._ResponseBuilder(["a", "b"]).render() == "a\nb"
+
+    def test_json_response_is_compact_and_keeps_fields_that_fit(self):
+        import json
+        import figma_mcp
+
+        assert figma_mcp._json_response({"a": [1, 2], "b": "x"}) == '{"a":[1,2],"b":"x"}'
+        assert figma_mcp._encode_within(list(range(1_000_000)), 100) is None
+
+        payload = {"id": "1:2", "children": [{"id": str(i)} for i in range(1000)], "name": "Card"}
+        text = figma_mcp._json_response(payload, budget=500, hint="Pick a child.")
+        data = json.loads(text)
+        assert len(text) <= 500
+        assert data["id"] == "1:2" and data["name"] == "Card"
+        assert data["_truncated"] is True and data["_omitted"] == ["children"]
+        assert data["_message"] == "Response exceeds 500 characters. Pick a child."
+
+        notice = json.loads(figma_mcp._json_response(list(range(1000)), budget=200))
+        assert notice["_truncated"] is True
+
+
+class TestServiceMetricsWiring:
+    """Verify the metrics endpoint starts with the server and requests are counted once."""
+
+    def test_metrics_endpoint_starts_from_main_not_on_import(self, monkeypatch):
+        import figma_mcp
+        from pipeline import service_metrics
+
+        served, ran = [], []
+        monkeypatch.setenv("FIGMA_METRICS_PORT", "9464")
+        monkeypatch.setattr(service_metrics, "serve", lambda port, host: served.append((port, host)))
+        importlib.reload(figma_mcp)
+        assert served == []
+
+        monkeypatch.setattr(figma_mcp.mcp, "run", lambda: ran.append(True))
+
+        figma_mcp.main()
+        assert served == [(9464, "127.0.0.1")] and ran == [True]
+
+    def test_every_request_attempt_is_counted_once(self, monkeypatch):
+        import asyncio
+        import httpx
+        import pytest
+        import figma_mcp
+        from pipeline import service_metrics
+
+        outcomes = [
+            httpx.ReadTimeout("slow"),
+            httpx.Response(404, request=httpx.Request("GET", "https://api.figma.com/v1/files/k")),
+            httpx.Response(200, content=b"not json", request=httpx.Request("GET", "https://api.figma.com/v1/files/k")),
+        ]
+
+        class FakeClient:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+            async def request(self, **kwargs):
+                outcome = outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+        monkeypatch.setattr(service_metrics, "_registry", None)
+        registry = service_metrics.enable()
+        monkeypatch.setattr(figma_mcp, "_get_figma_token", lambda: "token")
+        monkeypatch.setattr(figma_mcp.httpx, "AsyncClient", FakeClient)
+
+        for error in (httpx.ReadTimeout, httpx.HTTPStatusError, ValueError):
+            with pytest.raises(error):
+                asyncio.run(figma_mcp._make_figma_request("files/k"))
+
+        for status in ("error", "404", "200"):
+            assert registry.value("pbfigma_figma_requests_total", endpoint="files/:key", status=status) == 1
+        assert registry.value("pbfigma_figma_request_seconds", endpoint="files/:key") == 3
+
+
+class TestComputedStyleCache:
+    """Verify generators share each node's parsed styles within a cache scope."""
+
+    def _tree(self):
+        return {
+            "id": "1:1", "name": "Card", "type": "FRAME", "cornerRadius": 8,
+            "absoluteBoundingBox": {"x": 0, "y": 0, "width": 200, "height": 100},
+            "fills": [{"type": "SOLID", "color": {"r": 1, "g": 1, "b": 1, "a": 1}}],
+            "effects": [{"type": "DROP_SHADOW", "color": {"r": 0, "g": 0, "b": 0, "a": 0.2},
+                         "offset": {"x": 0, "y": 2}, "radius": 6}],
+            "children": [
+                {"id": "1:2", "name": "Title", "type": "TEXT", "characters": "Hi",
+                 "style": {"fontFamily": "Inter", "fontSize": 16, "fontWeight": 600},
+                 "fills": [{"type": "SOLID", "color": {"r": 0.4, "g": 0.4, "b": 0.4, "a": 1}}],
+                 "absoluteBoundingBox": {"x": 8, "y": 8, "width": 40, "height": 20}},
+            ],
+        }
+
+    def test_styles_are_parsed_once_per_node_across_generators(self, monkeypatch):
+        import figma_mcp
+        from generators import base
+        from generators.kotlin_generator import generate_kotlin_code
+        from generators.swiftui_generator import generate_swiftui_code
+
+        def render(tree):
+            return [
+                generate_react_code(tree, "Card", True), generate_css_code(tree, "Card"),
+                generate_swiftui_code(tree, "Card"), generate_kotlin_code(tree, "Card"),
+                figma_mcp._check_accessibility(tree["children"][0]),
+                figma_mcp._generate_implementation_hints(tree["children"][0]),
+            ]
+
+        calls = []
+        for name in ("parse_fills", "parse_corners", "_get_background_css"):
+            original = getattr(base, name)
+            monkeypatch.setattr(base, name, lambda node, _f=original, _n=name: calls.append((_n, node["id"])) or _f(node))
+
+        tree = self._tree()
+        plain = render(tree)
+        assert calls.count(("parse_corners", "1:1")) > 1
+
+        calls.clear()
+        with base.style_cache_scope() as cache:
+            assert render(tree) == plain
+            assert base.computed_style(tree) is base.computed_style(tree)
+        assert len(calls) == len(set(calls))
+        assert ("parse_fills", "1:2") in calls and cache.hits > 0
+        assert base.computed_style(tree) is not base.computed_style(tree)
+
+    def test_generate_code_emits_several_frameworks_from_one_fetch(self, monkeypatch):
+        import asyncio
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+
+        tree = self._tree()
+        requests = []
+
+        async def fake_request(endpoint, method="GET", params=None):
+            requests.append(endpoint)
+            return {"nodes": {"1:1": {"document": tree}}}
+
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=0, max_entries=4))
+
+        def call(**kwargs):
+            params = figma_mcp.FigmaCodeGenInput(file_key="abcdefghij12", node_id="1:1", **kwargs)
+            return figma_mcp._strip_version_footer(asyncio.run(figma_mcp.figma_generate_code(params=params)))
+
+        frameworks = ["react", "swiftui", "kotlin", "react"]
+        combined = call(frameworks=frameworks)
+        assert len(requests) == 1
+        assert "**Frameworks:** react, swiftui, kotlin" in combined
+        assert [line for line in combined.splitlines() if line.startswith("## ")] == ["## react", "## swiftui", "## kotlin"]
+        for framework in ("react", "swiftui", "kotlin"):
+            single = call(framework=framework)
+            assert single.split("\n\n", 1)[1] in combined
+
+
+class TestContainerLayout:
+    """Verify the shared container layout decisions that backends print."""
+
+    def _box(self, id_, x, y, w, h, **extra):
+        return {"id": id_, "name": id_, "type": "RECTANGLE", "absoluteBoundingBox": {"x": x, "y": y, "width": w, "height": h}, **extra}
+
+    def _frame(self, children, **extra):
+        return {"id": "1:1", "name": "Frame", "type": "FRAME",
+                "absoluteBoundingBox": {"x": 100, "y": 50, "width": 200, "height": 120}, "children": children, **extra}
+
+    def test_stack_decisions(self):
+        from generators.base import parse_container_layout
+
+        column = self._frame([self._box("a", 100, 50, 50, 20), self._box("b", 100, 78, 50, 20), self._box("c", 100, 102, 50, 20)])
+        layout = parse_container_layout(column)
+        assert (layout.kind, layout.axis, layout.gap, layout.inferred) == ("stack", "VERTICAL", 6, True)
+
+        row = self._frame([self._box("a", 100, 50, 40, 20), self._box("b", 150, 50, 40, 20)], layoutWrap="WRAP")
+        assert (parse_container_layout(row).kind, parse_container_layout(row).content_width) == ("grid", 80)
+
+        overlapping = self._frame([self._box("a", 100, 50, 80, 80), self._box("b", 120, 70, 80, 80)])
+        assert (parse_container_layout(overlapping).kind, parse_container_layout(overlapping).axis) == ("absolute", None)
+
+        # Auto-layout wins over inference and keeps its own spacing.
+        auto = dict(overlapping, layoutMode="HORIZONTAL", itemSpacing=12)
+        layout = parse_container_layout(auto)
+        assert (layout.kind, layout.axis, layout.gap, layout.inferred) == ("stack", "HORIZONTAL", 12, False)
+
+    def test_backends_print_the_same_placement(self):
+        from generators.base import place_child
+        from generators.kotlin_generator import generate_kotlin_code
+        from generators.react_generator import recursive_node_to_jsx
+        from generators.swiftui_generator import generate_swiftui_code
+
+        badge = self._box("b", 260, 60, 30, 20)
+        frame = self._frame([self._box("a", 100, 50, 200, 120), badge])
+        placement = place_child(badge, frame)
+        assert (placement.x, placement.y, placement.center_dx, placement.center_dy) == (160, 10, 75, -40)
+
+        assert "left-[160px] top-[10px]" in recursive_node_to_jsx(frame, indent=0, hard_fidelity_profile=True)
+        assert ".offset(x: 75, y: -40)" in generate_swiftui_code(frame, "Badge")
+        assert "Box(" in generate_kotlin_code(frame, "Badge")
+
+
+class TestInstanceComponents:
+    """Verify repeated instances are emitted once and rendered as usages."""
+
+    def _text(self, id_, name, characters, x, y):
+        return {"id": id_, "name": name, "type": "TEXT", "characters": characters, "style": {"fontSize": 14},
+                "absoluteBoundingBox": {"x": x, "y": y, "width": 80, "height": 20}}
+
+    def _row(self, index, title, y, badge=None):
+        children = [self._text(f"t{index}", "Title", title, 0, y), self._text(f"s{index}", "Subtitle", "Details", 80, y)]
+        if badge is not None:
+            children.append({"id": f"b{index}", "name": "Badge", "type": "INSTANCE",
+                             "absoluteBoundingBox": {"x": 160, "y": y, "width": 40, "height": 20},
+                             "children": [self._text(f"bt{index}", "Count", badge, 160, y)]})
+        return {"id": f"r{index}", "name": "List Row", "type": "INSTANCE", "layoutMode": "HORIZONTAL", "itemSpacing": 8,
+                "absoluteBoundingBox": {"x": 0, "y": y, "width": 200, "height": 20}, "children": children}
+
+    def _screen(self, rows):
+        return {"id": "1:1", "name": "Screen", "type": "FRAME", "layoutMode": "VERTICAL",
+                "absoluteBoundingBox": {"x": 0, "y": 0, "width": 200, "height": 200}, "children": rows}
+
+    def test_repeated_instances_become_one_component_with_text_props(self):
+        from generators.swiftui_generator import generate_swiftui_code
+
+        screen = self._screen([self._row(1, "Inbox", 0), self._row(2, 'Say "hi"', 40), self._row(3, "Archive", 80)])
+
+        react = generate_react_code(screen, "Screen", use_tailwind=True, dedupe_instances=True)
+        assert react.count("const ListRow: React.FC<ListRowProps> = ({ title }) => (") == 1
+        assert "{title}</span>" in react and ">Details</span>" in react
+        assert '<ListRow title="Inbox" />' in react
+        assert '<ListRow title={"Say \\"hi\\""} />' in react
+        assert "Inbox</span>" not in react
+
+        swiftui = generate_swiftui_code(screen, "Screen", dedupe_instances=True)
+        assert swiftui.count("struct ListRow: View {") == 1
+        assert "let title: String" in swiftui and "Text(title)" in swiftui
+        assert 'ListRow(title: "Say \\"hi\\"")' in swiftui
+
+        # Without the flag every instance is inlined as before.
+        assert "ListRow" not in generate_react_code(screen, "Screen", use_tailwind=True)
+
+    def test_nested_instances_are_extracted_inside_out(self):
+        from generators.base import InstanceComponents
+
+        screen = self._screen([self._row(1, "Inbox", 0, "3"), self._row(2, "Inbox", 40, "12"), self._row(3, "Sent", 80, "3")])
+        assert [component.name for component in InstanceComponents(screen, reserved_names=("Screen",))] == ["Badge", "ListRow"]
+
+        react = generate_react_code(screen, "Screen", use_tailwind=True, dedupe_instances=True)
+        assert react.index("const Badge:") < react.index("const ListRow:")
+        # The row passes the badge's differing text through as its own prop.
+        assert "const ListRow: React.FC<ListRowProps> = ({ title, count }) => (" in react
+        assert "<Badge count={count} />" in react
+        assert '<ListRow title="Inbox" count="12" />' in react and '<ListRow title="Sent" count="3" />' in react
+
+        # A single instance is not worth a component.
+        assert not InstanceComponents(self._screen([self._row(1, "Inbox", 0)]))
+
+    def test_generate_code_tool_inlines_instances_unless_asked(self, monkeypatch):
+        import asyncio
+        import figma_mcp
+        from pipeline.document_index import DocumentCache
+
+        screen = self._screen([self._row(1, "Inbox", 0), self._row(2, "Sent", 40)])
+
+        async def fake_request(endpoint, method="GET", params=None):
+            return {"nodes": {"1:1": {"document": screen}}}
+
+        monkeypatch.setattr(figma_mcp, "_make_figma_request", fake_request)
+        monkeypatch.setattr(figma_mcp, "_DOCUMENT_CACHE", DocumentCache(ttl_seconds=0))
+
+        def call(**kwargs):
+            params = figma_mcp.FigmaCodeGenInput(file_key="abcdefghij12", node_id="1:1", framework="react", **kwargs)
+            return asyncio.run(figma_mcp.figma_generate_code(params=params))
+
+        assert "ListRow" not in call()
+        assert '<ListRow title="Sent" />' in call(dedupe_instances=True)
+
+
 class TestReactAssetAndVectorOutput:
     """Verify React generator emits concrete image/svg output when data exists."""
 